@@ -2,36 +2,53 @@
 import os
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 os.environ['JAX_PLATFORMS'] = 'cpu'
+# 64-bit JAX for float64 serving and the float64 reference of the precision check; the
+# float32 path gives every array an explicit float32 dtype
 os.environ['JAX_ENABLE_X64'] = 'True'
 BACKEND = 'jax'
 os.environ['KERAS_BACKEND'] = BACKEND
 
 # app.py (or main.py)
-from fastapi import FastAPI, HTTPException
+# TensorFlow/Keras, JAX and tkan/tkat are imported lazily by load_artifacts() so the server
+# can start accepting connections (and answer /healthz) while the model is still loading.
+from log_config import configure_logging
+from readiness import StartupState
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import Input
-from tensorflow.keras.utils import custom_object_scope
-import pickle
 import os
 import requests
+import httpx
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 import pytz
 import json
-import traceback
-import joblib
-import jax
-
-# Assuming TKAN is installed and available
-from tkan import TKAN
-try:
-    from tkat import TKAT
-except ImportError:
-    print("TKAT library not found. If your model uses TKAT, ensure the library is installed.")
-    TKAT = None
+import logging
+import time
+import asyncio
+import functools
+import hmac
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import open_meteo
+from aqi_engine import VectorizedAQI
+from series_cache import HourlySeriesCache
+from batching import MicroBatcher
+from forecasting import recursive_forecast
+from timeseries_store import TimeSeriesStore, epoch_hour
+from preprocessing import HourlyGrid, UnsupportedPayload, build_hourly_grid, latest_window
+import forecast_tiles
+from forecast_tiles import ActiveCellIndex, ForecastTiles, TileScheduler
+from sensor_ingest import SensorNodes
+from precision import CALIBRATION_PATH, INFERENCE_PRECISION, PrecisionRejected, check_precision, load_calibration, parse_precision
+from model_registry import (MODEL_SHADOW_SAMPLE_RATE, MODEL_SHADOW_VERSION, MODEL_VERSION, BundleNotFound, BundleSource,
+                            ModelBundle, ModelRegistry, SwapInProgress, bundle_source)
+from metrics import LATENCY_BUCKETS_S, REGISTRY, observe_stage, scaled_snapshot, stage_timer
+
+configure_logging()
+log = logging.getLogger("vayu.app")
 
 class MinMaxScaler:
     def __init__(self, feature_axis=None, minmax_range=(0, 1)):
@@ -67,6 +84,12 @@ class MinMaxScaler:
         self.scale_ = self.max_ - self.min_
         return self
 
+    def astype(self, dtype):
+        """A copy whose attributes are ``dtype`` arrays, so transforms stay in that precision."""
+        scaler = MinMaxScaler(self.feature_axis, self.minmax_range)
+        scaler.min_, scaler.max_, scaler.scale_ = (np.asarray(a, dtype=dtype) for a in (self.min_, self.max_, self.scale_))
+        return scaler
+
     def transform(self, X):
         if self.min_ is None or self.max_ is None or self.scale_ is None:
              # Handle the case where scaler wasn't fitted (though it should be if attributes loaded)
@@ -130,131 +153,134 @@ def calculate_overall_aqi(row, aqi_breakpoints):
     else:
         return np.nan
 
-# --- Data Retrieval Function ---
-def get_latest_data_sequence(sequence_length: int, latitude: float, longitude: float):
-    print(f"Attempting to retrieve data for the last {sequence_length} hours from Open-Meteo for Lat: {latitude}, Lon: {longitude}")
-
-    current_utc_time = datetime.now(pytz.utc)
-    print(f"Current UTC time on server for API calls: {current_utc_time.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-    print("IMPORTANT: If the server time above is incorrect (e.g., a future year), API data will be missing or invalid.")
-
-
-    # Define a window to fetch from APIs, slightly larger than sequence_length to allow for finding complete data
-    # e.g., if sequence_length is 24, fetch last 48 hours to have a good buffer
-    api_fetch_past_hours = sequence_length + 24 # Fetch a wider window, e.g., 48 hours for a 24-hour sequence
-    
-    # This window will be used to filter the processed data before dropna and tail
-    processing_window_hours = sequence_length + 24 # e.g., 48 hours
-
-    print(f"Requesting data for the past {api_fetch_past_hours} hours for air quality and temperature from APIs.")
-
-    air_quality_url = "https://air-quality-api.open-meteo.com/v1/air-quality"
-    air_quality_params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "hourly": ["pm2_5", "pm10", "carbon_monoxide"],
-        "timezone": "UTC",
-        "past_hours": api_fetch_past_hours
-    }
-    # print(f"Air quality API params: {air_quality_params}")
-
-    # Using forecast API for temperature as per user's finding that it works better
-    weather_url = "https://api.open-meteo.com/v1/forecast" 
-    weather_params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "hourly": ["temperature_2m"],
-        "timezone": "UTC",
-        "past_hours": api_fetch_past_hours # Fetch same window for temperature
-    }
-    # print(f"Temperature API params: {weather_params}")
+# Column-wise equivalent of calculate_overall_aqi, compiled once from the table above
+aqi_calculator = VectorizedAQI(aqi_breakpoints)
 
+# --- Data Retrieval Function ---
+# Processed Open-Meteo series (HourlyGrid), shared between requests for the same grid cell within a UTC hour
+series_cache = HourlySeriesCache()
+
+# On-disk hourly history per grid cell (see timeseries_store.py). Set TIMESERIES_STORE_DIR=""
+# to disable. When upstream is down, stored windows up to this many hours old are still served.
+TIMESERIES_STORE_DIR = os.environ.get("TIMESERIES_STORE_DIR", "data/timeseries")
+TIMESERIES_STORE_MAX_STALENESS_HOURS = int(os.environ.get("TIMESERIES_STORE_MAX_STALENESS_HOURS", "6"))
+timeseries_store = None
+STORE_READS = REGISTRY.counter(
+    "vayu_timeseries_store_reads_total", "Input windows looked up in the time-series store, by result.", labels=("result",))
+STORE_FETCHED_HOURS = REGISTRY.counter(
+    "vayu_timeseries_store_fetched_hours_total", "Past hours requested from Open-Meteo after a store miss.")
+if TIMESERIES_STORE_DIR:
     try:
-        print(f"Fetching air quality data from: {air_quality_url}")
-        air_quality_response = requests.get(air_quality_url, params=air_quality_params)
-        air_quality_response.raise_for_status()
-        air_quality_data = air_quality_response.json()
-        print("Air quality data retrieved.")
-
-        print(f"Fetching temperature data from: {weather_url}")
-        weather_response = requests.get(weather_url, params=weather_params)
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
-        print("Temperature data retrieved.")
-
-        print("Data fetched successfully from APIs.")
-
+        timeseries_store = TimeSeriesStore(TIMESERIES_STORE_DIR)
+    except OSError as e:
+        log.warning("Could not open time-series store at %s, continuing without it: %s", TIMESERIES_STORE_DIR, e)
+
+# Hourly windows for sensor nodes that push their own readings to /ingest (see sensor_ingest.py),
+# also written to the time-series store when it is enabled
+sensor_nodes = SensorNodes(aqi_calculator, store=timeseries_store)
+
+def _build_processed_frame(air_quality_data, weather_data):
+    # Turns the two raw Open-Meteo payloads into the merged, hourly-resampled, AQI-annotated
+    # frame with columns ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co'] and a UTC index.
+    # The result only depends on the payloads, so it is what the hourly series cache stores.
+    try:
+        parse_started = time.perf_counter()
         if 'hourly' not in air_quality_data or 'time' not in air_quality_data['hourly']:
-            print("Error: 'hourly' or 'time' key not found in air quality response.")
+            log.error("'hourly' or 'time' key not found in air quality response.")
             return None, "Error: Invalid air quality data format from API."
         df_aq = pd.DataFrame(air_quality_data['hourly'])
         if df_aq.empty:
-            print("Warning: Air quality data DataFrame is empty after fetching.")
+            log.warning("Air quality data DataFrame is empty after fetching.")
         # Continue if not empty, but columns might be missing
         if not df_aq.empty and not all(col in df_aq.columns for col in ['time', 'pm2_5', 'pm10', 'carbon_monoxide']):
-            print("Warning: Air quality data is missing some expected columns ('time', 'pm2_5', 'pm10', 'carbon_monoxide') after fetching.")
+            log.warning("Air quality data is missing some expected columns ('time', 'pm2_5', 'pm10', 'carbon_monoxide') after fetching.")
         if 'time' not in df_aq.columns and not df_aq.empty:
              return None, "Error: 'time' column missing in air quality data."
         if not df_aq.empty:
             df_aq['time'] = pd.to_datetime(df_aq['time'])
             df_aq.set_index('time', inplace=True)
-        print(f"Processed df_aq. Shape: {df_aq.shape}. Columns: {df_aq.columns.tolist() if not df_aq.empty else 'N/A'}")
+        log.debug("Processed df_aq. Shape: %s. Columns: %s", df_aq.shape, df_aq.columns)
 
         if 'hourly' not in weather_data or 'time' not in weather_data['hourly']:
-            print("Error: 'hourly' or 'time' key not found in weather response.")
+            log.error("'hourly' or 'time' key not found in weather response.")
             return None, "Error: Invalid weather data format from API."
         df_temp = pd.DataFrame(weather_data['hourly'])
         if df_temp.empty:
-            print("Warning: Temperature data DataFrame is empty after fetching.")
+            log.warning("Temperature data DataFrame is empty after fetching.")
         if not df_temp.empty and not all(col in df_temp.columns for col in ['time', 'temperature_2m']):
-            print("Warning: Temperature data is missing some expected columns ('time', 'temperature_2m') after fetching.")
+            log.warning("Temperature data is missing some expected columns ('time', 'temperature_2m') after fetching.")
         if 'time' not in df_temp.columns and not df_temp.empty:
             return None, "Error: 'time' column missing in temperature data."
         if not df_temp.empty:
             df_temp['time'] = pd.to_datetime(df_temp['time'])
             df_temp.set_index('time', inplace=True)
-        print(f"Processed df_temp. Shape: {df_temp.shape}. Columns: {df_temp.columns.tolist() if not df_temp.empty else 'N/A'}")
+        log.debug("Processed df_temp. Shape: %s. Columns: %s", df_temp.shape, df_temp.columns)
+        observe_stage("parse", parse_started)
         
         if df_aq.empty or df_temp.empty:
-            print("Error: One or both dataframes (AQ, Temp) are empty before merge. Cannot proceed.")
+            log.error("One or both dataframes (AQ, Temp) are empty before merge. Cannot proceed.")
             return None, "Error: Insufficient data from APIs (AQ or Temp empty)."
 
-        df_merged = df_aq.merge(df_temp, left_index=True, right_index=True, how='inner')
-        print(f"DataFrames merged (inner). Initial merged shape: {df_merged.shape}")
+        with stage_timer("merge"):
+            df_merged = df_aq.merge(df_temp, left_index=True, right_index=True, how='inner')
+        log.debug("DataFrames merged (inner). Initial merged shape: %s", df_merged.shape)
         if df_merged.empty:
-            print("Error: Inner merge of AQ and Temperature data resulted in an empty DataFrame. No overlapping timestamps with data.")
+            log.error("Inner merge of AQ and Temperature data resulted in an empty DataFrame. No overlapping timestamps with data.")
             return None, "Error: No overlapping AQ and Temperature data available for the period."
 
         # Resample to ensure consistent hourly frequency and fill missing data
-        df_processed = df_merged.resample('h').mean() # Use mean for resampling to handle potential duplicates at same hour
-        df_processed = df_processed.ffill().bfill() # Then fill
-        print(f"DataFrame resampled to hourly, filled NaNs. Shape: {df_processed.shape}")
+        with stage_timer("resample"):
+            df_processed = df_merged.resample('h').mean() # Use mean for resampling to handle potential duplicates at same hour
+            df_processed = df_processed.ffill().bfill() # Then fill
+        log.debug("DataFrame resampled to hourly, filled NaNs. Shape: %s", df_processed.shape)
         # print(f"df_processed head after resample/ffill/bfill:\n{df_processed.head().to_string()}")
         # print(f"df_processed NaNs after resample/ffill/bfill:\n{df_processed.isna().sum().to_string()}")
 
         df_processed.rename(columns={'pm2_5': 'pm25', 'carbon_monoxide': 'co', 'temperature_2m': 'temp'}, inplace=True)
-        print(f"Renamed columns. Current columns: {df_processed.columns.tolist()}")
+        log.debug("Renamed columns. Current columns: %s", df_processed.columns)
 
         expected_cols_for_aqi = ['pm25', 'pm10', 'co']
         for col in expected_cols_for_aqi:
             if col not in df_processed.columns:
-                print(f"Warning: Column '{col}' for AQI calculation is missing after rename. Adding as NaN.")
+                log.warning("Column '%s' for AQI calculation is missing after rename. Adding as NaN.", col)
                 df_processed[col] = np.nan
         
-        df_processed['calculated_aqi'] = df_processed.apply(lambda row: calculate_overall_aqi(row, aqi_breakpoints), axis=1)
-        print("Calculated AQI.")
+        with stage_timer("aqi"):
+            df_processed['calculated_aqi'] = aqi_calculator.overall_aqi(df_processed)
+        log.debug("Calculated AQI.")
         # print(f"df_processed head after AQI calculation:\n{df_processed.head().to_string()}")
         # print(f"df_processed NaNs after AQI calculation:\n{df_processed.isna().sum().to_string()}")
 
         required_columns = ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co']
         for col in required_columns:
             if col not in df_processed.columns:
-                print(f"Warning: Column '{col}' is missing before final selection. Adding it as NaN.")
+                log.warning("Column '%s' is missing before final selection. Adding it as NaN.", col)
                 df_processed[col] = np.nan
         
         df_processed = df_processed[required_columns].copy()
         # print(f"Selected and reordered columns. Shape before windowing: {df_processed.shape}. Columns: {df_processed.columns.tolist()}")
 
+        # Ensure df_processed.index is timezone-aware (it should be if APIs return UTC and pd.to_datetime is used correctly)
+        if df_processed.index.tz is None:
+            log.debug("df_processed.index is timezone-naive. Localizing to UTC.")
+            df_processed.index = df_processed.index.tz_localize('UTC')
+
+        return df_processed, None
+
+    except Exception as e:
+        log.exception("An unexpected error occurred during data retrieval and processing: %s", e)
+        return None, f"An unexpected error occurred during data processing: {e}"
+
+
+def _select_latest_sequence(df_processed, sequence_length: int, current_utc_time):
+    # Cuts the (1, sequence_length, 5) model input and its timestamps out of a processed frame.
+    # Works on copies only, so a frame shared through the cache is never modified.
+    # Serving uses preprocessing.latest_window; this is the pandas reference it must match.
+
+    # This window will be used to filter the processed data before dropna and tail
+    processing_window_hours = sequence_length + 24 # e.g., 48 hours
+
+    try:
         # Filter to the defined processing window relative to current time
         # Ensure we only consider data up to the current hour and back by processing_window_hours
         window_start_time_dt = current_utc_time.replace(minute=0, second=0, microsecond=0) - timedelta(hours=processing_window_hours - 1)
@@ -265,13 +291,8 @@ def get_latest_data_sequence(sequence_length: int, latitude: float, longitude: f
         window_start_time_ts = pd.Timestamp(window_start_time_dt)
         window_end_time_ts = pd.Timestamp(window_end_time_dt)
 
-        # Ensure df_processed.index is timezone-aware (it should be if APIs return UTC and pd.to_datetime is used correctly)
-        if df_processed.index.tz is None:
-            print("Warning: df_processed.index is timezone-naive. Localizing to UTC.")
-            df_processed.index = df_processed.index.tz_localize('UTC')
-            
         df_recent_processed = df_processed[(df_processed.index >= window_start_time_ts) & (df_processed.index <= window_end_time_ts)].copy()
-        print(f"Filtered to recent processing window ({processing_window_hours}hrs). Shape: {df_recent_processed.shape}")
+        log.debug("Filtered to recent processing window (%shrs). Shape: %s", processing_window_hours, df_recent_processed.shape)
         # print(f"df_recent_processed head:\n{df_recent_processed.head().to_string()}")
         # print(f"df_recent_processed NaNs before dropna:\n{df_recent_processed.isna().sum().to_string()}")
 
@@ -279,94 +300,598 @@ def get_latest_data_sequence(sequence_length: int, latitude: float, longitude: f
         initial_rows_recent = len(df_recent_processed)
         df_recent_processed.dropna(inplace=True)
         if len(df_recent_processed) < initial_rows_recent:
-             print(f"Warning: Dropped {initial_rows_recent - len(df_recent_processed)} rows with NaNs from the recent processing window.")
-        print(f"Shape after dropna on recent window: {df_recent_processed.shape}")
+             log.warning("Dropped %d rows with NaNs from the recent processing window.", initial_rows_recent - len(df_recent_processed))
+        log.debug("Shape after dropna on recent window: %s", df_recent_processed.shape)
 
         if len(df_recent_processed) < sequence_length:
-            print(f"Error: Only {len(df_recent_processed)} valid data points remain in the recent window after processing, but {sequence_length} are required.")
+            log.error("Only %d valid data points remain in the recent window after processing, but %d are required.", len(df_recent_processed), sequence_length)
             return None, f"Error: Insufficient historical data in the recent window ({len(df_recent_processed)} points available, {sequence_length} required)."
 
         latest_data_sequence_df = df_recent_processed.tail(sequence_length).copy()
-        print(f"Selected last {sequence_length} data points for model input. Shape: {latest_data_sequence_df.shape}")
+        log.debug("Selected last %d data points for model input. Shape: %s", sequence_length, latest_data_sequence_df.shape)
         # print(f"Final sequence data:\n{latest_data_sequence_df.to_string()}")
 
 
-        latest_data_sequence = latest_data_sequence_df.values.reshape(1, sequence_length, len(required_columns))
+        latest_data_sequence = latest_data_sequence_df.values.reshape(1, sequence_length, latest_data_sequence_df.shape[1])
         timestamps = latest_data_sequence_df.index.tolist()
         # print(f"Prepared input sequence with shape: {latest_data_sequence.shape}")
 
         return latest_data_sequence, timestamps
 
+    except Exception as e:
+        log.exception("An unexpected error occurred during data retrieval and processing: %s", e)
+        return None, f"An unexpected error occurred during data processing: {e}"
+
+
+def _build_hourly_grid(air_quality_data, weather_data):
+    # Raw payloads -> (HourlyGrid, None) or (None, error). Regular Open-Meteo payloads go through
+    # the numpy pipeline in preprocessing.py; anything it doesn't handle through the pandas one.
+    try:
+        return build_hourly_grid(air_quality_data, weather_data, aqi_calculator)
+    except UnsupportedPayload as e:
+        log.debug("Falling back to pandas preprocessing: %s", e)
+    df_processed, error = _build_processed_frame(air_quality_data, weather_data)
+    if df_processed is None:
+        return None, error
+    # resample('h') leaves one row per consecutive hour, which is exactly an HourlyGrid
+    return HourlyGrid(epoch_hour(df_processed.index[0]), df_processed.to_numpy(dtype=np.float64)), None
+
+
+def _process_open_meteo_data(air_quality_data, weather_data, sequence_length: int, current_utc_time):
+    # Shared by the sync and async retrieval paths: raw payloads -> (model input, timestamps).
+    grid, error = _build_hourly_grid(air_quality_data, weather_data)
+    if grid is None:
+        return None, error
+    return latest_window(grid, sequence_length, epoch_hour(current_utc_time))
+
+
+def get_latest_data_sequence(sequence_length: int, latitude: float, longitude: float):
+    log.debug("Attempting to retrieve data for the last %d hours from Open-Meteo for Lat: %s, Lon: %s", sequence_length, latitude, longitude)
+
+    current_utc_time = datetime.now(pytz.utc)
+    # If the server time is incorrect (e.g., a future year), API data will be missing or invalid.
+    log.debug("Current UTC time on server for API calls: %s", current_utc_time)
+
+
+    # Define a window to fetch from APIs, slightly larger than sequence_length to allow for finding complete data
+    # e.g., if sequence_length is 24, fetch last 48 hours to have a good buffer
+    api_fetch_past_hours = sequence_length + 24 # Fetch a wider window, e.g., 48 hours for a 24-hour sequence
+
+    log.debug("Requesting data for the past %d hours for air quality and temperature from APIs.", api_fetch_past_hours)
+    request_timeout = (open_meteo.CONNECT_TIMEOUT, open_meteo.READ_TIMEOUT)
+
+    try:
+        log.debug("Fetching air quality data from: %s", open_meteo.AIR_QUALITY_URL)
+        air_quality_response = requests.get(open_meteo.AIR_QUALITY_URL, params=open_meteo.air_quality_params(latitude, longitude, api_fetch_past_hours), timeout=request_timeout)
+        air_quality_response.raise_for_status()
+        air_quality_data = air_quality_response.json()
+        log.debug("Air quality data retrieved.")
+
+        log.debug("Fetching temperature data from: %s", open_meteo.FORECAST_URL)
+        weather_response = requests.get(open_meteo.FORECAST_URL, params=open_meteo.weather_params(latitude, longitude, api_fetch_past_hours), timeout=request_timeout)
+        weather_response.raise_for_status()
+        weather_data = weather_response.json()
+        log.debug("Temperature data retrieved.")
+
+        log.debug("Data fetched successfully from APIs.")
     except requests.exceptions.RequestException as e:
-        print(f"API Request Error: {e}")
-        traceback.print_exc()
+        log.warning("API Request Error: %s", e)
         return None, f"API Request Error: {e}"
     except Exception as e:
-        print(f"An unexpected error occurred during data retrieval and processing: {e}")
-        traceback.print_exc()
+        log.exception("An unexpected error occurred during data retrieval and processing: %s", e)
         return None, f"An unexpected error occurred during data processing: {e}"
 
+    return _process_open_meteo_data(air_quality_data, weather_data, sequence_length, current_utc_time)
+
+
+async def _fetch_hourly_grid_async(latitude: float, longitude: float, past_hours: int):
+    # Non-blocking fetch: both upstream calls go out concurrently over the shared pooled
+    # client, each bounded by the timeouts configured in open_meteo.py.
+    try:
+        with stage_timer("upstream_fetch"):
+            air_quality_data, weather_data = await open_meteo.fetch_hourly_payloads(latitude, longitude, past_hours)
+        log.debug("Data fetched successfully from APIs.")
+    except httpx.HTTPError as e:
+        log.warning("API Request Error: %r", e, extra={"latitude": latitude, "longitude": longitude})
+        return None, f"API Request Error: {e!r}"
+    except Exception as e:
+        log.exception("An unexpected error occurred during data retrieval: %s", e)
+        return None, f"An unexpected error occurred during data processing: {e}"
+
+    return _build_hourly_grid(air_quality_data, weather_data)
+
+
+def _grid_station(latitude: float, longitude: float) -> str:
+    lat, lon = series_cache.snap(latitude, longitude)
+    return f"grid_{lat}_{lon}"
+
+
+def _hour_timestamps(end_hour: int, n: int):
+    return list(pd.to_datetime(np.arange(end_hour - n + 1, end_hour + 1) * 3600, unit='s', utc=True))
+
+
+def _read_stored_sequence(station: str, end_hour: int, sequence_length: int):
+    # Zero-copy (read-only) view of the stored window ending at end_hour, if it is complete.
+    # Blocking (checks the station's files for a newer version); run it in an executor.
+    with stage_timer("store_read"):
+        window = timeseries_store.read_window(station, end_hour, sequence_length)
+    if window is None:
+        return None, None
+    return window[None], _hour_timestamps(end_hour, sequence_length)
+
+
+def _plan_stored_sequence(station: str, end_hour: int, sequence_length: int, full_hours: int):
+    # (sequence, timestamps, 0) if the store holds the whole window, else (None, None, hours to fetch).
+    # Blocking; run it in an executor.
+    sequence, timestamps = _read_stored_sequence(station, end_hour, sequence_length)
+    if sequence is not None:
+        return sequence, timestamps, 0
+    return None, None, _hours_to_fetch(station, end_hour, sequence_length, full_hours)
+
+
+def _read_latest_stored_sequence(station: str, end_hour: int, sequence_length: int):
+    # Newest complete stored window, if it ends at most TIMESERIES_STORE_MAX_STALENESS_HOURS
+    # before end_hour. Blocking; run it in an executor.
+    latest_hour = timeseries_store.latest_hour(station)
+    if latest_hour is None or end_hour - latest_hour > TIMESERIES_STORE_MAX_STALENESS_HOURS:
+        return None, None
+    return _read_stored_sequence(station, latest_hour, sequence_length)
+
 
-# --- Define paths to your saved files ---
-MODEL_PATH = 'best_model_TKAN_nahead_1.keras'
-INPUT_SCALER_ATTR_PATH = 'input_scaler_attributes.json'
-TARGET_SCALER_ATTR_PATH = 'target_scaler_attributes.json'
-Y_SCALER_TRAIN_PATH = 'y_scaler_train.npy'
+def _persist_grid(station: str, grid: HourlyGrid, current_utc_time):
+    # Only complete hours up to now: later rows are upstream forecasts that get revised.
+    # Blocking (file lock, possibly a file rebuild); run it in an executor.
+    hours = grid.hours
+    observed = (hours <= epoch_hour(current_utc_time)) & ~np.isnan(grid.values).any(axis=1)
+    if not observed.any():
+        return
+    with stage_timer("store_write"):
+        timeseries_store.append(station, hours[observed], grid.values[observed])
 
 
-# --- Load the scalers and model ---
+async def _fetch_and_store_grid_async(latitude: float, longitude: float, past_hours: int, station: str, current_utc_time):
+    grid, error = await _fetch_hourly_grid_async(latitude, longitude, past_hours)
+    if grid is not None and timeseries_store is not None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _persist_grid, station, grid, current_utc_time)
+        except Exception as e:
+            log.warning("Could not persist fetched series for %s: %s", station, e)
+    return grid, error
+
+
+def _hours_to_fetch(station: str, end_hour: int, sequence_length: int, full_hours: int) -> int:
+    # Past hours to ask upstream for: from the first hour of the model window the store lacks,
+    # plus one it has so gap filling sees the same neighbour; the full window if it lacks the oldest
+    start_hour = end_hour - sequence_length + 1
+    missing = timeseries_store.missing_hours(station, start_hour, end_hour)
+    if missing.size == 0 or missing[0] == start_hour:
+        return full_hours
+    return int(min(end_hour - missing[0] + 1, full_hours))
+
+
+def _with_stored_history(station: str, grid: HourlyGrid, start_hour: int) -> HourlyGrid:
+    # Stored rows from start_hour up to where a partially fetched grid begins, followed by the grid.
+    # Blocking; run it in an executor.
+    if grid.start_hour <= start_hour:
+        return grid
+    stored = timeseries_store.read_range(station, start_hour, grid.start_hour - 1)
+    return HourlyGrid(start_hour, np.concatenate([stored, grid.values]))
+
+
+async def get_latest_data_sequence_async(sequence_length: int, latitude: float, longitude: float, allow_stale: bool = True):
+    # Async variant used by the endpoints. Reads the window from the local time-series store
+    # when it already holds every hour up to now; otherwise only the hours the store lacks are
+    # fetched, through the hourly series cache, so only the first request per grid cell and
+    # UTC hour goes upstream, and the fetched hours are appended to the store. With
+    # allow_stale, a cell whose series is up to SERIES_CACHE_STALE_HOURS old is answered from
+    # it while it refreshes, and if upstream fails, from the newest stored window up to
+    # TIMESERIES_STORE_MAX_STALENESS_HOURS old. Without it, only a window ending now is returned.
+    log.debug("Attempting to retrieve data (async) for the last %d hours from Open-Meteo for Lat: %s, Lon: %s", sequence_length, latitude, longitude)
+
+    current_utc_time = datetime.now(pytz.utc)
+    api_fetch_past_hours = sequence_length + 24
+    station = _grid_station(latitude, longitude)
+    end_hour = epoch_hour(current_utc_time)
+
+    loop = asyncio.get_running_loop()
+    past_hours = api_fetch_past_hours
+    if timeseries_store is not None:
+        sequence, timestamps, past_hours = await loop.run_in_executor(
+            None, _plan_stored_sequence, station, end_hour, sequence_length, api_fetch_past_hours)
+        if sequence is not None:
+            STORE_READS.labels("hit").inc()
+            log.debug("Serving input sequence from the local time-series store.", extra={"station": station})
+            return sequence, timestamps
+        STORE_READS.labels("miss").inc()
+        STORE_FETCHED_HOURS.labels().inc(past_hours)
+
+    cache_key = series_cache.make_key(latitude, longitude, past_hours, current_utc_time)
+    grid_latitude, grid_longitude = cache_key[0], cache_key[1]
+    grid, error = await series_cache.get_or_load(
+        cache_key,
+        lambda: _fetch_and_store_grid_async(grid_latitude, grid_longitude, past_hours, station, current_utc_time),
+        now=current_utc_time,
+        allow_stale=allow_stale,
+    )
+    if grid is None:
+        if timeseries_store is not None and allow_stale:
+            # Upstream unavailable: fall back to the newest complete window on disk
+            sequence, timestamps = await loop.run_in_executor(
+                None, _read_latest_stored_sequence, station, end_hour, sequence_length)
+            if sequence is not None:
+                STORE_READS.labels("stale_fallback").inc()
+                log.warning("Upstream unavailable (%s); serving stored sequence ending %dh ago.", error,
+                            end_hour - epoch_hour(timestamps[-1]), extra={"station": station})
+                return sequence, timestamps
+        return None, error
+
+    if past_hours < api_fetch_past_hours:
+        grid = await loop.run_in_executor(None, _with_stored_history, station, grid, end_hour - api_fetch_past_hours + 1)
+    with stage_timer("select_sequence"):
+        return latest_window(grid, sequence_length, end_hour)
+
+
+# --- Define paths to your saved files (overridable, e.g. to point at benchmark stand-ins) ---
+MODEL_PATH = os.environ.get("MODEL_PATH", 'best_model_TKAN_nahead_1.keras')
+INPUT_SCALER_ATTR_PATH = os.environ.get("INPUT_SCALER_ATTR_PATH", 'input_scaler_attributes.json')
+TARGET_SCALER_ATTR_PATH = os.environ.get("TARGET_SCALER_ATTR_PATH", 'target_scaler_attributes.json')
+Y_SCALER_TRAIN_PATH = os.environ.get("Y_SCALER_TRAIN_PATH", 'y_scaler_train.npy')
+
+
+# INFERENCE_MODE=jax replaces transform -> model.predict -> inverse transform with a single
+# jax.jit-compiled function (see jax_inference.py), compiled and warmed up during startup.
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "keras").lower()
+
+# float64 | float32; see precision.py. float32 is checked against float64 on a calibration
+# set whenever a model is loaded.
+INFERENCE_PRECISION = parse_precision(INFERENCE_PRECISION)
+
+# When set, forward passes go to the worker pool listening on this socket (see inference_pool.py)
+# and this process never imports TensorFlow or loads the model itself.
+INFERENCE_POOL_SOCKET = os.environ.get("INFERENCE_POOL_SOCKET", "")
+
+# --- Scalers and model, populated by load_artifacts() ---
 input_scaler = None
 target_scaler = None 
 model = None
-
-try:
-    print(f"Attempting to load input scaler attributes from {INPUT_SCALER_ATTR_PATH}...")
-    with open(INPUT_SCALER_ATTR_PATH, 'r') as f:
-        input_attrs = json.load(f)
-    input_scaler = MinMaxScaler() 
-    input_scaler.load_attributes(input_attrs) 
-    print("Input scaler loaded manually.")
-
-    print(f"Attempting to load target scaler attributes from {TARGET_SCALER_ATTR_PATH}...")
-    with open(TARGET_SCALER_ATTR_PATH, 'r') as f:
-        target_attrs = json.load(f)
-    target_scaler = MinMaxScaler() 
-    target_scaler.load_attributes(target_attrs) 
-    print("Target scaler loaded manually.")
-
-    print(f"Attempting to load y_scaler_train numpy array from {Y_SCALER_TRAIN_PATH}...")
-    y_scaler_train = np.load(Y_SCALER_TRAIN_PATH)
-    print("y_scaler_train numpy array loaded.")
-
-
-except FileNotFoundError as e:
-    print(f"Error loading scaler attribute files (FileNotFoundError): {e}")
-except Exception as e:
-    print(f"An error occurred during manual scaler loading: {e}")
-    import traceback
-    traceback.print_exc()
-
-custom_objects = {"TKAN": TKAN}
-if TKAT is not None:
-     custom_objects["TKAT"] = TKAT
-
-try:
-    print(f"Loading model from {MODEL_PATH}...")
-    with custom_object_scope(custom_objects):
-        model = load_model(MODEL_PATH, compile=False)
-    print("Model loaded successfully.")
-except FileNotFoundError:
-    print(f"Error: Model file not found at {MODEL_PATH}.")
-except ValueError as e:
-     print(f"Error loading model (ValueError): {e}")
-     print("This can happen if the file is not a valid Keras file or if custom objects are not registered.")
-     traceback.print_exc()
-except Exception as e:
-    print(f"An unexpected error occurred during model loading: {e}")
-    traceback.print_exc()
-
-
-app = FastAPI()
+y_scaler_train = None
+compiled_forecaster = None
+inference_pool_client = None
+
+startup_state = StartupState()
+
+
+def _load_scaler(path):
+    log.info("Attempting to load scaler attributes from %s...", path)
+    with open(path, 'r') as f:
+        attrs = json.load(f)
+    scaler = MinMaxScaler() 
+    scaler.load_attributes(attrs) 
+    return scaler
+
+
+def _connect_inference_pool(batcher):
+    # One pool connection per batch the batcher may have in flight; by default as many
+    # batches as the pool has workers, unless INFERENCE_BATCH_CONCURRENCY says otherwise
+    global inference_pool_client
+    from inference_pool import InferencePoolClient, PooledModel
+    client = InferencePoolClient(INFERENCE_POOL_SOCKET)
+    pooled = PooledModel(client, client.wait_for_info())
+    if "INFERENCE_BATCH_CONCURRENCY" not in os.environ:
+        batcher.max_concurrent_batches = pooled.workers
+    client.max_connections = batcher.max_concurrent_batches
+    inference_pool_client = client
+    return pooled
+
+
+def _startup_source():
+    # MODEL_VERSION picks a bundle from MODEL_REGISTRY_DIR; otherwise the *_PATH files are served as "default"
+    if MODEL_VERSION:
+        return bundle_source(MODEL_VERSION)
+    return BundleSource("default", MODEL_PATH, INPUT_SCALER_ATTR_PATH, TARGET_SCALER_ATTR_PATH, Y_SCALER_TRAIN_PATH, CALIBRATION_PATH)
+
+
+def _keras_predict_aqi(model, input_scaler, target_scaler, windows_unscaled, dtype=np.float64):
+    # One forward pass through model.predict, with preprocessing in dtype -> (B, steps_per_call) AQI
+    X = np.asarray(windows_unscaled, dtype=dtype)
+    scaled_predictions = model.predict(input_scaler.transform(X), verbose=0)
+    return _inverse_transform_batch(X, scaled_predictions, target_scaler)
+
+
+def _check_precision(source, model, input_scaler, target_scaler):
+    # Compares INFERENCE_PRECISION with a float64 forward pass on the calibration windows;
+    # raises if it is not allowed for this bundle (see precision.py)
+    if not source.calibration_path or not os.path.exists(source.calibration_path):
+        raise PrecisionRejected(f"No calibration set at {source.calibration_path} to check {INFERENCE_PRECISION} against.")
+    windows = load_calibration(source.calibration_path, model.input_shape[1], model.input_shape[2])
+    from jax_inference import CompiledForecaster
+    try:
+        # model.predict computes in the layers' float32 whatever it is given, so the reference is
+        # the compiled forward pass with float64 weights and layers
+        reference = CompiledForecaster(model, input_scaler, target_scaler, precision="float64").predict_aqi
+    except (TypeError, ValueError) as e:
+        raise PrecisionRejected(f"No float64 reference to check {INFERENCE_PRECISION} against: {e}") from e
+    if INFERENCE_MODE == "jax":
+        candidate = CompiledForecaster(model, input_scaler, target_scaler, precision=INFERENCE_PRECISION).predict_aqi
+    else:
+        candidate = functools.partial(_keras_predict_aqi, model, input_scaler.astype(np.float32), target_scaler.astype(np.float32),
+                                      dtype=np.float32)
+    return check_precision(INFERENCE_PRECISION, reference, candidate, windows)
+
+
+def _load_bundle(source, state, batcher=None):
+    # Loads one bundle's scalers, frameworks and model (and compiles the JAX path if enabled),
+    # recording per-artifact timings in state. Blocking; run it off the event loop.
+    with state.track("input_scaler"):
+        bundle_input_scaler = _load_scaler(source.input_scaler_path)
+    with state.track("target_scaler"):
+        bundle_target_scaler = _load_scaler(source.target_scaler_path)
+    bundle_y_scaler_train = None
+    with state.track("y_scaler_train", required=False):
+        bundle_y_scaler_train = np.load(source.y_scaler_train_path)
+    batcher = batcher or MicroBatcher(None)
+    precision, precision_report = "float64", None
+
+    if INFERENCE_POOL_SOCKET:
+        with state.track("inference_pool"):
+            bundle_model = _connect_inference_pool(batcher)
+        bundle_compiled = bundle_model if bundle_model.compiled else None
+        # The workers checked and chose the precision
+        precision = bundle_model.precision
+    else:
+        with state.track("frameworks"):
+            from tensorflow.keras.models import load_model
+            from tensorflow.keras.utils import custom_object_scope
+            # Assuming TKAN is installed and available
+            from tkan import TKAN
+            custom_objects = {"TKAN": TKAN}
+            try:
+                from tkat import TKAT
+                custom_objects["TKAT"] = TKAT
+            except ImportError:
+                log.info("TKAT library not found. If your model uses TKAT, ensure the library is installed.")
+
+        with state.track("model"):
+            log.info("Loading model %s from %s...", source.version, source.model_path)
+            with custom_object_scope(custom_objects):
+                bundle_model = load_model(source.model_path, compile=False)
+
+        if INFERENCE_PRECISION != "float64":
+            # Optional: a precision that fails the check (or can't be checked) leaves the bundle in float64.
+            # The custom layers have to resolve again to build the model in float64 for the reference.
+            with state.track("precision_check", required=False), custom_object_scope(custom_objects):
+                try:
+                    precision_report = _check_precision(source, bundle_model, bundle_input_scaler, bundle_target_scaler)
+                except PrecisionRejected as e:
+                    precision_report = e.report or None
+                    raise
+                precision = INFERENCE_PRECISION
+
+        bundle_compiled = None
+        if INFERENCE_MODE == "jax":
+            # Optional: on failure we keep serving through model.predict
+            with state.track("jax_compile", required=False), custom_object_scope(custom_objects):
+                from jax_inference import CompiledForecaster
+                forecaster = CompiledForecaster(bundle_model, bundle_input_scaler, bundle_target_scaler, precision=precision)
+                forecaster.warmup()
+                bundle_compiled = forecaster
+    if precision != "float64" and bundle_compiled is None:
+        # model.predict runs in float32 whatever it is given; scaling and the inverse transform follow suit
+        bundle_input_scaler, bundle_target_scaler = bundle_input_scaler.astype(np.float32), bundle_target_scaler.astype(np.float32)
+
+    bundle = ModelBundle(source, bundle_model, bundle_input_scaler, bundle_target_scaler, bundle_y_scaler_train, bundle_compiled,
+                         load_report=state.snapshot()["artifacts"], precision=precision, precision_report=precision_report)
+    # Each bundle has its own batcher, so a batch never mixes rows for two model versions
+    batcher.predict_fn = functools.partial(_batch_predict, bundle=bundle)
+    bundle.batcher = batcher
+    return bundle
+
+
+def _load_swap_bundle(source):
+    if INFERENCE_POOL_SOCKET:
+        # The pool workers hold the model; they are restarted to change it
+        raise RuntimeError("Models can't be swapped while serving through the inference pool; restart the pool instead.")
+    return _load_bundle(source, StartupState())
+
+
+def _publish(bundle):
+    # Module-level names follow the active bundle, for scripts that use them directly
+    # (benchmarks/bench_inference.py, backtest.py, inference_pool.py)
+    global input_scaler, target_scaler, y_scaler_train, model, compiled_forecaster, inference_batcher
+    input_scaler, target_scaler, y_scaler_train = bundle.input_scaler, bundle.target_scaler, bundle.y_scaler_train
+    model, compiled_forecaster, inference_batcher = bundle.model, bundle.compiled_forecaster, bundle.batcher
+
+
+def load_artifacts():
+    # Loads the startup bundle into the registry, recording per-artifact timings in
+    # startup_state. Blocking; run it off the event loop.
+    startup_state.begin()
+    try:
+        source = _startup_source()
+        bundle = _load_bundle(source, startup_state, batcher=inference_batcher)
+    except Exception as e:
+        startup_state.mark_failed(e)
+        return False
+
+    model_registry.set_initial(bundle)
+    _publish(bundle)
+    startup_state.mark_ready()
+    if INFERENCE_POOL_SOCKET:
+        log.info("Startup complete in %.2fs (inference pool at %s).", startup_state.time_to_ready_s, INFERENCE_POOL_SOCKET)
+    else:
+        log.info("Startup complete in %.2fs (model %s).", startup_state.time_to_ready_s, bundle.version)
+    return True
+
+
+def _batch_predict(X, bundle=None):
+    # With the compiled path the batcher takes unscaled sequences and returns AQI directly
+    bundle = bundle or model_registry.active
+    with stage_timer("model_forward"):
+        if bundle.compiled_forecaster is not None:
+            return bundle.compiled_forecaster.predict_aqi(X)
+        return bundle.model.predict(X, verbose=0)
+
+# Gathers concurrent /predict calls into one forward pass (see batching.py for the knobs).
+# This is the startup bundle's batcher; bundles swapped in later bring their own.
+inference_batcher = MicroBatcher(_batch_predict)
+
+
+async def _compute_tiles(cells):
+    # Forecasts TILE_HORIZON_HOURS ahead for a chunk of grid cells, as one batch per step,
+    # and stores them as this hour's tiles. Same inputs as a live /predict for the cell.
+    with model_registry.use() as bundle:
+        return await _compute_tiles_with(bundle, cells)
+
+
+async def _compute_tiles_with(bundle, cells):
+    SEQUENCE_LENGTH = bundle.sequence_length
+    hour = forecast_tiles.current_hour()
+    centres = [active_cells.centre(cell) for cell in cells]
+    # Tiles are kept for the whole hour, so they are only built from this hour's data
+    retrieved = await asyncio.gather(*[get_latest_data_sequence_async(SEQUENCE_LENGTH, lat, lon, allow_stale=False) for lat, lon in centres])
+    ready = [(cell, sequence, timestamps) for cell, (sequence, timestamps) in zip(cells, retrieved) if sequence is not None]
+    if not ready:
+        return 0
+    horizon = min(forecast_tiles.TILE_HORIZON_HOURS, MAX_N_AHEAD)
+    predicted = await _forecast_and_observe(np.concatenate([sequence for _, sequence, _ in ready], axis=0), horizon, bundle)
+    for row, (cell, _, timestamps) in enumerate(ready):
+        forecast_tiles_cache.put(cell, hour, _format_predictions(_prediction_timestamps(timestamps, horizon), predicted[row], horizon))
+    return len(ready)
+
+
+# Cells that were asked for recently, and their precomputed forecasts for the current hour
+active_cells = ActiveCellIndex(series_cache.grid_degrees, region=forecast_tiles.parse_region(forecast_tiles.TILE_REGION))
+forecast_tiles_cache = ForecastTiles()
+tile_scheduler = TileScheduler(active_cells, forecast_tiles_cache, _compute_tiles)
+
+
+async def _load_in_background():
+    loaded = await asyncio.get_running_loop().run_in_executor(None, load_artifacts)
+    if loaded:
+        inference_batcher.start()
+        if forecast_tiles.TILE_PRECOMPUTE:
+            tile_scheduler.start()
+        if MODEL_SHADOW_VERSION:
+            try:
+                await model_registry.set_shadow(MODEL_SHADOW_VERSION, MODEL_SHADOW_SAMPLE_RATE)
+            except Exception:
+                log.exception("Could not load shadow model %s.", MODEL_SHADOW_VERSION)
+
+
+async def _prune_timeseries_store():
+    # Hourly: delete stations (grid cells, sensor nodes) with no data inside the retention window
+    while True:
+        try:
+            removed = await asyncio.get_running_loop().run_in_executor(
+                None, timeseries_store.prune, epoch_hour(datetime.now(timezone.utc)))
+            if removed:
+                log.info("Pruned %d idle stations from the time-series store.", removed)
+        except Exception as e:
+            log.warning("Could not prune the time-series store: %s", e)
+        await asyncio.sleep(3600)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pooled Open-Meteo client up front so the first request doesn't pay for it
+    open_meteo.get_client()
+    loader = asyncio.create_task(_load_in_background())
+    pruner = asyncio.create_task(_prune_timeseries_store()) if timeseries_store is not None else None
+    yield
+    loader.cancel()
+    if pruner is not None:
+        pruner.cancel()
+    await tile_scheduler.stop()
+    await series_cache.stop()
+    await model_registry.stop()
+    await inference_batcher.stop()
+    if inference_pool_client is not None:
+        inference_pool_client.close()
+    await open_meteo.close_client()
+
+
+app = FastAPI(lifespan=lifespan)
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "vayu_request_seconds", "End-to-end HTTP request latency by route.", LATENCY_BUCKETS_S, labels=("route",))
+REQUESTS_TOTAL = REGISTRY.counter("vayu_requests_total", "HTTP requests by route and status code.", labels=("route", "status"))
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(route_path).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(route_path, status).inc()
+
+
+def _inference_pool_metrics():
+    if inference_pool_client is None:
+        return []
+    pool = inference_pool_client.stats()
+    return [
+        ("vayu_inference_pool_requests_total", "counter", "Batches sent to the inference pool.", [({}, pool["requests"])]),
+        ("vayu_inference_pool_errors_total", "counter", "Inference pool batches that failed.", [({}, pool["errors"])]),
+        ("vayu_inference_pool_connections", "gauge", "Open connections to the inference pool.", [({}, pool["connections"])]),
+    ]
+
+
+def _model_registry_metrics():
+    active, shadow = model_registry.active, model_registry.shadow
+    return [
+        ("vayu_model_info", "gauge", "Model versions loaded, by role (active or shadow).",
+         [({"version": b.version, "role": role}, 1) for role, b in (("active", active), ("shadow", shadow)) if b is not None]),
+        ("vayu_model_loading", "gauge", "1 while a model bundle is being loaded.", [({}, 1 if model_registry.loading else 0)]),
+    ]
+
+
+def _collect_component_metrics():
+    # Series cache, batcher and startup keep their own counters; export them at scrape time
+    cache = series_cache.stats()
+    batching = inference_batcher.stats()
+    startup = startup_state.snapshot()
+    tiles = tile_scheduler.stats()
+    sensors = sensor_nodes.stats()
+    return [
+        ("vayu_series_cache_lookups_total", "counter", "Hourly series cache lookups by result.",
+         [({"result": result}, cache[result]) for result in ("hits", "misses", "coalesced", "stale_served")]),
+        ("vayu_series_cache_revalidation_failures_total", "counter", "Background refreshes of stale series that failed.",
+         [({}, cache["revalidation_failures"])]),
+        ("vayu_series_cache_evictions_total", "counter", "Entries evicted from the hourly series cache.", [({}, cache["evictions"])]),
+        ("vayu_series_cache_entries", "gauge", "Entries currently in the hourly series cache.", [({}, cache["entries"])]),
+        ("vayu_inference_batches_total", "counter", "Micro-batches sent through the model.", [({}, batching["batches"])]),
+        ("vayu_inference_failed_batches_total", "counter", "Micro-batches whose forward pass raised.", [({}, batching["failed_batches"])]),
+        ("vayu_inference_queue_depth", "gauge", "Inference requests waiting for a batch.", [({}, batching["queued"])]),
+        ("vayu_inference_batch_size", "histogram", "Rows per micro-batch (before padding).", [({}, batching["batch_size"])]),
+        ("vayu_inference_queue_wait_seconds", "histogram", "Time a request waits in the batcher queue.",
+         [({}, scaled_snapshot(batching["queue_wait_ms"], 0.001))]),
+        ("vayu_tile_lookups_total", "counter", "Precomputed forecast tile lookups by result.",
+         [({"result": "hit"}, tiles["hits"]), ({"result": "miss"}, tiles["misses"])]),
+        ("vayu_tile_active_cells", "gauge", "Grid cells requested within TILE_ACTIVE_HOURS.", [({}, tiles["active_cells"])]),
+        ("vayu_tiles", "gauge", "Forecast tiles held for the current hour.", [({}, tiles["tiles"])]),
+        ("vayu_tile_refreshes_total", "counter", "Completed hourly tile refreshes.", [({}, tiles["refreshes"])]),
+        *_inference_pool_metrics(),
+        *_model_registry_metrics(),
+        ("vayu_sensor_readings_total", "counter", "Sensor readings received on /ingest by result.",
+         [({"result": "accepted"}, sensors["accepted"]), ({"result": "rejected"}, sensors["rejected"])]),
+        ("vayu_sensor_nodes", "gauge", "Sensor nodes with buffered readings.", [({}, sensors["nodes"])]),
+        ("vayu_sensor_window_resets_total", "counter", "Node windows restarted after a gap longer than SENSOR_MAX_GAP_HOURS.",
+         [({}, sensors["window_resets"])]),
+        ("vayu_sensor_forecasts_total", "counter", "Forecasts served from a node's buffered window.", [({}, sensors["forecasts"])]),
+        ("vayu_ready", "gauge", "1 once all required artifacts are loaded.", [({}, 1 if startup["ready"] else 0)]),
+        ("vayu_time_to_ready_seconds", "gauge", "Seconds from process start until ready.",
+         [({}, startup["time_to_ready_s"])] if startup["time_to_ready_s"] is not None else []),
+    ]
+
+REGISTRY.register_collector(_collect_component_metrics)
 
 class PredictionRequest(BaseModel):
     latitude: float
@@ -376,6 +901,7 @@ class PredictionRequest(BaseModel):
     co: float = None
     temp: float = None
     n_ahead: int = 1 
+    node_id: Optional[str] = None  # forecast from this node's ingested readings when its window is complete
 
 
 class PredictionResponse(BaseModel):
@@ -384,113 +910,453 @@ class PredictionResponse(BaseModel):
     predictions: list = None 
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_aqi_endpoint(request: PredictionRequest):
-    if model is None or input_scaler is None or target_scaler is None:
-        print("API called but model or scalers are not loaded.")
-        raise HTTPException(status_code=500, detail="Model or scalers not loaded. Check server logs for details.")
+class SensorReading(BaseModel):
+    # Same fields the node sketch reports; timestamp is ISO 8601 or its "dd-mm-YYYY HH:MM" local time
+    # Missing values may be sent as null; such readings are rejected individually
+    node_id: str
+    timestamp: str
+    temp: Optional[float] = None
+    pm2_5: Optional[float] = None
+    pm10: Optional[float] = None
+    co: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class IngestRequest(BaseModel):
+    readings: list[SensorReading]
+
+
+class IngestResponse(BaseModel):
+    status: str
+    accepted: int
+    rejected: list = None
+
 
+class BatchPredictionRequest(BaseModel):
+    items: list[PredictionRequest]
+
+
+class BatchPredictionResponse(BaseModel):
+    status: str
+    message: str
+    results: list[PredictionResponse] = None
+
+
+# Upper bound on items per /predict_many call, to keep a single request from monopolising a worker
+MAX_BATCH_ITEMS = int(os.environ.get("PREDICT_MANY_MAX_ITEMS", "200"))
+# Longest horizon served; longer ones compound the recursive forecast error without much use
+MAX_N_AHEAD = int(os.environ.get("MAX_N_AHEAD", "72"))
+
+
+def _check_ready():
+    if not startup_state.ready:
+        if startup_state.phase == "failed":
+            log.error("API called but model or scalers failed to load.")
+            raise HTTPException(status_code=500, detail="Model or scalers not loaded. Check server logs for details.")
+        raise HTTPException(status_code=503, detail="Model is still loading. Retry shortly.", headers={"Retry-After": "5"})
+
+
+async def _pinned_bundle():
+    # Request dependency: the bundle active when the request started serves all of it,
+    # even if another one is swapped in meanwhile
+    _check_ready()
+    with model_registry.use() as bundle:
+        yield bundle
+
+
+def _get_sequence_length(bundle):
+    # Validates the bundle's model and returns its input window length.
+    model = bundle.model
     if model.input_shape is None or len(model.input_shape) < 2:
-         print(f"Error: Model has unexpected input shape: {model.input_shape}")
+         log.error("Model has unexpected input shape: %s", model.input_shape)
          raise HTTPException(status_code=500, detail=f"Model has unexpected input shape: {model.input_shape}")
 
     SEQUENCE_LENGTH = model.input_shape[1]
     NUM_FEATURES = model.input_shape[2]
     required_num_features_model = len(['calculated_aqi', 'temp', 'pm25', 'pm10', 'co'])
     if NUM_FEATURES != required_num_features_model:
-         print(f"Error: Model expects {NUM_FEATURES} features, but data processing provides {required_num_features_model}.")
+         log.error("Model expects %d features, but data processing provides %d.", NUM_FEATURES, required_num_features_model)
          raise HTTPException(status_code=500, detail=f"Model expects {NUM_FEATURES} features, data processing provides {required_num_features_model}.")
+    return SEQUENCE_LENGTH
 
-    latest_data_sequence_unscaled, message = get_latest_data_sequence(SEQUENCE_LENGTH, request.latitude, request.longitude)
-
-    if latest_data_sequence_unscaled is None:
-        print(f"Data retrieval failed: {message}")
-        return PredictionResponse(status="error", message=f"Data retrieval failed: {message}")
 
+def _prediction_timestamps(timestamps, n_ahead: int):
     prediction_timestamps = []
-    if message and isinstance(message, list) and len(message) > 0: 
-        last_timestamp_of_sequence = message[-1] 
-        for i in range(request.n_ahead):
+    if timestamps and isinstance(timestamps, list) and len(timestamps) > 0: 
+        last_timestamp_of_sequence = timestamps[-1] 
+        for i in range(n_ahead):
             prediction_timestamps.append(last_timestamp_of_sequence + timedelta(hours=i + 1))
     else:
-        print("Warning: Could not get valid timestamps from data retrieval. Prediction timestamps will be approximate.")
+        log.warning("Could not get valid timestamps from data retrieval. Prediction timestamps will be approximate.")
         now_utc = datetime.now(pytz.utc)
-        for i in range(request.n_ahead):
+        for i in range(n_ahead):
              prediction_timestamps.append(now_utc + timedelta(hours=i+1))
+    return prediction_timestamps
+
 
-    if request.pm25 is not None and not pd.isna(request.pm25) and \
+def _has_current_readings(request: PredictionRequest) -> bool:
+    return request.pm25 is not None and not pd.isna(request.pm25) and \
        request.pm10 is not None and not pd.isna(request.pm10) and \
        request.co is not None and not pd.isna(request.co) and \
-       request.temp is not None and not pd.isna(request.temp):
+       request.temp is not None and not pd.isna(request.temp)
+
+
+def _apply_current_readings(latest_data_sequence_unscaled, request: PredictionRequest, SEQUENCE_LENGTH: int):
+    # Overwrites the last timestep with the caller's current readings when all four are given.
+    # Returns the sequence to use: a copy if the input was a read-only view from the store.
+    if _has_current_readings(request):
 
         current_aqi = calculate_overall_aqi({'pm25': request.pm25, 'pm10': request.pm10, 'co': request.co, 'temp': request.temp}, aqi_breakpoints)
 
         if not pd.isna(current_aqi) and latest_data_sequence_unscaled.shape[1] == SEQUENCE_LENGTH : # Ensure sequence is correctly shaped
+            if not latest_data_sequence_unscaled.flags.writeable:
+                latest_data_sequence_unscaled = latest_data_sequence_unscaled.copy()
             latest_data_sequence_unscaled[0, -1, 0] = current_aqi
             latest_data_sequence_unscaled[0, -1, 1] = request.temp
             latest_data_sequence_unscaled[0, -1, 2] = request.pm25
             latest_data_sequence_unscaled[0, -1, 3] = request.pm10
             latest_data_sequence_unscaled[0, -1, 4] = request.co
-            print("Updated last timestep of input sequence with current user inputs.")
+            log.debug("Updated last timestep of input sequence with current user inputs.")
         elif pd.isna(current_aqi):
-             print("Warning: Could not calculate AQI for current inputs. Last timestep remains historical.")
+             log.warning("Could not calculate AQI for current inputs. Last timestep remains historical.")
         else:
-            print("Warning: Sequence not correctly shaped to update with current user inputs, or current_aqi is NaN.")
+            log.warning("Sequence not correctly shaped to update with current user inputs, or current_aqi is NaN.")
+    return latest_data_sequence_unscaled
 
 
-    try:
-        X_scaled = input_scaler.transform(latest_data_sequence_unscaled)
-        print("Input data scaled successfully.")
-    except Exception as e:
-        print(f"Error scaling input data: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Error processing input data for prediction (scaling).")
+def _inverse_transform_batch(sequences_unscaled, scaled_predictions, scaler=None):
+    # Maps scaled ratio predictions (B, k) back to AQI using, per row, the recent-AQI proxy
+    # for the rolling median (mean of the last 5 calculated_aqi values, 1.0 if unusable).
+    if sequences_unscaled.shape[1] == 0:
+        log.error("Input sequence is empty, cannot perform inverse transform.")
+        raise ValueError("Input sequence is empty.")
+    batch_size, sequence_length = sequences_unscaled.shape[0], sequences_unscaled.shape[1]
 
-    try:
-        scaled_prediction = model.predict(X_scaled, verbose=0) 
-        print(f"Model prediction made. Scaled prediction shape: {scaled_prediction.shape}")
-    except Exception as e:
-        print(f"Error during model prediction: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Error during model prediction.")
+    approx_rolling_median_proxy = np.mean(sequences_unscaled[:, -min(5, sequence_length):, 0], axis=1)
+    approx_rolling_median_proxy = np.where(np.isnan(approx_rolling_median_proxy) | (approx_rolling_median_proxy <= 0), 1.0, approx_rolling_median_proxy)
+    corresponding_rolling_median_scaler = approx_rolling_median_proxy.astype(np.float32)[:, None, None]
 
-    try:
-        if latest_data_sequence_unscaled.shape[1] > 0:
-            calculated_aqi_sequence = latest_data_sequence_unscaled[0, :, 0] 
+    scaler = scaler or target_scaler
+    y_unscaled_pred_ratio = scaler.inverse_transform(np.asarray(scaled_predictions).reshape(batch_size, -1, 1))
+    predicted_aqi_values = y_unscaled_pred_ratio * corresponding_rolling_median_scaler
+    return predicted_aqi_values.reshape(batch_size, -1)
 
-            approx_rolling_median_proxy = np.mean(calculated_aqi_sequence[-min(5, SEQUENCE_LENGTH):])
-            if pd.isna(approx_rolling_median_proxy) or approx_rolling_median_proxy <= 0:
-                 approx_rolling_median_proxy = 1.0 
 
-            corresponding_rolling_median_scaler = np.full((1, request.n_ahead, 1), approx_rolling_median_proxy, dtype=np.float32)
-            print(f"Approximated rolling median proxy for inverse transform: {approx_rolling_median_proxy:.2f}")
+def _model_steps_per_call(bundle):
+    # Hours predicted by one forward pass (1 for best_model_TKAN_nahead_1)
+    return int(np.prod(bundle.model.output_shape[1:]))
 
-            y_unscaled_pred_ratio = target_scaler.inverse_transform(scaled_prediction.reshape(1, request.n_ahead, 1))
-            print(f"Inverse transformed to ratio scale. Shape: {y_unscaled_pred_ratio.shape}")
 
-            predicted_aqi_values = y_unscaled_pred_ratio * corresponding_rolling_median_scaler
-            predicted_aqi_values = predicted_aqi_values.flatten() 
-        else:
-            print("Error: Input sequence is empty, cannot perform inverse transform.")
-            raise ValueError("Input sequence is empty.")
+async def _predict_next_steps(windows_unscaled, bundle):
+    # One forward pass for a batch of unscaled windows -> (B, steps_per_call) AQI values
+    if bundle.compiled_forecaster is not None:
+        return await bundle.batcher.submit(windows_unscaled)
+    with stage_timer("scale"):
+        windows_unscaled = windows_unscaled.astype(bundle.dtype, copy=False)
+        X_scaled = bundle.input_scaler.transform(windows_unscaled)
+    scaled_predictions = await bundle.batcher.submit(X_scaled)
+    with stage_timer("inverse_transform"):
+        return _inverse_transform_batch(windows_unscaled, scaled_predictions, bundle.target_scaler)
 
-        print(f"Final predicted AQI values: {predicted_aqi_values}")
 
-    except Exception as e:
-        print(f"Error during inverse transformation: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Error processing prediction results (inverse transform).")
+async def _forecast_aqi(sequences_unscaled, n_ahead: int, bundle=None):
+    # (B, seq_len, 5) unscaled sequences -> (B, n_ahead) AQI. Horizons beyond what the model
+    # predicts in one pass are rolled forward recursively, all rows in lockstep.
+    # Without a bundle, the active one is used.
+    bundle = bundle or model_registry.active
+    return await recursive_forecast(functools.partial(_predict_next_steps, bundle=bundle), sequences_unscaled, n_ahead,
+                                    steps_per_call=_model_steps_per_call(bundle))
+
+
+async def _forecast_and_observe(sequences_unscaled, n_ahead: int, bundle):
+    # Served forecasts (live and tiles); a sample of them is also run on the shadow model, if any
+    predicted = await _forecast_aqi(sequences_unscaled, n_ahead, bundle)
+    model_registry.observe(sequences_unscaled, n_ahead, predicted)
+    return predicted
+
+
+async def _refresh_tiles_after_swap(bundle, previous):
+    # Tiles from the previous model would otherwise be served until the next hourly refresh
+    forecast_tiles_cache.clear()
+    if tile_scheduler.stats()["enabled"]:
+        await tile_scheduler.refresh()
+
+
+# Active model bundle, optional shadow candidate, and hot swapping (see model_registry.py)
+model_registry = ModelRegistry(_load_swap_bundle, _forecast_aqi)
+model_registry.on_swap += [lambda bundle, previous: _publish(bundle), _refresh_tiles_after_swap]
+
+
+def _check_n_ahead(n_ahead: int):
+    if n_ahead < 1 or n_ahead > MAX_N_AHEAD:
+        return f"n_ahead must be between 1 and {MAX_N_AHEAD}, got {n_ahead}."
+    return None
 
+
+async def _node_sequence(request: PredictionRequest, SEQUENCE_LENGTH: int):
+    # The node's buffered window when the request names a node with a complete, recent one;
+    # (None, None) sends the request down the Open-Meteo path instead
+    if request.node_id is None:
+        return None, None
+    with stage_timer("node_window"):
+        sequence, message = await sensor_nodes.window(request.node_id, SEQUENCE_LENGTH, epoch_hour(datetime.now(timezone.utc)))
+    if sequence is None:
+        log.debug("Node %s window not usable (%s); using Open-Meteo data.", request.node_id, message)
+        return None, None
+    return sequence, message
+
+
+def _precomputed_predictions(request: PredictionRequest):
+    # Marks the request's cell as active and returns its tile for this hour, if there is one.
+    # Requests with their own current readings change the model input, so they never use tiles.
+    cell = active_cells.touch(request.latitude, request.longitude)
+    if _has_current_readings(request):
+        return None
+    return forecast_tiles_cache.lookup(cell, request.n_ahead)
+
+
+def _format_predictions(prediction_timestamps, predicted_aqi_values, n_ahead: int):
     predictions_list = []
-    for i in range(request.n_ahead):
+    for i in range(n_ahead):
         timestamp_str = prediction_timestamps[i].strftime('%Y-%m-%d %H:%M:%S')
         predictions_list.append({
             "timestamp": timestamp_str,
             "aqi": float(predicted_aqi_values[i]) 
         })
+    return predictions_list
+
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict_aqi_endpoint(request: PredictionRequest, bundle: ModelBundle = Depends(_pinned_bundle)):
+    SEQUENCE_LENGTH = _get_sequence_length(bundle)
+    n_ahead_error = _check_n_ahead(request.n_ahead)
+    if n_ahead_error:
+        raise HTTPException(status_code=400, detail=n_ahead_error)
+
+    latest_data_sequence_unscaled, message = await _node_sequence(request, SEQUENCE_LENGTH)
+    if latest_data_sequence_unscaled is None:
+        precomputed = _precomputed_predictions(request)
+        if precomputed is not None:
+            return PredictionResponse(status="success", message="Prediction successful.", predictions=precomputed)
 
+        latest_data_sequence_unscaled, message = await get_latest_data_sequence_async(SEQUENCE_LENGTH, request.latitude, request.longitude)
+
+    if latest_data_sequence_unscaled is None:
+        log.warning("Data retrieval failed: %s", message)
+        return PredictionResponse(status="error", message=f"Data retrieval failed: {message}")
+
+    prediction_timestamps = _prediction_timestamps(message, request.n_ahead)
+    latest_data_sequence_unscaled = _apply_current_readings(latest_data_sequence_unscaled, request, SEQUENCE_LENGTH)
+
+    try:
+        predicted_aqi_values = (await _forecast_and_observe(latest_data_sequence_unscaled, request.n_ahead, bundle))[0]
+        log.debug("Final predicted AQI values: %s", predicted_aqi_values)
+    except Exception as e:
+        log.exception("Error during model prediction: %s", e)
+        raise HTTPException(status_code=500, detail="Error during model prediction.")
+
+    predictions_list = _format_predictions(prediction_timestamps, predicted_aqi_values, request.n_ahead)
     return PredictionResponse(status="success", message="Prediction successful.", predictions=predictions_list)
 
+
+@app.post("/predict_many", response_model=BatchPredictionResponse)
+async def predict_many_endpoint(batch: BatchPredictionRequest, bundle: ModelBundle = Depends(_pinned_bundle)):
+    # Bulk variant of /predict: upstream fetches run concurrently, all sequences are scaled
+    # in one transform call and go through the model as a single batch per forecast step.
+    # Each item gets its own status, so one bad location doesn't fail the whole request.
+    SEQUENCE_LENGTH = _get_sequence_length(bundle)
+
+    if not batch.items:
+        return BatchPredictionResponse(status="success", message="No items to predict.", results=[])
+    if len(batch.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items: {len(batch.items)} (max {MAX_BATCH_ITEMS}).")
+
+    results = [None] * len(batch.items)
+    pending = []  # items that need a live forecast from Open-Meteo data
+    ready = []  # (item index, unscaled sequence, timestamps)
+    for i, item in enumerate(batch.items):
+        n_ahead_error = _check_n_ahead(item.n_ahead)
+        if n_ahead_error:
+            results[i] = PredictionResponse(status="error", message=n_ahead_error)
+            continue
+        sequence, timestamps = await _node_sequence(item, SEQUENCE_LENGTH)
+        if sequence is not None:
+            ready.append((i, _apply_current_readings(sequence, item, SEQUENCE_LENGTH), timestamps))
+            continue
+        precomputed = _precomputed_predictions(item)
+        if precomputed is not None:
+            results[i] = PredictionResponse(status="success", message="Prediction successful.", predictions=precomputed)
+            continue
+        pending.append(i)
+
+    retrieved = await asyncio.gather(*[
+        get_latest_data_sequence_async(SEQUENCE_LENGTH, batch.items[i].latitude, batch.items[i].longitude) for i in pending
+    ])
+
+    for i, (sequence, message) in zip(pending, retrieved):
+        item = batch.items[i]
+        if sequence is None:
+            results[i] = PredictionResponse(status="error", message=f"Data retrieval failed: {message}")
+            continue
+        sequence = _apply_current_readings(sequence, item, SEQUENCE_LENGTH)
+        ready.append((i, sequence, message))
+
+    if ready:
+        # All locations roll forward together to the longest requested horizon
+        max_n_ahead = max(batch.items[i].n_ahead for i, _, _ in ready)
+        try:
+            X_unscaled = np.concatenate([sequence for _, sequence, _ in ready], axis=0)
+            predicted = await _forecast_and_observe(X_unscaled, max_n_ahead, bundle)
+            log.debug("Batch model prediction made for %d items. Output shape: %s", len(ready), predicted.shape)
+        except Exception as e:
+            log.exception("Error during batch prediction: %s", e)
+            raise HTTPException(status_code=500, detail="Error during model prediction.")
+
+        for row, (i, sequence, timestamps) in enumerate(ready):
+            item = batch.items[i]
+            prediction_timestamps = _prediction_timestamps(timestamps, item.n_ahead)
+            results[i] = PredictionResponse(status="success", message="Prediction successful.",
+                                            predictions=_format_predictions(prediction_timestamps, predicted[row], item.n_ahead))
+
+    succeeded = sum(1 for r in results if r.status == "success")
+    if succeeded == len(results):
+        status = "success"
+    elif succeeded == 0:
+        status = "error"
+    else:
+        status = "partial"
+    return BatchPredictionResponse(status=status, message=f"{succeeded} of {len(results)} predictions succeeded.", results=results)
+
+# Sensor nodes authenticate with X-Ingest-Token; /ingest refuses every call until SENSOR_INGEST_TOKEN is set
+SENSOR_INGEST_TOKEN = os.environ.get("SENSOR_INGEST_TOKEN", "")
+if not SENSOR_INGEST_TOKEN:
+    log.info("SENSOR_INGEST_TOKEN is not set: /ingest is disabled.")
+# Upper bound on readings per /ingest call
+MAX_INGEST_READINGS = int(os.environ.get("SENSOR_INGEST_MAX_READINGS", "5000"))
+
+
+@app.post("/ingest", response_model=IngestResponse)
+async def ingest_readings(batch: IngestRequest, x_ingest_token: str = Header(default="")):
+    # Hourly readings from any number of nodes; each is validated on its own and the rest are kept
+    if not SENSOR_INGEST_TOKEN:
+        raise HTTPException(status_code=403, detail="Ingest is disabled until SENSOR_INGEST_TOKEN is set.")
+    if not hmac.compare_digest(x_ingest_token.encode(), SENSOR_INGEST_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid ingest token.")
+    if len(batch.readings) > MAX_INGEST_READINGS:
+        raise HTTPException(status_code=400, detail=f"Too many readings: {len(batch.readings)} (max {MAX_INGEST_READINGS}).")
+    accepted, rejected = await sensor_nodes.ingest(batch.readings, epoch_hour(datetime.now(timezone.utc)))
+    if not rejected:
+        status = "success"
+    elif accepted == 0:
+        status = "error"
+    else:
+        status = "partial"
+    return IngestResponse(status=status, accepted=accepted, rejected=rejected)
+
+@app.get("/sensors/stats")
+async def sensors_stats():
+    return sensor_nodes.stats()
+
+@app.get("/sensors/{node_id}")
+async def sensor_node(node_id: str):
+    node = await sensor_nodes.describe(node_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"No readings from node '{node_id}'.")
+    return node
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return series_cache.stats()
+
+@app.get("/batching/stats")
+async def batching_stats():
+    stats = inference_batcher.stats()
+    if inference_pool_client is not None:
+        stats["inference_pool"] = inference_pool_client.stats()
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus scrape target
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/tiles/stats")
+async def tiles_stats():
+    return tile_scheduler.stats()
+
+@app.get("/upstream/stats")
+async def upstream_stats():
+    # Circuit breaker per Open-Meteo host
+    return open_meteo.breaker_stats()
+
+# Model management. Callers must send MODEL_ADMIN_TOKEN in the X-Admin-Token header; without a
+# token the endpoints refuse every call, unless MODEL_ADMIN_OPEN=1 deliberately opens them.
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN", "")
+MODEL_ADMIN_OPEN = os.environ.get("MODEL_ADMIN_OPEN", "0") not in ("0", "false", "no", "")
+if not MODEL_ADMIN_TOKEN:
+    if MODEL_ADMIN_OPEN:
+        log.warning("MODEL_ADMIN_OPEN is set: model management endpoints accept calls without a token.")
+    else:
+        log.info("MODEL_ADMIN_TOKEN is not set: model management endpoints are disabled.")
+
+
+class ModelVersionRequest(BaseModel):
+    version: str
+    sample_rate: float = MODEL_SHADOW_SAMPLE_RATE
+
+
+def _check_admin(x_admin_token: str = Header(default="")):
+    if not MODEL_ADMIN_TOKEN:
+        if MODEL_ADMIN_OPEN:
+            return
+        raise HTTPException(status_code=403, detail="Model management is disabled until MODEL_ADMIN_TOKEN is set.")
+    if not hmac.compare_digest(x_admin_token.encode(), MODEL_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def _start_model_load(start, version: str):
+    # Loads run in the background; progress and failures show up in GET /models
+    _check_ready()
+    try:
+        model_registry.source(version)
+        model_registry.start(version, start)
+    except BundleNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SwapInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "loading", "version": version})
+
+@app.get("/models")
+async def models_status():
+    return model_registry.stats()
+
+@app.post("/models/activate", dependencies=[Depends(_check_admin)])
+async def activate_model(request: ModelVersionRequest):
+    # Loads and warms up the version, then swaps it in; in-flight requests finish on the old one
+    return _start_model_load(lambda: model_registry.activate(request.version), request.version)
+
+@app.put("/models/shadow", dependencies=[Depends(_check_admin)])
+async def shadow_model(request: ModelVersionRequest):
+    # Repeats a sample_rate share of live forecasts on the version, without serving its output
+    return _start_model_load(lambda: model_registry.set_shadow(request.version, request.sample_rate), request.version)
+
+@app.delete("/models/shadow", dependencies=[Depends(_check_admin)])
+async def stop_shadow_model():
+    await model_registry.clear_shadow()
+    return {"status": "ok"}
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and the event loop is responsive
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # Readiness: all required artifacts are loaded (and warmed up)
+    state = startup_state.snapshot()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 @app.get("/")
 async def read_root():
     return {"message": "AQI Prediction API is running."}
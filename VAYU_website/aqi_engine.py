@@ -0,0 +1,101 @@
+# aqi_engine.py
+# NumPy-vectorized AQI computation.
+#
+# Mirrors calculate_sub_aqi / calculate_overall_aqi in app.py exactly (same breakpoint
+# tuple interpretation, inclusive segment bounds, clamping below/above the table, NaN for
+# gaps between segments and for missing readings) but works on whole columns at once:
+# the breakpoint table is compiled once into sorted boundary arrays and every value is
+# placed with np.searchsorted and interpolated in a single pass.
+
+import numpy as np
+
+# Same mapping as calculate_overall_aqi: API column names -> breakpoint table names
+POLLUTANT_MAPPING = {
+    'pm25': 'pm25',
+    'pm10': 'pm10',
+    'co': 'co',
+    'pm2_5': 'pm25',
+    'carbon_monoxide': 'co',
+}
+
+
+class _CompiledBreakpoints:
+    def __init__(self, pollutant, breakpoints):
+        if not breakpoints:
+            raise ValueError(f"No AQI breakpoints defined for '{pollutant}'.")
+        # Tuples are read the same way calculate_sub_aqi unpacks them: (i_low, i_high, c_low, c_high)
+        table = np.asarray(breakpoints, dtype=np.float64)
+        self.i_low, self.i_high, self.c_low, self.c_high = table.T.copy()
+
+        if np.any(np.diff(self.c_low) < 0) or np.any(self.c_high < self.c_low) or np.any(self.c_high[:-1] > self.c_low[1:]):
+            # searchsorted relies on ordered, non-overlapping segments; the row-wise
+            # version would silently take the first match instead.
+            raise ValueError(f"AQI breakpoints for '{pollutant}' must be sorted and non-overlapping.")
+
+        width = self.c_high - self.c_low
+        degenerate = width == 0
+        self.degenerate = degenerate
+        self.slope = np.where(degenerate, 0.0, (self.i_high - self.i_low) / np.where(degenerate, 1.0, width))
+
+    def sub_aqi(self, concentrations):
+        x = np.asarray(concentrations, dtype=np.float64)
+        result = np.full(x.shape, np.nan)
+
+        # Last segment whose lower bound is <= x. When two segments touch, calculate_sub_aqi
+        # takes the earlier one for a value sitting exactly on the shared bound.
+        idx = np.searchsorted(self.c_low, x, side='right') - 1
+        prev = idx - 1
+        use_prev = (prev >= 0) & (x <= self.c_high[np.clip(prev, 0, None)])
+        idx = np.where(use_prev, prev, idx)
+
+        safe_idx = np.clip(idx, 0, None)
+        inside = (idx >= 0) & (x <= self.c_high[safe_idx]) & ~np.isnan(x)
+        seg = safe_idx[inside]
+        result[inside] = np.where(
+            self.degenerate[seg],
+            self.i_low[seg],
+            self.slope[seg] * (x[inside] - self.c_low[seg]) + self.i_low[seg],
+        )
+
+        below = x < self.c_low[0]
+        result[below] = self.i_low[0]
+        above = x > self.c_high[-1]
+        result[above] = self.i_high[-1]
+        return result
+
+
+def _n_rows(columns):
+    if hasattr(columns, 'columns'):  # DataFrame
+        return len(columns)
+    first = next(iter(columns.values()), None)
+    return 0 if first is None else len(first)
+
+
+class VectorizedAQI:
+    """Column-wise AQI calculator compiled from an ``aqi_breakpoints`` table."""
+
+    def __init__(self, breakpoints):
+        self._tables = {name: _CompiledBreakpoints(name, bps) for name, bps in breakpoints.items()}
+
+    def sub_aqi(self, pollutant, concentrations):
+        return self._tables[pollutant].sub_aqi(concentrations)
+
+    def sub_aqis(self, columns):
+        """Sub-AQI arrays for every pollutant column present in ``columns``.
+
+        ``columns`` can be a DataFrame or any mapping of column name -> 1D array.
+        Returns a dict keyed by the API column name.
+        """
+        sub = {}
+        for api_pollutant, internal_pollutant in POLLUTANT_MAPPING.items():
+            if api_pollutant in columns:
+                sub[api_pollutant] = self.sub_aqi(internal_pollutant, columns[api_pollutant])
+        return sub
+
+    def overall_aqi(self, columns):
+        """Overall AQI (max of the available sub-AQIs) per row; NaN where none is available."""
+        sub = list(self.sub_aqis(columns).values())
+        if not sub:
+            return np.full(_n_rows(columns), np.nan)
+        # fmax ignores NaN unless every input is NaN, matching np.nanmax per row without the warning
+        return np.fmax.reduce(np.vstack(sub), axis=0)
@@ -0,0 +1,312 @@
+# backtest.py
+# Historical backtest and bulk scoring through the serving pipeline.
+#
+# Reads a long hourly history (CSV or Parquet) and scores a forecast from every hour in it,
+# going through exactly what /predict uses:
+#   - preprocessing.build_hourly_grid: hourly axis, forward/back fill, AQI (app.aqi_calculator)
+#   - app._forecast_aqi: input MinMax scaling, the batched forward pass (micro-batcher, so the
+#     compiled JAX path and the inference pool apply too), the target inverse transform with
+#     the rolling-median ratio, and the recursive roll-forward for horizons beyond one hour
+# Windows are a zero-copy sliding_window_view over the hourly grid. They are forecast in
+# chunks of --chunk-size, so memory is bounded by the chunk and not by the length of the
+# history. MAE and RMSE are accumulated per forecast horizon as the chunks complete.
+#
+# The history needs a timestamp column and columns for the four model inputs, in the units
+# Open-Meteo serves them (pm2_5/pm25 and pm10 in µg/m³, carbon_monoxide/co in µg/m³,
+# temperature_2m/temp in °C). Sub-hourly or duplicate rows are averaged per UTC hour.
+# Windows and targets that would rely on filled-in (missing) hours are skipped.
+#
+#   python backtest.py history.csv --horizon 24 --json backtest.json
+#   python backtest.py history.parquet --model candidate.keras --predictions scores.csv --start 2024-01-01
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Source column (as build_hourly_grid expects it) -> accepted names in the history file
+COLUMN_ALIASES = {
+    "pm2_5": ("pm2_5", "pm25", "PM2.5"),
+    "pm10": ("pm10", "PM10"),
+    "carbon_monoxide": ("carbon_monoxide", "co", "CO"),
+    "temperature_2m": ("temperature_2m", "temp", "temperature"),
+}
+TIME_ALIASES = ("time", "timestamp", "datetime", "date")
+READ_CHUNK_ROWS = 200_000
+
+
+def _resolve_columns(available, time_column=None):
+    available = list(available)
+    if time_column is None:
+        time_column = next((c for c in TIME_ALIASES if c in available), None)
+    if time_column not in available:
+        raise ValueError(f"No timestamp column found (tried {', '.join(TIME_ALIASES)}); pass --time-column.")
+    mapping = {}
+    for source, aliases in COLUMN_ALIASES.items():
+        name = next((a for a in aliases if a in available), None)
+        if name is None:
+            raise ValueError(f"No column for {source} (tried {', '.join(aliases)}).")
+        mapping[source] = name
+    return time_column, mapping
+
+
+def _iter_frames(path: str, time_column=None):
+    """(time column, {source: column}) and then DataFrame chunks of the history, read in order."""
+    if path.endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet needs pyarrow (pip install pyarrow).")
+        parquet = pq.ParquetFile(path)
+        time_column, mapping = _resolve_columns(parquet.schema_arrow.names, time_column)
+        columns = [time_column, *mapping.values()]
+        yield time_column, mapping
+        for batch in parquet.iter_batches(batch_size=READ_CHUNK_ROWS, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    header = pd.read_csv(path, nrows=0).columns
+    time_column, mapping = _resolve_columns(header, time_column)
+    yield time_column, mapping
+    yield from pd.read_csv(path, usecols=[time_column, *mapping.values()], chunksize=READ_CHUNK_ROWS)
+
+
+def read_hourly_history(path: str, time_column=None):
+    """Hourly means of the four inputs: ``(hours since the epoch, {source: float64 array})``."""
+    frames = _iter_frames(path, time_column)
+    time_column, mapping = next(frames)
+    hours, columns = [], {source: [] for source in mapping}
+    for frame in frames:
+        timestamps = pd.to_datetime(frame[time_column], utc=True, errors="coerce")
+        keep = timestamps.notna().to_numpy()
+        hours.append(timestamps[keep].to_numpy(dtype="datetime64[h]").astype(np.int64))
+        for source, name in mapping.items():
+            columns[source].append(pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=np.float64)[keep])
+    if not hours or not sum(h.size for h in hours):
+        raise ValueError(f"No rows with a valid timestamp in {path}.")
+
+    hours = np.concatenate(hours)
+    unique_hours, row = np.unique(hours, return_inverse=True)
+    averaged = {}
+    for source, chunks in columns.items():
+        values = np.concatenate(chunks)
+        present = ~np.isnan(values)
+        total = np.bincount(row[present], weights=values[present], minlength=unique_hours.size)
+        count = np.bincount(row[present], minlength=unique_hours.size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averaged[source] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return unique_hours, averaged
+
+
+def _payloads(hours, columns):
+    # The two Open-Meteo payload shapes build_hourly_grid consumes
+    times = hours.astype("datetime64[h]")
+    air_quality = {"hourly": {"time": times, **{k: columns[k] for k in ("pm2_5", "pm10", "carbon_monoxide")}}}
+    weather = {"hourly": {"time": times, "temperature_2m": columns["temperature_2m"]}}
+    return air_quality, weather
+
+
+def _observed_rows(grid, hours, columns):
+    # Rows of the grid where every input was actually measured (not filled in)
+    complete = np.logical_and.reduce([~np.isnan(v) for v in columns.values()])
+    observed = np.zeros(grid.values.shape[0], dtype=bool)
+    rows = hours[complete] - grid.start_hour
+    observed[rows[(rows >= 0) & (rows < observed.size)]] = True
+    return observed
+
+
+def _window_starts(observed, sequence_length: int, start_hour: int, first_hour=None, last_hour=None, stride: int = 1):
+    # Windows whose every row was observed, optionally only those issued within [first, last]
+    counts = np.concatenate([[0], np.cumsum(observed)])
+    n_windows = observed.size - sequence_length + 1
+    if n_windows <= 0:
+        return np.empty(0, dtype=np.int64)
+    complete = (counts[sequence_length:] - counts[:n_windows]) == sequence_length
+    starts = np.flatnonzero(complete)
+    issued = start_hour + starts + sequence_length - 1
+    if first_hour is not None:
+        starts = starts[issued >= first_hour]
+        issued = issued[issued >= first_hour]
+    if last_hour is not None:
+        starts = starts[issued <= last_hour]
+    return starts[::max(stride, 1)]
+
+
+class HorizonErrors:
+    """Running MAE / RMSE per forecast horizon."""
+
+    def __init__(self, horizon: int):
+        self.abs_error = np.zeros(horizon)
+        self.sq_error = np.zeros(horizon)
+        self.count = np.zeros(horizon, dtype=np.int64)
+
+    def add(self, predicted, actual):
+        error = predicted - actual
+        valid = ~np.isnan(error)
+        error = np.where(valid, error, 0.0)
+        self.abs_error += np.abs(error).sum(axis=0)
+        self.sq_error += (error ** 2).sum(axis=0)
+        self.count += valid.sum(axis=0)
+
+    def report(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mae = self.abs_error / self.count
+            rmse = np.sqrt(self.sq_error / self.count)
+        return [{"horizon": h + 1, "n": int(self.count[h]),
+                 "mae": float(mae[h]) if self.count[h] else None,
+                 "rmse": float(rmse[h]) if self.count[h] else None}
+                for h in range(self.count.size)]
+
+
+def _write_predictions(f, issued_hours, predicted, actual):
+    horizon = predicted.shape[1]
+    issued = np.repeat(issued_hours, horizon)
+    frame = pd.DataFrame({
+        "issued_at": pd.to_datetime(issued * 3600, unit="s", utc=True),
+        "target_at": pd.to_datetime((issued + np.tile(np.arange(1, horizon + 1), issued_hours.size)) * 3600, unit="s", utc=True),
+        "horizon": np.tile(np.arange(1, horizon + 1), issued_hours.size),
+        "predicted_aqi": predicted.ravel(),
+        "actual_aqi": actual.ravel(),
+    })
+    frame.to_csv(f, header=f.tell() == 0, index=False)
+
+
+async def score(app_module, grid, starts, horizon: int, chunk_size: int, observed, predictions_file=None, progress=True):
+    sequence_length = app_module.model.input_shape[1]
+    # (n_windows, seq_len, features) view over the grid; nothing is copied until a chunk is sliced
+    windows = sliding_window_view(grid.values, (sequence_length, grid.values.shape[1]))[:, 0]
+    # Actual AQI for every window end + h, NaN past the end of the history or where not observed
+    aqi = np.where(observed, grid.values[:, 0], np.nan)
+    padded_aqi = np.concatenate([aqi, np.full(horizon, np.nan)])
+    targets = sliding_window_view(padded_aqi[sequence_length:], horizon)
+
+    errors = HorizonErrors(horizon)
+    app_module.inference_batcher.start()
+    try:
+        for n, offset in enumerate(range(0, starts.size, chunk_size)):
+            chunk = starts[offset:offset + chunk_size]
+            sequences = np.ascontiguousarray(windows[chunk])
+            predicted = await app_module._forecast_aqi(sequences, horizon)
+            actual = targets[chunk]
+            errors.add(predicted, actual)
+            if predictions_file is not None:
+                _write_predictions(predictions_file, grid.start_hour + chunk + sequence_length - 1, predicted, actual)
+            if progress:
+                print(f"\r{min(offset + chunk_size, starts.size)}/{starts.size} windows", end="", file=sys.stderr, flush=True)
+    finally:
+        await app_module.inference_batcher.stop()
+        if progress:
+            print(file=sys.stderr)
+    return errors
+
+
+def save_calibration(path: str, grid, starts, sequence_length: int, size: int):
+    # Windows spread evenly over the scored range, unscaled, as /predict builds them
+    chosen = starts[np.unique(np.linspace(0, starts.size - 1, min(size, starts.size)).astype(np.int64))]
+    windows = grid.values[chosen[:, None] + np.arange(sequence_length)]
+    np.save(path, windows)
+    print(f"Saved {windows.shape[0]} calibration windows to {path}", file=sys.stderr)
+
+
+def _hour_arg(value):
+    return None if value is None else int(pd.Timestamp(value, tz="UTC").timestamp() // 3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the served model on an hourly history.")
+    parser.add_argument("history", help="CSV or Parquet file with hourly (or finer) readings")
+    parser.add_argument("--time-column", help="Timestamp column (default: first of time/timestamp/datetime/date)")
+    parser.add_argument("--horizon", type=int, default=24, help="Hours ahead to forecast from every window")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="Windows forecast per batch")
+    parser.add_argument("--stride", type=int, default=1, help="Score every n-th window")
+    parser.add_argument("--start", help="First forecast issue time (UTC) to score")
+    parser.add_argument("--end", help="Last forecast issue time (UTC) to score")
+    parser.add_argument("--model", help="Model to evaluate (default: MODEL_PATH / the served model)")
+    parser.add_argument("--input-scaler", help="Input scaler attributes (default: INPUT_SCALER_ATTR_PATH)")
+    parser.add_argument("--target-scaler", help="Target scaler attributes (default: TARGET_SCALER_ATTR_PATH)")
+    parser.add_argument("--predictions", help="Also write every forecast with its actual value to this CSV")
+    parser.add_argument("--json", help="Write the metrics to this file as JSON")
+    parser.add_argument("--calibration-out", help="Also save a sample of the input windows here (.npy), as the calibration "
+                                                  "set for INFERENCE_PRECISION checks")
+    parser.add_argument("--calibration-size", type=int, default=512, help="Windows in the calibration sample")
+    args = parser.parse_args()
+
+    for env, value in (("MODEL_PATH", args.model), ("INPUT_SCALER_ATTR_PATH", args.input_scaler),
+                       ("TARGET_SCALER_ATTR_PATH", args.target_scaler)):
+        if value:
+            os.environ[env] = os.path.abspath(value)
+    history_path = os.path.abspath(args.history)
+    predictions_path = os.path.abspath(args.predictions) if args.predictions else None
+    json_path = os.path.abspath(args.json) if args.json else None
+    calibration_path = os.path.abspath(args.calibration_out) if args.calibration_out else None
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TIMESERIES_STORE_DIR", "")
+    # Default artifact paths are relative to this directory, as for the API
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    import app
+    from preprocessing import build_hourly_grid
+
+    started = time.perf_counter()
+    hours, columns = read_hourly_history(history_path, args.time_column)
+    grid, error = build_hourly_grid(*_payloads(hours, columns), app.aqi_calculator)
+    if grid is None:
+        raise SystemExit(error)
+    observed = _observed_rows(grid, hours, columns)
+    read_s = time.perf_counter() - started
+
+    if not app.load_artifacts():
+        raise SystemExit(f"Could not load the model: {app.startup_state.error}")
+    sequence_length = app.model.input_shape[1]
+    starts = _window_starts(observed, sequence_length, grid.start_hour, _hour_arg(args.start), _hour_arg(args.end), args.stride)
+    if starts.size == 0:
+        raise SystemExit(f"No complete {sequence_length}-hour windows in the selected range.")
+    if calibration_path:
+        save_calibration(calibration_path, grid, starts, sequence_length, args.calibration_size)
+
+    started = time.perf_counter()
+    predictions_file = open(predictions_path, "w", newline="") if predictions_path else None
+    try:
+        errors = asyncio.run(score(app, grid, starts, args.horizon, args.chunk_size, observed, predictions_file))
+    finally:
+        if predictions_file is not None:
+            predictions_file.close()
+    score_s = time.perf_counter() - started
+
+    first_issued = grid.start_hour + starts[0] + sequence_length - 1
+    last_issued = grid.start_hour + starts[-1] + sequence_length - 1
+    results = {
+        "history": history_path,
+        "model": app.MODEL_PATH,
+        "sequence_length": sequence_length,
+        "hours": int(grid.values.shape[0]),
+        "observed_hours": int(observed.sum()),
+        "windows": int(starts.size),
+        "first_issued_at": pd.Timestamp(first_issued * 3600, unit="s", tz="UTC").isoformat(),
+        "last_issued_at": pd.Timestamp(last_issued * 3600, unit="s", tz="UTC").isoformat(),
+        "read_seconds": read_s,
+        "score_seconds": score_s,
+        "windows_per_second": starts.size / score_s if score_s else None,
+        "horizons": errors.report(),
+    }
+
+    print(f"{results['windows']} windows from {results['first_issued_at']} to {results['last_issued_at']} "
+          f"in {score_s:.1f}s ({results['windows_per_second']:.0f} windows/s)")
+    print(f"{'h':>3} {'n':>9} {'MAE':>9} {'RMSE':>9}")
+    for row in results["horizons"]:
+        if row["n"]:
+            print(f"{row['horizon']:>3} {row['n']:>9} {row['mae']:>9.2f} {row['rmse']:>9.2f}")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# batching.py
+# Micro-batching scheduler in front of the model's forward pass.
+#
+# Requests that arrive within a short window are stacked into one (B, SEQUENCE_LENGTH, 5)
+# tensor, run through a single forward pass in a worker thread (so the event loop keeps
+# serving) and each caller gets back its own slice of the output.
+
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from metrics import Histogram
+
+MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_BATCH_MAX_SIZE", "32"))
+# How long the first request of a batch waits for others to join it.
+BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "5"))
+# Batches allowed in flight at once. One suits an in-process model; with the inference pool
+# (inference_pool.py) more batches can run in parallel on separate worker processes.
+MAX_CONCURRENT_BATCHES = int(os.environ.get("INFERENCE_BATCH_CONCURRENCY", "1"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+def _padded_size(n: int, max_batch_size: int) -> int:
+    # Pad to the next power of two so the backend only ever sees a handful of batch
+    # shapes (each new shape would otherwise trigger a recompile under JAX).
+    size = 1
+    while size < n:
+        size *= 2
+    return max(n, min(size, max_batch_size))
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size: int = MAX_BATCH_SIZE, window_ms: float = BATCH_WINDOW_MS, pad_batches: bool = True,
+                 max_concurrent_batches: int = MAX_CONCURRENT_BATCHES):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.predict_fn = predict_fn
+        self.max_concurrent_batches = max(max_concurrent_batches, 1)
+        self.max_batch_size = max_batch_size
+        self.window_s = max(window_ms, 0.0) / 1000.0
+        self.pad_batches = pad_batches
+        self.batch_size_hist = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_hist = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batches = 0
+        self.failed_batches = 0
+        self._queue = None
+        self._worker = None
+        self._carry = None  # item that didn't fit in the previous batch
+        self._running = set()  # batches currently in the forward pass
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        # Fail anything still queued rather than leaving callers hanging
+        pending = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped."))
+
+    async def submit(self, X: np.ndarray) -> np.ndarray:
+        """Queue ``X`` of shape (n, seq_len, features) and wait for its n predictions."""
+        if self._worker is None:
+            raise RuntimeError("Inference batcher is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((X, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        items = [first]
+        rows = first[0].shape[0]
+        deadline = first[2] + self.window_s
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Window closed; still take whatever is already queued
+                if self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            else:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if rows + item[0].shape[0] > self.max_batch_size:
+                # Doesn't fit: it opens the next batch instead
+                self._carry = item
+                break
+            items.append(item)
+            rows += item[0].shape[0]
+        return items
+
+    async def _run(self):
+        # Slots are taken before collecting, so with one slot the next batch keeps filling
+        # up while the current one runs, exactly as if the forward passes were awaited inline
+        slots = asyncio.Semaphore(self.max_concurrent_batches)
+        loop = asyncio.get_running_loop()
+        while True:
+            await slots.acquire()
+            items = await self._collect()
+            items = [item for item in items if not item[1].done()]  # callers that gave up
+            if not items:
+                slots.release()
+                continue
+            task = loop.create_task(self._execute(items))
+            self._running.add(task)
+            task.add_done_callback(lambda t: (self._running.discard(t), slots.release()))
+
+    async def _execute(self, items):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for _, _, enqueued in items:
+            self.queue_wait_hist.observe((started - enqueued) * 1000.0)
+
+        try:
+            X = np.concatenate([item[0] for item in items], axis=0)
+            n = X.shape[0]
+            if self.pad_batches:
+                padded = _padded_size(n, self.max_batch_size)
+                if padded > n:
+                    X = np.concatenate([X, np.repeat(X[-1:], padded - n, axis=0)], axis=0)
+            self.batch_size_hist.observe(n)
+            self.batches += 1
+
+            output = await loop.run_in_executor(None, self.predict_fn, X)
+            output = np.asarray(output)[:n]
+        except asyncio.CancelledError:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference batcher stopped."))
+            raise
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for x, future, _ in items:
+            size = x.shape[0]
+            if not future.done():
+                future.set_result(output[offset:offset + size])
+            offset += size
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_s * 1000.0,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "running": len(self._running),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_wait_ms": self.queue_wait_hist.snapshot(),
+        }
@@ -0,0 +1,101 @@
+# bench_inference.py
+# Latency comparison of the two inference paths used by /predict:
+#   keras: input_scaler.transform -> model.predict -> inverse transform
+#   jax:   CompiledForecaster.predict_aqi (scaling + forward + inverse in one compiled call)
+#
+# Run from VAYU_website/ so the model and scaler artifacts are found:
+#   python benchmarks/bench_inference.py --iterations 200 --batch-sizes 1,8,32 --json bench_inference.json
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The compiled path is built below; keep app.py on the plain Keras path
+os.environ["INFERENCE_MODE"] = "keras"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+with contextlib.redirect_stdout(open(os.devnull, "w")):
+    import app
+    app.load_artifacts()
+from jax_inference import CompiledForecaster
+
+
+def _random_inputs(batch_size, sequence_length, rng):
+    scaler = app.input_scaler
+    low = np.asarray(scaler.min_, dtype=np.float64)
+    span = np.asarray(scaler.scale_, dtype=np.float64)
+    return low + rng.random((batch_size, sequence_length, low.shape[-1])) * span
+
+
+def keras_path(X):
+    X_scaled = app.input_scaler.transform(X)
+    scaled = app.model.predict(X_scaled, verbose=0)
+    return app._inverse_transform_batch(X, scaled)
+
+
+def _time(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples = np.asarray(samples)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Keras and compiled JAX inference latency.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--json", help="Write results to this file as JSON")
+    args = parser.parse_args()
+
+    if app.model is None or app.input_scaler is None or app.target_scaler is None:
+        sys.exit("Model or scalers failed to load; run from the directory containing the artifacts.")
+
+    sequence_length = app.model.input_shape[1]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    start = time.perf_counter()
+    forecaster = CompiledForecaster(app.model, app.input_scaler, app.target_scaler, batch_sizes=batch_sizes)
+    forecaster.warmup()
+    compile_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    results = {"sequence_length": sequence_length, "compile_and_warmup_s": compile_s, "runs": []}
+    devnull = open(os.devnull, "w")
+    for batch_size in batch_sizes:
+        X = _random_inputs(batch_size, sequence_length, rng)
+        with contextlib.redirect_stdout(devnull):
+            reference = keras_path(X)
+            keras_stats = _time(lambda: keras_path(X), args.iterations, args.warmup)
+        jax_stats = _time(lambda: forecaster.predict_aqi(X), args.iterations, args.warmup)
+        max_abs_diff = float(np.max(np.abs(forecaster.predict_aqi(X)[:, :1] - reference.reshape(batch_size, -1)[:, :1])))
+        results["runs"].append({"batch_size": batch_size, "keras": keras_stats, "jax": jax_stats, "max_abs_aqi_diff": max_abs_diff})
+
+    print(f"compile + warmup: {compile_s:.2f}s")
+    print(f"{'batch':>5} {'keras p50':>10} {'keras p99':>10} {'jax p50':>10} {'jax p99':>10} {'max |dAQI|':>11}")
+    for run in results["runs"]:
+        print(f"{run['batch_size']:>5} {run['keras']['p50_ms']:>9.2f}ms {run['keras']['p99_ms']:>9.2f}ms "
+              f"{run['jax']['p50_ms']:>9.2f}ms {run['jax']['p99_ms']:>9.2f}ms {run['max_abs_aqi_diff']:>11.2e}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# bench_preprocessing.py
+# Per-request cost of turning the two Open-Meteo payloads into the (1, seq_len, 5) model input:
+#   pandas: app._build_processed_frame -> app._select_latest_sequence (the reference pipeline)
+#   numpy:  preprocessing.build_hourly_grid -> preprocessing.latest_window (what /predict uses)
+#
+# Checks that both produce identical arrays and timestamps, then reports CPU time per call
+# and the peak Python-visible allocation (tracemalloc) of one call. Payloads come from the
+# stand-in server's generators, with a fraction of readings blanked out to exercise gap filling.
+#   python benchmarks/bench_preprocessing.py --iterations 500 --gap-fraction 0.05 --json bench_preprocessing.json
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TIMESERIES_STORE_DIR", "")
+
+import app
+import fake_open_meteo
+from preprocessing import build_hourly_grid, latest_window
+from timeseries_store import epoch_hour
+
+
+def make_payloads(past_hours: int, gap_fraction: float, rng, latitude=28.6, longitude=77.2):
+    times = fake_open_meteo._hour_range(past_hours, fake_open_meteo.DEFAULT_FORECAST_DAYS)
+
+    def series(base, amplitude, phase):
+        values = fake_open_meteo._series(times, latitude, longitude, base, amplitude, phase)
+        return [None if rng.random() < gap_fraction else v for v in values]
+
+    iso = fake_open_meteo._times_iso(times)
+    air_quality = {"hourly": {"time": iso, "pm2_5": series(35.0, 15.0, 0.0), "pm10": series(60.0, 25.0, 2.0),
+                              "carbon_monoxide": series(0.6, 0.3, 4.0)}}
+    weather = {"hourly": {"time": list(iso), "temperature_2m": series(24.0, 6.0, -9.0)}}
+    return air_quality, weather
+
+
+def pandas_path(air_quality, weather, sequence_length, now):
+    df_processed, error = app._build_processed_frame(air_quality, weather)
+    if df_processed is None:
+        return None, error
+    return app._select_latest_sequence(df_processed, sequence_length, now)
+
+
+def numpy_path(air_quality, weather, sequence_length, now, out=None):
+    grid, error = build_hourly_grid(air_quality, weather, app.aqi_calculator)
+    if grid is None:
+        return None, error
+    return latest_window(grid, sequence_length, epoch_hour(now), out=out)
+
+
+def _cpu_per_call_ms(fn, iterations):
+    fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) * 1000.0 / iterations
+
+
+def _peak_bytes(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pandas and numpy preprocessing per request.")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--sequence-length", type=int, default=24)
+    parser.add_argument("--gap-fraction", type=float, default=0.05)
+    parser.add_argument("--cases", type=int, default=50, help="Random payloads checked for equivalence")
+    parser.add_argument("--json", help="Write results to this file as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sequence_length = args.sequence_length
+    now = datetime.now(timezone.utc)
+
+    mismatches = 0
+    for case in range(args.cases):
+        air_quality, weather = make_payloads(sequence_length + 24, args.gap_fraction if case else 0.0, rng)
+        expected, expected_ts = pandas_path(air_quality, weather, sequence_length, now)
+        actual, actual_ts = numpy_path(air_quality, weather, sequence_length, now)
+        if expected is None or actual is None:
+            # Both must fail, with the same message
+            same = expected is None and actual is None and expected_ts == actual_ts
+        else:
+            same = np.array_equal(expected, actual, equal_nan=True) and expected_ts == actual_ts
+        mismatches += not same
+
+    air_quality, weather = make_payloads(sequence_length + 24, args.gap_fraction, rng)
+    buffer = np.empty((1, sequence_length, 5))
+    runs = {
+        "pandas": lambda: pandas_path(air_quality, weather, sequence_length, now),
+        "numpy": lambda: numpy_path(air_quality, weather, sequence_length, now, out=buffer),
+    }
+    results = {"sequence_length": sequence_length, "cases_checked": args.cases, "mismatches": mismatches, "paths": {}}
+    for name, fn in runs.items():
+        results["paths"][name] = {"cpu_ms_per_call": _cpu_per_call_ms(fn, args.iterations), "peak_alloc_kib": _peak_bytes(fn) / 1024.0}
+
+    print(f"equivalence: {args.cases - mismatches}/{args.cases} payloads identical")
+    print(f"{'path':>7} {'cpu/call':>10} {'peak alloc':>12}")
+    for name, stats in results["paths"].items():
+        print(f"{name:>7} {stats['cpu_ms_per_call']:>8.3f}ms {stats['peak_alloc_kib']:>9.1f}KiB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
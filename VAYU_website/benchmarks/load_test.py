@@ -0,0 +1,350 @@
+# load_test.py
+# End-to-end benchmark of the prediction service, fully offline.
+#
+# Starts fake_open_meteo.py (optionally replaying recordings, with injected latency and
+# failures) and app.py as separate uvicorn processes, then measures:
+#   - cold start: process spawn -> /healthz and -> /readyz
+#   - single-request /predict latency, cold (new grid cell every time) and warm (cached cell),
+#     with the per-stage breakdown taken from /metrics
+#   - throughput and latency at 1, 10 and 100 concurrent clients
+#   - memory high-water mark of the app processes, and of the inference pool if used (VmHWM, Linux)
+# and writes everything to one JSON file so runs can be compared over time.
+#
+# Uses the real artifacts when they are in VAYU_website/, otherwise writes stand-ins
+# (benchmarks/standin_model.py). Run from anywhere:
+#   python benchmarks/load_test.py --json results/$(date +%Y%m%d-%H%M).json
+#   python benchmarks/load_test.py --latency-ms 80 --failure-rate 0.02 --clients 1,10,100 --duration 20
+#   python benchmarks/load_test.py --app-workers 2 --pool-workers 4   # API processes + inference pool
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from standin_model import ARTIFACT_FILES
+
+_STAGE_LINE = re.compile(r'^vayu_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(module: str, port: int, env: dict, log_path: str, workers: int = 1):
+    return _spawn_command(
+        ["-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--workers", str(workers)],
+        env, log_path)
+
+
+def _spawn_command(args, env: dict, log_path: str):
+    log_file = open(log_path, "w")
+    return subprocess.Popen([sys.executable, *args], cwd=APP_DIR, env={**os.environ, **env}, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def _wait_for(url: str, process, timeout_s: float, status: int = 200) -> float:
+    """Seconds until ``url`` answers with ``status``; raises if the process dies or time runs out."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout_s:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} was up.")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == status:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready after {timeout_s}s.")
+
+
+def _stop(process):
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _process_tree(pid: int):
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            for task in os.listdir(f"/proc/{pids[i]}/task"):
+                with open(f"/proc/{pids[i]}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def _memory_kib(pid: int) -> dict:
+    # Summed over the process and its children (uvicorn workers, pool workers). VmHWM is each
+    # process's peak resident set size; pages shared between forked processes count once per process.
+    memory = {"VmHWM": 0, "VmRSS": 0}
+    processes = 0
+    for member in _process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith(("VmHWM:", "VmRSS:")):
+                        key, value = line.split(":", 1)
+                        memory[key] += int(value.split()[0])
+            processes += 1
+        except OSError:
+            pass
+    if not processes:
+        return {"peak_rss_kib": None, "rss_kib": None, "processes": 0}
+    return {"peak_rss_kib": memory["VmHWM"], "rss_kib": memory["VmRSS"], "processes": processes}
+
+
+def _stage_totals(metrics_text: str) -> dict:
+    totals = {}
+    for line in metrics_text.splitlines():
+        match = _STAGE_LINE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {"sum": 0.0, "count": 0.0})[kind] = float(value)
+    return totals
+
+
+def _stage_breakdown(before: dict, after: dict, requests: int) -> dict:
+    # Mean milliseconds per request spent in each stage over the measured requests
+    breakdown = {}
+    for stage, totals in after.items():
+        previous = before.get(stage, {"sum": 0.0, "count": 0.0})
+        calls = totals["count"] - previous["count"]
+        if calls > 0:
+            breakdown[stage] = {
+                "ms_per_request": (totals["sum"] - previous["sum"]) * 1000.0 / requests,
+                "calls_per_request": calls / requests,
+            }
+    return breakdown
+
+
+def _percentiles(samples_ms) -> dict:
+    if not samples_ms:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "mean_ms": None}
+    samples = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p90_ms": float(np.percentile(samples, 90)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+    }
+
+
+def _random_cell(rng: random.Random, grid_degrees: float):
+    # Distinct cells across India; coordinates snap to the same grid as the server
+    return round(rng.uniform(8.0, 35.0) / grid_degrees) * grid_degrees, round(rng.uniform(68.0, 97.0) / grid_degrees) * grid_degrees
+
+
+async def _predict(client: httpx.AsyncClient, latitude: float, longitude: float, n_ahead: int):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/predict", json={"latitude": latitude, "longitude": longitude, "n_ahead": n_ahead})
+        ok = response.status_code == 200 and response.json().get("status") == "success"
+    except httpx.HTTPError:
+        ok = False
+    return ok, (time.perf_counter() - start) * 1000.0
+
+
+async def _sequential(base_url: str, coordinates, n_ahead: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        before = _stage_totals((await client.get("/metrics")).text)
+        results = [await _predict(client, lat, lon, n_ahead) for lat, lon in coordinates]
+        after = _stage_totals((await client.get("/metrics")).text)
+    latencies = [ms for ok, ms in results if ok]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for ok, _ in results if not ok),
+        "latency": _percentiles(latencies),
+        "stages": _stage_breakdown(before, after, len(results)),
+    }
+
+
+async def _throughput(base_url: str, clients: int, duration_s: float, pool, n_ahead: int, seed: int):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration_s
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                latitude, longitude = rng.choice(pool)
+                ok, ms = await _predict(client, latitude, longitude, n_ahead)
+                if ok:
+                    latencies.append(ms)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(clients)])
+        elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "seconds": elapsed,
+        "completed": len(latencies),
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": _percentiles(latencies),
+    }
+
+
+def _artifacts(args, workdir: str):
+    if args.artifacts:
+        return "custom", {name: os.path.join(os.path.abspath(args.artifacts), f) for name, f in ARTIFACT_FILES.items()}
+    real = {name: os.path.join(APP_DIR, f) for name, f in ARTIFACT_FILES.items()}
+    if not args.standin and all(os.path.exists(path) for path in real.values()):
+        return "real", real
+    from standin_model import write_artifacts
+    return "standin", write_artifacts(os.path.join(workdir, "artifacts"))
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency / throughput / memory benchmark of the prediction API.")
+    parser.add_argument("--clients", default="1,10,100", help="Concurrency levels for the throughput runs")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per throughput run")
+    parser.add_argument("--requests", type=int, default=30, help="Sequential requests for the single-request latency")
+    parser.add_argument("--cells", type=int, default=50, help="Distinct grid cells used in the throughput runs")
+    parser.add_argument("--n-ahead", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Injected upstream latency")
+    parser.add_argument("--latency-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of upstream requests failing with 503")
+    parser.add_argument("--replay-dir", help="Recorded Open-Meteo responses (see record_open_meteo.py)")
+    parser.add_argument("--inference-mode", default="keras", choices=["keras", "jax"])
+    parser.add_argument("--artifacts", help="Directory with the model and scaler files to serve")
+    parser.add_argument("--standin", action="store_true", help="Use stand-in artifacts even if the real ones exist")
+    parser.add_argument("--app-workers", type=int, default=1, help="uvicorn worker processes for the API")
+    parser.add_argument("--pool-workers", type=int, default=0, help="Serve through inference_pool.py with this many workers (0: in-process model)")
+    parser.add_argument("--tiles", action="store_true", help="Leave tile precompute on (off by default so every request runs the model)")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    grid_degrees = float(os.environ.get("SERIES_CACHE_GRID_DEGREES", "0.1"))
+    workdir = tempfile.mkdtemp(prefix="vayu-bench-")
+    artifact_kind, artifact_paths = _artifacts(args, workdir)
+
+    fake_port, app_port = _free_port(), _free_port()
+    fake_env = {
+        "FAKE_OPEN_METEO_LATENCY_MS": str(args.latency_ms),
+        "FAKE_OPEN_METEO_LATENCY_JITTER_MS": str(args.latency_jitter_ms),
+        "FAKE_OPEN_METEO_FAILURE_RATE": str(args.failure_rate),
+        "FAKE_OPEN_METEO_REPLAY_DIR": os.path.abspath(args.replay_dir) if args.replay_dir else "",
+        "FAKE_OPEN_METEO_SEED": str(args.seed),
+    }
+    app_env = {
+        **artifact_paths,
+        "OPEN_METEO_AIR_QUALITY_URL": f"http://127.0.0.1:{fake_port}/v1/air-quality",
+        "OPEN_METEO_FORECAST_URL": f"http://127.0.0.1:{fake_port}/v1/forecast",
+        "INFERENCE_MODE": args.inference_mode,
+        "TIMESERIES_STORE_DIR": "",
+        "TILE_PRECOMPUTE": "1" if args.tiles else "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    base_url = f"http://127.0.0.1:{app_port}"
+
+    fake = server = inference_pool = None
+    try:
+        fake = _spawn("fake_open_meteo", fake_port, fake_env, os.path.join(workdir, "fake_open_meteo.log"))
+        _wait_for(f"http://127.0.0.1:{fake_port}/docs", fake, 30.0)
+
+        spawned = time.perf_counter()
+        if args.pool_workers > 0:
+            app_env["INFERENCE_POOL_SOCKET"] = os.path.join(workdir, "inference.sock")
+            inference_pool = _spawn_command(["inference_pool.py", "--workers", str(args.pool_workers), "--socket", app_env["INFERENCE_POOL_SOCKET"]],
+                                  {**artifact_paths, "INFERENCE_MODE": args.inference_mode, "TIMESERIES_STORE_DIR": "", "LOG_LEVEL": "WARNING"},
+                                  os.path.join(workdir, "inference_pool.log"))
+        server = _spawn("app", app_port, app_env, os.path.join(workdir, "app.log"), workers=args.app_workers)
+        healthy_s = _wait_for(f"{base_url}/healthz", server, args.startup_timeout)
+        _wait_for(f"{base_url}/readyz", server, args.startup_timeout)
+        cold_start = {
+            "healthz_s": healthy_s,
+            "readyz_s": time.perf_counter() - spawned,
+            "server_time_to_ready_s": httpx.get(f"{base_url}/readyz").json().get("time_to_ready_s"),
+        }
+        print(f"cold start: healthz {healthy_s:.2f}s, readyz {cold_start['readyz_s']:.2f}s")
+
+        cold_cells = [_random_cell(rng, grid_degrees) for _ in range(args.requests)]
+        warm_cell = _random_cell(rng, grid_degrees)
+        single = {
+            "cold_cell": asyncio.run(_sequential(base_url, cold_cells, args.n_ahead)),
+            "warm_cell": asyncio.run(_sequential(base_url, [warm_cell] * (args.requests + 1), args.n_ahead)),
+        }
+        for name, run in single.items():
+            print(f"single request ({name}): p50 {run['latency']['p50_ms']:.1f}ms p99 {run['latency']['p99_ms']:.1f}ms, {run['errors']} errors")
+            for stage, stats in sorted(run["stages"].items(), key=lambda item: -item[1]["ms_per_request"]):
+                print(f"    {stage:>18} {stats['ms_per_request']:8.2f}ms")
+
+        pool = [_random_cell(rng, grid_degrees) for _ in range(args.cells)]
+        throughput = []
+        for clients in (int(c) for c in args.clients.split(",")):
+            run = asyncio.run(_throughput(base_url, clients, args.duration, pool, args.n_ahead, args.seed + clients))
+            throughput.append(run)
+            print(f"{clients:>4} clients: {run['requests_per_s']:8.1f} req/s, p50 {run['latency']['p50_ms'] or 0:.1f}ms, "
+                  f"p99 {run['latency']['p99_ms'] or 0:.1f}ms, {run['errors']} errors")
+
+        memory = {"app": _memory_kib(server.pid)}
+        if inference_pool is not None:
+            memory["inference_pool"] = _memory_kib(inference_pool.pid)
+        for name, usage in memory.items():
+            print(f"{name} memory ({usage['processes']} processes): peak {usage['peak_rss_kib']} KiB, current {usage['rss_kib']} KiB")
+    finally:
+        _stop(server)
+        _stop(inference_pool)
+        _stop(fake)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "artifacts": artifact_kind,
+            "config": vars(args),
+            "logs": workdir,
+        },
+        "cold_start": cold_start,
+        "single_request": single,
+        "throughput": throughput,
+        "memory": memory,
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# record_open_meteo.py
+# Saves one air-quality and one forecast response from Open-Meteo (or whatever the
+# OPEN_METEO_*_URL variables point at) for fake_open_meteo.py to replay:
+#   python benchmarks/record_open_meteo.py --latitude 28.6 --longitude 77.2 --past-hours 168 --out recordings/delhi
+#   FAKE_OPEN_METEO_REPLAY_DIR=recordings/delhi uvicorn fake_open_meteo:app --port 8001
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import open_meteo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Open-Meteo responses for replay by fake_open_meteo.py.")
+    parser.add_argument("--latitude", type=float, required=True)
+    parser.add_argument("--longitude", type=float, required=True)
+    parser.add_argument("--past-hours", type=int, default=168)
+    parser.add_argument("--out", required=True, help="Directory to write air-quality.json and forecast.json to")
+    args = parser.parse_args()
+
+    recorded_at = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0).isoformat()
+    os.makedirs(args.out, exist_ok=True)
+    timeout = (open_meteo.CONNECT_TIMEOUT, open_meteo.READ_TIMEOUT)
+    sources = {
+        "air-quality": (open_meteo.AIR_QUALITY_URL, open_meteo.air_quality_params(args.latitude, args.longitude, args.past_hours)),
+        "forecast": (open_meteo.FORECAST_URL, open_meteo.weather_params(args.latitude, args.longitude, args.past_hours)),
+    }
+    for name, (url, params) in sources.items():
+        response = requests.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+        payload["recorded_at"] = recorded_at
+        path = os.path.join(args.out, f"{name}.json")
+        with open(path, "w") as f:
+            json.dump(payload, f)
+        print(f"Wrote {path} ({len(payload['hourly']['time'])} hours).")
+
+
+if __name__ == "__main__":
+    main()
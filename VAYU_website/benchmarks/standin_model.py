@@ -0,0 +1,73 @@
+# standin_model.py
+# Stand-in serving artifacts for benchmarking when the trained model isn't available.
+#
+# Writes a Keras model with the same interface as best_model_TKAN_nahead_1.keras (24 hours x
+# 5 features -> 1 step) and a recurrent layer of the notebook's TKAN width (64 units), with
+# random weights, plus scaler attribute files covering realistic feature ranges. Its
+# forecasts are meaningless, but the per-request work is of the same order as the real model.
+#   python benchmarks/standin_model.py --out /tmp/vayu-standin
+
+import argparse
+import json
+import os
+
+os.environ.setdefault("KERAS_BACKEND", "jax")
+
+import numpy as np
+
+NUM_FEATURES = 5
+# ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co']
+FEATURE_MIN = [0.0, -10.0, 0.0, 0.0, 0.0]
+FEATURE_MAX = [500.0, 50.0, 500.0, 600.0, 20.0]
+# The target is the AQI / rolling-median ratio
+TARGET_MIN, TARGET_MAX = 0.0, 3.0
+
+ARTIFACT_FILES = {
+    "MODEL_PATH": "best_model_TKAN_nahead_1.keras",
+    "INPUT_SCALER_ATTR_PATH": "input_scaler_attributes.json",
+    "TARGET_SCALER_ATTR_PATH": "target_scaler_attributes.json",
+    "Y_SCALER_TRAIN_PATH": "y_scaler_train.npy",
+}
+
+
+def _scaler_attributes(minimum, maximum):
+    minimum, maximum = np.asarray(minimum, dtype=float), np.asarray(maximum, dtype=float)
+    return {"min_": minimum.tolist(), "max_": maximum.tolist(), "scale_": (maximum - minimum).tolist(), "minmax_range": [0, 1]}
+
+
+def build_model(sequence_length: int = 24, units: int = 64, n_ahead: int = 1):
+    import keras
+    inputs = keras.Input(shape=(sequence_length, NUM_FEATURES))
+    hidden = keras.layers.LSTM(units, dropout=0.1)(inputs)
+    outputs = keras.layers.Dense(n_ahead)(hidden)
+    return keras.Model(inputs=inputs, outputs=outputs)
+
+
+def write_artifacts(out_dir: str, sequence_length: int = 24, units: int = 64, seed: int = 0) -> dict:
+    """Write all four artifacts to ``out_dir``; returns {env variable: path} for app.py."""
+    import keras
+    keras.utils.set_random_seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, filename) for name, filename in ARTIFACT_FILES.items()}
+
+    build_model(sequence_length, units).save(paths["MODEL_PATH"])
+    with open(paths["INPUT_SCALER_ATTR_PATH"], "w") as f:
+        json.dump(_scaler_attributes(FEATURE_MIN, FEATURE_MAX), f)
+    with open(paths["TARGET_SCALER_ATTR_PATH"], "w") as f:
+        json.dump({"min_": TARGET_MIN, "max_": TARGET_MAX, "scale_": TARGET_MAX - TARGET_MIN, "minmax_range": [0, 1]}, f)
+    np.save(paths["Y_SCALER_TRAIN_PATH"], np.random.default_rng(seed).uniform(TARGET_MIN, TARGET_MAX, 1000))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write stand-in model and scaler artifacts.")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--sequence-length", type=int, default=24)
+    parser.add_argument("--units", type=int, default=64)
+    args = parser.parse_args()
+    for name, path in write_artifacts(args.out, args.sequence_length, args.units).items():
+        print(f"{name}={path}")
+
+
+if __name__ == "__main__":
+    main()
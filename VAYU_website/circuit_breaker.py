@@ -0,0 +1,78 @@
+# circuit_breaker.py
+# Per-host circuit breaker for upstream calls.
+#
+# After failure_threshold consecutive failures the breaker opens and calls are refused
+# without touching the network for reset_timeout_s. Then a single probe call is let through
+# (half-open): success closes the breaker, failure opens it for another reset_timeout_s.
+# Everything runs on the event loop, so no locking is needed.
+
+import time
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1.")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = max(reset_timeout_s, 0.0)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._probe_started = None  # monotonic start of the half-open probe, if one is out
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; counts the refusal if not."""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            self.state = HALF_OPEN
+            self._probe_started = None
+        if self.state == CLOSED:
+            return True
+        # A probe that never reported back (e.g. its request was cancelled) is given up on
+        # after reset_timeout_s, so the breaker cannot stay half-open forever
+        now = time.monotonic()
+        if self.state == HALF_OPEN and (self._probe_started is None or now - self._probe_started >= self.reset_timeout_s):
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self._probe_started = None
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def retry_after_s(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(self.reset_timeout_s - (time.monotonic() - self._opened_at), 0.0)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retry_after_s": self.retry_after_s(),
+        }
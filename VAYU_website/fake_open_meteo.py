@@ -0,0 +1,140 @@
+# fake_open_meteo.py
+# Stand-in Open-Meteo server for local development.
+#
+# Serves the two endpoints app.py calls (air-quality and forecast) with synthetic but
+# plausible hourly series, so the backend can be exercised without network access:
+#
+#   uvicorn fake_open_meteo:app --port 8001
+#   OPEN_METEO_AIR_QUALITY_URL=http://localhost:8001/v1/air-quality \
+#   OPEN_METEO_FORECAST_URL=http://localhost:8001/v1/forecast \
+#   uvicorn app:app --port 8000
+#
+# For benchmarks and failure testing it can add latency, fail a fraction of requests with 503
+# and replay recorded responses (see benchmarks/record_open_meteo.py) instead of the
+# synthetic curves. Recordings are shifted in time so their last observed hour is "now".
+
+import asyncio
+import json
+import math
+import os
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Query
+
+app = FastAPI()
+
+DEFAULT_FORECAST_DAYS = 5
+
+LATENCY_MS = float(os.environ.get("FAKE_OPEN_METEO_LATENCY_MS", "0"))
+LATENCY_JITTER_MS = float(os.environ.get("FAKE_OPEN_METEO_LATENCY_JITTER_MS", "0"))
+FAILURE_RATE = float(os.environ.get("FAKE_OPEN_METEO_FAILURE_RATE", "0"))
+# Directory with air-quality.json / forecast.json recordings; empty for synthetic data
+REPLAY_DIR = os.environ.get("FAKE_OPEN_METEO_REPLAY_DIR", "")
+
+_rng = random.Random(int(os.environ.get("FAKE_OPEN_METEO_SEED", "0")))
+_recordings = {}
+
+
+async def _simulate_upstream():
+    delay_ms = LATENCY_MS + _rng.uniform(-LATENCY_JITTER_MS, LATENCY_JITTER_MS)
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000.0)
+    if FAILURE_RATE > 0 and _rng.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated upstream failure.")
+
+
+def _recording(name: str):
+    # {"recorded_at": ISO hour, "hourly": {"time": [...], <variable>: [...]}}, loaded once
+    if name not in _recordings:
+        with open(os.path.join(REPLAY_DIR, f"{name}.json"), "r") as f:
+            recording = json.load(f)
+        recorded_hour = datetime.fromisoformat(recording["recorded_at"]).replace(minute=0, second=0, microsecond=0)
+        if recorded_hour.tzinfo is None:
+            recorded_hour = recorded_hour.replace(tzinfo=dt_timezone.utc)
+        times = [datetime.fromisoformat(t).replace(tzinfo=dt_timezone.utc) for t in recording["hourly"]["time"]]
+        columns = {k: v for k, v in recording["hourly"].items() if k != "time"}
+        _recordings[name] = (recorded_hour.astimezone(dt_timezone.utc), times, columns)
+    return _recordings[name]
+
+
+def _replay(name: str, times, variables):
+    # Values recorded (now - recorded_hour) hours before each requested time; None outside the recording
+    recorded_hour, recorded_times, columns = _recording(name)
+    shift = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0) - recorded_hour
+    position = {t: i for i, t in enumerate(recorded_times)}
+    data = {}
+    for variable in variables:
+        if variable in columns:
+            values = columns[variable]
+            data[variable] = [values[position[t - shift]] if (t - shift) in position else None for t in times]
+    return data
+
+
+def _hour_range(past_hours: int, forecast_days: int):
+    now_hour = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = now_hour - timedelta(hours=past_hours)
+    end = now_hour.replace(hour=0) + timedelta(days=forecast_days)
+    hours = int((end - start).total_seconds() // 3600)
+    return [start + timedelta(hours=i) for i in range(hours)]
+
+
+def _series(times, latitude: float, longitude: float, base: float, amplitude: float, phase: float):
+    # Deterministic diurnal curve; the location only shifts the baseline so nearby
+    # coordinates give different but stable values.
+    offset = (abs(latitude) * 7.0 + abs(longitude) * 3.0) % 10.0
+    return [
+        round(base + offset + amplitude * math.sin(2 * math.pi * (t.hour + phase) / 24.0), 2)
+        for t in times
+    ]
+
+
+def _times_iso(times):
+    return [t.strftime("%Y-%m-%dT%H:%M") for t in times]
+
+
+@app.get("/v1/air-quality")
+async def air_quality(
+    latitude: float,
+    longitude: float,
+    hourly: List[str] = Query(default=["pm2_5", "pm10", "carbon_monoxide"]),
+    past_hours: int = 0,
+    forecast_days: int = DEFAULT_FORECAST_DAYS,
+    timezone: str = "UTC",
+):
+    await _simulate_upstream()
+    times = _hour_range(past_hours, forecast_days)
+    if REPLAY_DIR:
+        data = {"time": _times_iso(times), **_replay("air-quality", times, hourly)}
+        return {"latitude": latitude, "longitude": longitude, "timezone": timezone, "hourly": data}
+    generators = {
+        "pm2_5": lambda: _series(times, latitude, longitude, 35.0, 15.0, 0.0),
+        "pm10": lambda: _series(times, latitude, longitude, 60.0, 25.0, 2.0),
+        "carbon_monoxide": lambda: _series(times, latitude, longitude, 0.6, 0.3, 4.0),
+    }
+    data = {"time": _times_iso(times)}
+    for variable in hourly:
+        if variable in generators:
+            data[variable] = generators[variable]()
+    return {"latitude": latitude, "longitude": longitude, "timezone": timezone, "hourly": data}
+
+
+@app.get("/v1/forecast")
+async def forecast(
+    latitude: float,
+    longitude: float,
+    hourly: List[str] = Query(default=["temperature_2m"]),
+    past_hours: int = 0,
+    forecast_days: int = DEFAULT_FORECAST_DAYS,
+    timezone: str = "UTC",
+):
+    await _simulate_upstream()
+    times = _hour_range(past_hours, forecast_days)
+    if REPLAY_DIR:
+        data = {"time": _times_iso(times), **_replay("forecast", times, hourly)}
+        return {"latitude": latitude, "longitude": longitude, "timezone": timezone, "hourly": data}
+    data = {"time": _times_iso(times)}
+    if "temperature_2m" in hourly:
+        data["temperature_2m"] = _series(times, latitude, longitude, 24.0, 6.0, -9.0)
+    return {"latitude": latitude, "longitude": longitude, "timezone": timezone, "hourly": data}
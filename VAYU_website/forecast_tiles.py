@@ -0,0 +1,231 @@
+# forecast_tiles.py
+# Pre-warmed forecasts for grid cells that are in use.
+#
+# Every request is snapped to an upstream grid cell (see series_cache.HourlySeriesCache.snap);
+# all coordinates in a cell get identical Open-Meteo data, so they get identical forecasts.
+# ActiveCellIndex records which cells have been asked for recently (a hash grid keyed by the
+# integer cell index). Shortly after each UTC hour boundary TileScheduler recomputes the
+# forecast for every active cell (plus an optional fixed region of interest) in small
+# batches spread over a few minutes. ForecastTiles holds the results for the current hour,
+# so a request for a warm cell is a dict lookup instead of a fetch plus a model call.
+
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+log = logging.getLogger("vayu.tiles")
+
+TILE_PRECOMPUTE = os.environ.get("TILE_PRECOMPUTE", "1") not in ("0", "false", "no", "")
+# Hours of forecast stored per tile; longer n_ahead requests are computed live
+TILE_HORIZON_HOURS = int(os.environ.get("TILE_HORIZON_HOURS", "24"))
+# Cells not requested for this long drop out of the precompute set
+TILE_ACTIVE_HOURS = float(os.environ.get("TILE_ACTIVE_HOURS", "24"))
+TILE_MAX_CELLS = int(os.environ.get("TILE_MAX_CELLS", "2000"))
+# Wait this long after the hour boundary so Open-Meteo has published the new hour
+TILE_REFRESH_DELAY_S = float(os.environ.get("TILE_REFRESH_DELAY_S", "90"))
+# Cells per model batch, and the time the whole refresh is spread over
+TILE_CHUNK_SIZE = int(os.environ.get("TILE_CHUNK_SIZE", "32"))
+TILE_SPREAD_S = float(os.environ.get("TILE_SPREAD_S", "300"))
+# Optional region always kept warm: "lat_min,lon_min,lat_max,lon_max"
+TILE_REGION = os.environ.get("TILE_REGION", "")
+
+
+def parse_region(value: str):
+    if not value:
+        return None
+    try:
+        lat_min, lon_min, lat_max, lon_max = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError(f"TILE_REGION must be 'lat_min,lon_min,lat_max,lon_max', got {value!r}.")
+    return min(lat_min, lat_max), min(lon_min, lon_max), max(lat_min, lat_max), max(lon_min, lon_max)
+
+
+def current_hour(now: datetime = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class ActiveCellIndex:
+    """Recently requested grid cells, keyed by integer cell index (round(lat / g), round(lon / g))."""
+
+    def __init__(self, grid_degrees: float, max_cells: int = TILE_MAX_CELLS, active_hours: float = TILE_ACTIVE_HOURS, region=None):
+        self.grid_degrees = grid_degrees
+        self.max_cells = max_cells
+        self.active_s = active_hours * 3600.0
+        self.region = region
+        self._last_seen = {}  # (i, j) -> time.monotonic() of the last request
+
+    def cell(self, latitude: float, longitude: float):
+        return round(latitude / self.grid_degrees), round(longitude / self.grid_degrees)
+
+    def centre(self, cell):
+        # Same rounding as HourlySeriesCache.snap, so both agree on the cell's coordinates
+        g = self.grid_degrees
+        return round(cell[0] * g, 6), round(cell[1] * g, 6)
+
+    def touch(self, latitude: float, longitude: float):
+        cell = self.cell(latitude, longitude)
+        if cell not in self._last_seen and len(self._last_seen) >= self.max_cells:
+            self.prune()
+            if len(self._last_seen) >= self.max_cells:
+                # Forget the least recently requested cell
+                del self._last_seen[min(self._last_seen, key=self._last_seen.get)]
+        self._last_seen[cell] = time.monotonic()
+        return cell
+
+    def prune(self):
+        cutoff = time.monotonic() - self.active_s
+        for cell in [c for c, seen in self._last_seen.items() if seen < cutoff]:
+            del self._last_seen[cell]
+
+    def region_cells(self):
+        if self.region is None:
+            return []
+        lat_min, lon_min, lat_max, lon_max = self.region
+        g = self.grid_degrees
+        # Tolerance so bounds on a cell centre (e.g. 28.7 / 0.1 = 286.999...) are included
+        eps = 1e-9
+        return [(i, j)
+                for i in range(math.ceil(lat_min / g - eps), math.floor(lat_max / g + eps) + 1)
+                for j in range(math.ceil(lon_min / g - eps), math.floor(lon_max / g + eps) + 1)]
+
+    def cells_to_refresh(self):
+        """Region cells first, then active cells by recency, capped at max_cells."""
+        self.prune()
+        cells = dict.fromkeys(self.region_cells())
+        for cell in sorted(self._last_seen, key=self._last_seen.get, reverse=True):
+            cells.setdefault(cell)
+        if len(cells) > self.max_cells:
+            log.warning("%d cells to precompute, keeping the first %d (TILE_MAX_CELLS).", len(cells), self.max_cells)
+        return list(cells)[:self.max_cells]
+
+    def __len__(self):
+        return len(self._last_seen)
+
+
+class ForecastTiles:
+    """Formatted predictions per cell, valid for the UTC hour they were computed in."""
+
+    def __init__(self):
+        self._tiles = {}  # cell -> (hour, predictions)
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, cell, hour: datetime, predictions: list):
+        self._tiles[cell] = (hour, predictions)
+
+    def lookup(self, cell, n_ahead: int, now: datetime = None):
+        """The first ``n_ahead`` predictions for ``cell`` if a tile for this hour covers them."""
+        tile = self._tiles.get(cell)
+        if tile is not None and tile[0] == current_hour(now) and len(tile[1]) >= n_ahead:
+            self.hits += 1
+            return tile[1][:n_ahead]
+        self.misses += 1
+        return None
+
+    def prune(self, now: datetime = None):
+        hour = current_hour(now)
+        for cell in [c for c, (h, _) in self._tiles.items() if h != hour]:
+            del self._tiles[cell]
+
+    def clear(self):
+        self._tiles.clear()
+
+    def __len__(self):
+        return len(self._tiles)
+
+
+class TileScheduler:
+    """Runs ``compute_fn(cells)`` for every cell to refresh shortly after each hour boundary.
+
+    ``compute_fn`` is an async callable that computes and stores tiles for a list of cells
+    and returns how many it produced.
+    """
+
+    def __init__(self, index: ActiveCellIndex, tiles: ForecastTiles, compute_fn, chunk_size: int = TILE_CHUNK_SIZE,
+                 spread_s: float = TILE_SPREAD_S, delay_s: float = TILE_REFRESH_DELAY_S):
+        self.index = index
+        self.tiles = tiles
+        self.compute_fn = compute_fn
+        self.chunk_size = max(chunk_size, 1)
+        self.spread_s = max(spread_s, 0.0)
+        self.delay_s = max(delay_s, 0.0)
+        self.refreshes = 0
+        self.failed_chunks = 0
+        self.last_refresh = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def seconds_until_next_refresh(self, now: datetime = None) -> float:
+        now = now or datetime.now(timezone.utc)
+        due = current_hour(now) + timedelta(seconds=self.delay_s)
+        if due <= now:
+            due += timedelta(hours=1)
+        return (due - now).total_seconds()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Tile refresh failed.")
+            await asyncio.sleep(self.seconds_until_next_refresh())
+
+    async def refresh(self):
+        """Recompute tiles for all cells to refresh, one chunk at a time."""
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        self.tiles.prune(started_at)
+        cells = self.index.cells_to_refresh()
+        chunks = [cells[i:i + self.chunk_size] for i in range(0, len(cells), self.chunk_size)]
+        # Pause between chunks so the refresh is spread over spread_s rather than one burst
+        pause = self.spread_s / len(chunks) if len(chunks) > 1 else 0.0
+        computed = 0
+        for n, chunk in enumerate(chunks):
+            if n and pause:
+                await asyncio.sleep(pause)
+            try:
+                computed += await self.compute_fn(chunk)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed_chunks += 1
+                log.exception("Precomputing %d tiles failed.", len(chunk))
+        self.refreshes += 1
+        self.last_refresh = {
+            "started_at": started_at.isoformat(),
+            "seconds": time.perf_counter() - started,
+            "cells": len(cells),
+            "tiles_computed": computed,
+        }
+        log.info("Precomputed %d of %d forecast tiles in %.1fs.", computed, len(cells), self.last_refresh["seconds"])
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "active_cells": len(self.index),
+            "region": self.index.region,
+            "tiles": len(self.tiles),
+            "hits": self.tiles.hits,
+            "misses": self.tiles.misses,
+            "refreshes": self.refreshes,
+            "failed_chunks": self.failed_chunks,
+            "last_refresh": self.last_refresh,
+        }
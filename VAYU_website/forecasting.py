@@ -0,0 +1,58 @@
+# forecasting.py
+# Recursive multi-step forecasting on top of the one-step model.
+#
+# The served artifact predicts `steps_per_call` hours (1 for best_model_TKAN_nahead_1). Longer
+# horizons are produced autoregressively: every prediction is written back into a
+# preallocated (B, seq_len + horizon, features) buffer and the next model call reads the
+# window that ends at it as a view, so no window is rebuilt. All B locations advance in
+# lockstep, i.e. one batched model call per step regardless of how many locations there are.
+
+import numpy as np
+
+# Position of calculated_aqi in ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co']
+AQI_FEATURE = 0
+
+
+async def recursive_forecast(step_fn, history, n_ahead: int, steps_per_call: int = 1, exogenous=None):
+    """Forecast ``n_ahead`` hours of AQI for every sequence in ``history``.
+
+    ``step_fn`` is an async callable mapping unscaled windows of shape (B, seq_len, F) to
+    AQI predictions of shape (B, steps_per_call). ``history`` has shape (B, seq_len, F).
+    ``exogenous`` optionally supplies the non-AQI features for future hours, shape
+    (B, >= n_ahead, F - 1); without it the last observed values are carried forward.
+    Returns an array of shape (B, n_ahead).
+    """
+    history = np.asarray(history, dtype=np.float64)
+    if history.ndim != 3:
+        raise ValueError(f"history must have shape (B, seq_len, features), got {history.shape}.")
+    if n_ahead < 1:
+        raise ValueError("n_ahead must be at least 1.")
+    batch_size, sequence_length, num_features = history.shape
+
+    # Whole model calls needed to cover the horizon
+    n_calls = -(-n_ahead // steps_per_call)
+    horizon = n_calls * steps_per_call
+
+    buffer = np.empty((batch_size, sequence_length + horizon, num_features), dtype=np.float64)
+    buffer[:, :sequence_length] = history
+
+    # Exogenous features for every future row are known up front, so fill them in one go
+    other = [i for i in range(num_features) if i != AQI_FEATURE]
+    if exogenous is not None:
+        exogenous = np.asarray(exogenous, dtype=np.float64)
+        if exogenous.shape[1] < n_ahead:
+            raise ValueError(f"exogenous covers {exogenous.shape[1]} hours, {n_ahead} required.")
+        future = exogenous[:, :horizon]
+        if future.shape[1] < horizon:
+            # Pad the last partial model call with the final exogenous row
+            future = np.concatenate([future, np.repeat(future[:, -1:], horizon - future.shape[1], axis=1)], axis=1)
+        buffer[:, sequence_length:, other] = future
+    else:
+        buffer[:, sequence_length:, other] = history[:, -1:, other]
+
+    for t in range(0, horizon, steps_per_call):
+        window = buffer[:, t:t + sequence_length]
+        predicted = np.asarray(await step_fn(window), dtype=np.float64).reshape(batch_size, -1)
+        buffer[:, sequence_length + t:sequence_length + t + steps_per_call, AQI_FEATURE] = predicted[:, :steps_per_call]
+
+    return buffer[:, sequence_length:sequence_length + n_ahead, AQI_FEATURE].copy()
@@ -0,0 +1,577 @@
+# inference_pool.py
+# Pool of inference worker processes shared by all API processes on a host.
+#
+# Run it next to the API and point the API at its socket:
+#   python inference_pool.py --workers 4 --socket /tmp/vayu-inference.sock
+#   INFERENCE_POOL_SOCKET=/tmp/vayu-inference.sock uvicorn app:app --workers 2
+#
+# The supervisor only binds the socket and forks; it never imports app or a framework. Each
+# worker imports them and loads the model (app.load_artifacts) after the fork, because the
+# JAX and TensorFlow runtimes start threads that do not survive fork. With the compiled JAX
+# path, the first worker to finish loading dumps the weights to a file next to the socket, and
+# every worker then runs on a read-only mapping of that file, so the weights are in memory
+# once whatever --workers is. Each worker still has its own framework runtime and compiled
+# executables. model.predict keeps the weights inside the framework, so with
+# INFERENCE_MODE=keras every worker holds its own copy.
+#
+# API processes keep a few connections open (see InferencePoolClient) and send each
+# micro-batch as a small binary header followed by the raw array bytes. The supervisor owns
+# those connections: when a request arrives on one, it passes the connection to an idle
+# worker (SCM_RIGHTS over a socketpair), and the worker reads the request, answers on the
+# connection directly and reports back that it is idle. Requests are spread over the workers
+# one at a time, however many connections each API process keeps, so HTTP workers (uvicorn
+# --workers) and inference parallelism (--workers here) are sized independently and the API
+# processes never import TensorFlow.
+
+import argparse
+import collections
+import fcntl
+import json
+import logging
+import os
+import queue
+import selectors
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger("vayu.inference_pool")
+
+POOL_SOCKET = os.environ.get("INFERENCE_POOL_SOCKET", "")
+POOL_WORKERS = int(os.environ.get("INFERENCE_POOL_WORKERS", str(os.cpu_count() or 1)))
+# Seconds a forward pass may take before the API gives up on it
+POOL_TIMEOUT_S = float(os.environ.get("INFERENCE_POOL_TIMEOUT_S", "30"))
+# Seconds the API waits at startup for the pool to come up and answer
+POOL_CONNECT_TIMEOUT_S = float(os.environ.get("INFERENCE_POOL_CONNECT_TIMEOUT_S", "300"))
+
+OP_INFO = 0
+OP_PREDICT = 1
+STATUS_OK = 0
+STATUS_ERROR = 1
+# Exit status of a worker that could not load the model; the supervisor stops instead of respawning
+EXIT_LOAD_FAILED = 3
+
+# op or status, ndim, numpy dtype string ('<f8', '<f4', '|u1'); then ndim uint32 dims, then the data
+_HEADER = struct.Struct("<BB3s")
+_DIM = struct.Struct("<I")
+
+
+class InferencePoolError(RuntimeError):
+    """The pool could not be reached or failed to run a request."""
+
+
+def _send(sock, code: int, array: np.ndarray):
+    array = np.ascontiguousarray(array)
+    dtype = array.dtype.str.encode()
+    if len(dtype) != 3:
+        raise ValueError(f"Unsupported dtype for the inference pool: {array.dtype}")
+    header = _HEADER.pack(code, array.ndim, dtype) + b"".join(_DIM.pack(d) for d in array.shape)
+    # Header and array bytes go out in one call, without concatenating them first
+    view = memoryview(array.reshape(-1).view(np.uint8))
+    sent = sock.sendmsg([header, view])
+    total = len(header) + view.nbytes
+    if sent < total:
+        sock.sendall((header + view.tobytes())[sent:])
+
+
+def _recv_exactly(sock, buffer):
+    view = memoryview(buffer).cast("B")
+    received = 0
+    while received < view.nbytes:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise EOFError("Inference pool connection closed.")
+        received += n
+
+
+def _recv(sock):
+    header = bytearray(_HEADER.size)
+    _recv_exactly(sock, header)
+    code, ndim, dtype = _HEADER.unpack(header)
+    dims = bytearray(_DIM.size * ndim)
+    _recv_exactly(sock, dims)
+    shape = tuple(_DIM.unpack_from(dims, i * _DIM.size)[0] for i in range(ndim))
+    # Received straight into the array's own buffer
+    array = np.empty(shape, dtype=np.dtype(dtype.decode()))
+    if array.nbytes:
+        _recv_exactly(sock, array)
+    return code, array
+
+
+def _encode_text(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode(), dtype=np.uint8)
+
+
+def _decode_text(array: np.ndarray) -> str:
+    return array.tobytes().decode()
+
+
+# --- Worker side ---
+
+# Bytes on a worker's control socket: supervisor -> worker hands over a connection (with its
+# fd); worker -> supervisor reports it is ready, done with a connection, or that it broke
+_HANDOFF = b"h"
+_READY = b"r"
+_DONE = b"d"
+_BROKEN = b"b"
+
+# Shared weights file: uint64 length of a JSON index, the index, then each array at a
+# multiple of _WEIGHTS_ALIGN bytes (the alignment jax.device_put needs to map rather than copy)
+_WEIGHTS_ALIGN = 64
+_WEIGHTS_INDEX_LENGTH = struct.Struct("<Q")
+
+
+def _aligned(n: int) -> int:
+    return -(-n // _WEIGHTS_ALIGN) * _WEIGHTS_ALIGN
+
+
+def _save_weights(path: str, trainable, non_trainable):
+    arrays = {"trainable": [np.ascontiguousarray(w) for w in trainable],
+              "non_trainable": [np.ascontiguousarray(w) for w in non_trainable]}
+    # Offsets are relative to the data section, which starts at the first aligned byte after the index
+    index, offset = {}, 0
+    for group, group_arrays in arrays.items():
+        index[group] = []
+        for w in group_arrays:
+            index[group].append({"offset": offset, "shape": list(w.shape), "dtype": w.dtype.str})
+            offset = _aligned(offset + w.nbytes)
+    encoded = json.dumps(index).encode()
+    data_start = _aligned(_WEIGHTS_INDEX_LENGTH.size + len(encoded))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_WEIGHTS_INDEX_LENGTH.pack(len(encoded)) + encoded)
+        for group, group_arrays in arrays.items():
+            for entry, w in zip(index[group], group_arrays):
+                f.seek(data_start + entry["offset"])
+                f.write(memoryview(w.reshape(-1).view(np.uint8)))
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def _map_weights(path: str):
+    """(trainable, non_trainable) read-only arrays backed by one shared mapping of ``path``."""
+    mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    length = _WEIGHTS_INDEX_LENGTH.unpack_from(mapping)[0]
+    index = json.loads(mapping[_WEIGHTS_INDEX_LENGTH.size:_WEIGHTS_INDEX_LENGTH.size + length].tobytes())
+    data_start = _aligned(_WEIGHTS_INDEX_LENGTH.size + length)
+
+    def arrays(group):
+        return [np.ndarray(tuple(entry["shape"]), dtype=np.dtype(entry["dtype"]), buffer=mapping,
+                           offset=data_start + entry["offset"]) for entry in index[group]]
+
+    return arrays("trainable"), arrays("non_trainable")
+
+
+def _share_weights(app_module, weights_path: str) -> bool:
+    # The first worker to get here writes the file; every worker, that one included, then
+    # swaps its own copy of the weights for the mapping
+    forecaster = app_module.compiled_forecaster
+    if forecaster is None:
+        log.info("Inference worker %d serves through model.predict; its weights are not shared.", os.getpid())
+        return False
+    with open(weights_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(weights_path):
+            _save_weights(weights_path, *forecaster.host_weights())
+    forecaster.use_weights(*_map_weights(weights_path))
+    return True
+
+
+def _model_info(app_module, workers: int, shared_weights: bool = False) -> dict:
+    model = app_module.model
+    return {
+        "input_shape": list(model.input_shape),
+        "output_shape": list(model.output_shape),
+        "compiled": app_module.compiled_forecaster is not None,
+        "precision": app_module.model_registry.active.precision,
+        "workers": workers,
+        "shared_weights": shared_weights,
+    }
+
+
+def _handle(conn, app_module, info_payload):
+    code, array = _recv(conn)
+    if code == OP_INFO:
+        _send(conn, STATUS_OK, info_payload)
+        return
+    try:
+        # Same function the in-process batcher runs: compiled path or model.predict
+        output = np.asarray(app_module._batch_predict(array))
+    except Exception as e:
+        log.exception("Inference failed for a batch of %d.", array.shape[0] if array.ndim else 0)
+        _send(conn, STATUS_ERROR, _encode_text(f"{type(e).__name__}: {e}"))
+    else:
+        _send(conn, STATUS_OK, output)
+
+
+def _serve(control, app_module, workers: int, shared_weights: bool = False):
+    # Serves one request per connection the supervisor hands over; returns when the supervisor goes away
+    info_payload = _encode_text(json.dumps(_model_info(app_module, workers, shared_weights)))
+    status = _READY
+    while True:
+        try:
+            control.sendall(status)
+            message, fds, _, _ = socket.recv_fds(control, 1, 1)
+        except ConnectionError:
+            return
+        if not message or not fds:
+            return
+        status = _DONE
+        with socket.socket(fileno=fds[0]) as conn:
+            # A client that stops halfway through a request must not hold the worker forever
+            conn.settimeout(POOL_TIMEOUT_S)
+            try:
+                _handle(conn, app_module, info_payload)
+            except (OSError, EOFError):
+                status = _BROKEN
+
+
+def _worker_main(control, workers: int, weights_path: str):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    import app
+    if not app.load_artifacts():
+        log.error("Worker %d could not load the model: %s", os.getpid(), app.startup_state.error)
+        os._exit(EXIT_LOAD_FAILED)
+    try:
+        shared_weights = _share_weights(app, weights_path)
+    except Exception:
+        log.exception("Worker %d could not map the shared weights; keeping its own copy.", os.getpid())
+        shared_weights = False
+    log.info("Inference worker %d serving.", os.getpid())
+    try:
+        _serve(control, app, workers, shared_weights)
+    except BaseException:
+        log.exception("Inference worker %d stopped.", os.getpid())
+    finally:
+        os._exit(1)
+
+
+# --- Supervisor side ---
+
+class _Dispatcher:
+    """Holds the API connections and hands each request to an idle worker."""
+
+    def __init__(self, listener):
+        self.listener = listener
+        listener.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ, "listener")
+        self._idle = collections.deque()
+        self._waiting = collections.deque()  # connections with a request and no worker yet
+        self._busy = {}  # worker control socket -> the connection it is serving
+        self._workers = set()
+
+    def add_worker(self, control):
+        self._workers.add(control)
+        self._selector.register(control, selectors.EVENT_READ, "worker")
+
+    def remove_worker(self, control):
+        if control not in self._workers:
+            return
+        self._workers.discard(control)
+        self._selector.unregister(control)
+        control.close()
+        if control in self._idle:
+            self._idle.remove(control)
+        conn = self._busy.pop(control, None)
+        if conn is not None:
+            # The request it was serving is lost; the client sees the connection close
+            conn.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except BlockingIOError:
+                return
+            self._selector.register(conn, selectors.EVENT_READ, "client")
+
+    def _request_arrived(self, conn):
+        self._selector.unregister(conn)
+        try:
+            # Peek, so the whole request is left for the worker
+            pending = conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            self._selector.register(conn, selectors.EVENT_READ, "client")
+            return
+        except OSError:
+            pending = b""
+        if not pending:
+            conn.close()
+            return
+        self._waiting.append(conn)
+
+    def _worker_reported(self, control):
+        try:
+            status = control.recv(1)
+        except OSError:
+            status = b""
+        if not status:
+            self.remove_worker(control)
+            return
+        conn = self._busy.pop(control, None)
+        if conn is not None:
+            if status == _DONE:
+                self._selector.register(conn, selectors.EVENT_READ, "client")
+            else:
+                conn.close()
+        self._idle.append(control)
+
+    def _dispatch(self):
+        while self._waiting and self._idle:
+            conn, control = self._waiting.popleft(), self._idle.popleft()
+            try:
+                socket.send_fds(control, [_HANDOFF], [conn.fileno()])
+            except OSError:
+                self._waiting.appendleft(conn)
+                self.remove_worker(control)
+                continue
+            self._busy[control] = conn
+
+    def poll(self, timeout_s: float):
+        for key, _ in self._selector.select(timeout_s):
+            if key.data == "listener":
+                self._accept()
+            elif key.data == "client":
+                self._request_arrived(key.fileobj)
+            else:
+                self._worker_reported(key.fileobj)
+        self._dispatch()
+
+    def close(self):
+        """Close every socket held; a forked worker calls this on its inherited copies."""
+        for conn in list(self._waiting) + list(self._busy.values()):
+            conn.close()
+        for key in list(self._selector.get_map().values()):
+            key.fileobj.close()
+        self._selector.close()
+
+
+def _fork_worker(dispatcher, workers: int, weights_path: str):
+    control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    pid = os.fork()
+    if pid == 0:
+        control.close()
+        dispatcher.close()
+        _worker_main(worker_control, workers, weights_path)
+    worker_control.close()
+    dispatcher.add_worker(control)
+    return pid, control
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_pool(socket_path: str, workers: int):
+    # The pool serves the model itself, so app.load_artifacts() must not point back at a pool
+    os.environ.pop("INFERENCE_POOL_SOCKET", None)
+
+    weights_path = socket_path + ".weights"
+    # Weights left by an earlier run may belong to another model
+    _remove_files(socket_path, weights_path, weights_path + ".lock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+    dispatcher = _Dispatcher(listener)
+
+    children = dict(_fork_worker(dispatcher, workers, weights_path) for _ in range(workers))
+    log.info("Inference pool with %d workers listening on %s.", workers, socket_path)
+    stopping = False
+    load_failed = False
+    respawn_at = []  # monotonic times at which to start replacement workers
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        while children or (respawn_at and not stopping):
+            dispatcher.poll(1.0)
+            while children:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    children.clear()
+                    break
+                if pid == 0:
+                    break
+                control = children.pop(pid, None)
+                if control is not None:
+                    dispatcher.remove_worker(control)
+                if stopping:
+                    continue
+                if os.WIFEXITED(status) and os.WEXITSTATUS(status) == EXIT_LOAD_FAILED:
+                    # A replacement would fail the same way
+                    log.error("Inference worker %d could not load the model; stopping the pool.", pid)
+                    load_failed = True
+                    shutdown(None, None)
+                    continue
+                log.warning("Inference worker %d exited (status %d); starting a replacement.", pid, status)
+                respawn_at.append(time.monotonic() + 1.0)  # don't spin if workers keep dying
+            while respawn_at and not stopping and respawn_at[0] <= time.monotonic():
+                respawn_at.pop(0)
+                pid, control = _fork_worker(dispatcher, workers, weights_path)
+                children[pid] = control
+    finally:
+        dispatcher.close()
+        _remove_files(socket_path, weights_path, weights_path + ".lock")
+    if load_failed:
+        raise SystemExit("Inference pool stopped: a worker could not load the model.")
+
+
+# --- API side ---
+
+class InferencePoolClient:
+    """Blocking, thread-safe client; each call checks out one connection (opened on demand)."""
+
+    def __init__(self, socket_path: str, max_connections: int = 1, timeout_s: float = POOL_TIMEOUT_S):
+        self.socket_path = socket_path
+        self.max_connections = max(max_connections, 1)
+        self.timeout_s = timeout_s
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self.requests = 0
+        self.errors = 0
+
+    def _connect(self, timeout_s: float):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout_s)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._open < self.max_connections
+            if can_open:
+                self._open += 1
+        if not can_open:
+            try:
+                return self._idle.get(timeout=self.timeout_s)
+            except queue.Empty:
+                raise InferencePoolError("No inference pool connection became free in time.")
+        try:
+            return self._connect(self.timeout_s)
+        except OSError as e:
+            with self._lock:
+                self._open -= 1
+            raise InferencePoolError(f"Cannot connect to the inference pool at {self.socket_path}: {e}") from e
+
+    def _discard(self, sock):
+        sock.close()
+        with self._lock:
+            self._open -= 1
+
+    def _call(self, op: int, array: np.ndarray):
+        sock = self._checkout()
+        self.requests += 1
+        try:
+            _send(sock, op, array)
+            status, result = _recv(sock)
+        except (OSError, EOFError) as e:
+            self.errors += 1
+            self._discard(sock)
+            raise InferencePoolError(f"Inference pool request failed: {e!r}") from e
+        self._idle.put(sock)
+        if status != STATUS_OK:
+            self.errors += 1
+            raise InferencePoolError(_decode_text(result))
+        return result
+
+    def predict(self, X) -> np.ndarray:
+        return self._call(OP_PREDICT, np.asarray(X))
+
+    def wait_for_info(self, timeout_s: float = POOL_CONNECT_TIMEOUT_S) -> dict:
+        """Model metadata from the pool, retrying until it is up (workers may still be loading)."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                sock = self._connect(max(deadline - time.monotonic(), 0.1))
+                try:
+                    _send(sock, OP_INFO, np.empty(0, dtype=np.uint8))
+                    _, payload = _recv(sock)
+                finally:
+                    sock.close()
+                return json.loads(_decode_text(payload))
+            except (OSError, EOFError) as e:
+                if time.monotonic() >= deadline:
+                    raise InferencePoolError(f"Inference pool at {self.socket_path} not available: {e!r}") from e
+                time.sleep(0.5)
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self) -> dict:
+        return {"socket": self.socket_path, "connections": self._open, "max_connections": self.max_connections,
+                "requests": self.requests, "errors": self.errors}
+
+
+class PooledModel:
+    """Stands in for the Keras model (and the compiled forecaster) inside an API process.
+
+    Exposes the shapes app.py reads; every forward pass is sent to the pool, where the
+    worker runs it through the same path (compiled or model.predict) it would in-process.
+    """
+
+    def __init__(self, client: InferencePoolClient, info: dict):
+        self.client = client
+        self.input_shape = tuple(info["input_shape"])
+        self.output_shape = tuple(info["output_shape"])
+        self.compiled = info["compiled"]
+        self.precision = info["precision"]
+        self.workers = info["workers"]
+
+    def predict(self, X, verbose=0):
+        return self.client.predict(X)
+
+    def predict_aqi(self, X):
+        return self.client.predict(X)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the model from a pool of forked worker processes.")
+    parser.add_argument("--socket", default=POOL_SOCKET or "/tmp/vayu-inference.sock", help="Unix socket to listen on")
+    parser.add_argument("--workers", type=int, default=POOL_WORKERS, help="Inference processes")
+    args = parser.parse_args()
+    socket_path = os.path.abspath(args.socket)
+
+    # Artifact paths are relative to this directory, as for the API
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    from log_config import configure_logging
+    configure_logging()
+    run_pool(socket_path, max(args.workers, 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# jax_inference.py
+# Compiled JAX inference path for the TKAN/TKAT model.
+#
+# model.predict() builds a data adapter and a predict loop on every call. Here the loaded
+# Keras model (JAX backend) is turned into one pure function via model.stateless_call, with
+# the input MinMax scaling, the target inverse transform and the rolling-median ratio
+# rescaling fused around it, and jax.jit-compiled ahead of time for a fixed set of padded
+# batch sizes. Calls then go straight to the compiled XLA executable.
+#
+# The function runs in the forecaster's precision (see precision.py). stateless_call casts
+# inputs and weights to the model's own dtypes, so a model saved in float32 is rebuilt from
+# its config with float64 layers and inputs (and its weights widened) for float64. That is
+# the reference the precision check compares float32 with; it needs JAX_ENABLE_X64, which
+# app.py always sets.
+
+import os
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+DEFAULT_BATCH_SIZES = tuple(int(b) for b in os.environ.get("JAX_BATCH_SIZES", "1,2,4,8,16,32").split(","))
+# Number of trailing hours whose mean AQI stands in for the rolling median (as in the API)
+PROXY_WINDOW = 5
+# Keras dtype names that model_in_dtype replaces
+FLOAT_DTYPES = ("bfloat16", "float16", "float32", "float64")
+
+
+def _retyped_config(config, dtype: str):
+    # Model config with every floating dtype (layer dtype policies, Input layers) set to dtype
+    if isinstance(config, list):
+        return [_retyped_config(c, dtype) for c in config]
+    if not isinstance(config, dict):
+        return config
+    if config.get("class_name") == "DTypePolicy" and config.get("config", {}).get("name") in FLOAT_DTYPES:
+        return dict(config, config=dict(config["config"], name=dtype))
+    return {key: dtype if key == "dtype" and value in FLOAT_DTYPES else _retyped_config(value, dtype)
+            for key, value in config.items()}
+
+
+def model_in_dtype(model, dtype: str):
+    """``model`` if its floating weights are already ``dtype``, else a copy of it built in ``dtype``.
+
+    Custom layers (TKAN, TKAT) must be resolvable, e.g. inside the custom_object_scope the
+    model was loaded in.
+    """
+    if all(v.dtype == dtype for v in model.weights if v.dtype in FLOAT_DTYPES):
+        return model
+    copy = model.__class__.from_config(_retyped_config(model.get_config(), dtype))
+    copy.set_weights([w.astype(dtype) if np.issubdtype(w.dtype, np.floating) else w for w in model.get_weights()])
+    return copy
+
+
+class CompiledForecaster:
+    """Unscaled (B, seq_len, 5) input -> (B, n_ahead) AQI, as one compiled call."""
+
+    def __init__(self, model, input_scaler, target_scaler, batch_sizes=DEFAULT_BATCH_SIZES, precision: str = "float64"):
+        if not hasattr(model, "stateless_call"):
+            raise TypeError("Compiled inference needs a Keras 3 model running on the JAX backend.")
+        if model.input_shape is None or len(model.input_shape) != 3:
+            raise ValueError(f"Model has unexpected input shape: {model.input_shape}")
+        if precision == "float64" and not jax.config.jax_enable_x64:
+            raise ValueError("float64 compiled inference needs JAX_ENABLE_X64.")
+
+        self.sequence_length = model.input_shape[1]
+        self.num_features = model.input_shape[2]
+        self.batch_sizes = tuple(sorted(set(batch_sizes)))
+        self.precision = precision
+        self.dtype = jnp.float64 if precision == "float64" else jnp.float32
+
+        model = model_in_dtype(model, precision)
+        # Own copies of the weights: Keras' predict loop may donate (and so invalidate) the
+        # buffers behind the model's variables.
+        self._trainable = [jnp.array(np.asarray(v.value)) for v in model.trainable_variables]
+        self._non_trainable = [jnp.array(np.asarray(v.value)) for v in model.non_trainable_variables]
+        self._model = model
+        self._forward = jax.jit(self._build_forward(model, input_scaler, target_scaler))
+        self._compiled = {}
+
+    def _build_forward(self, model, input_scaler, target_scaler):
+        dtype = self.dtype
+        in_min = jnp.asarray(input_scaler.min_, dtype=dtype)
+        in_scale = jnp.asarray(input_scaler.scale_, dtype=dtype)
+        in_lo, in_hi = input_scaler.minmax_range
+        t_min = jnp.asarray(target_scaler.min_, dtype=dtype)
+        t_scale = jnp.asarray(target_scaler.scale_, dtype=dtype)
+        t_lo, t_hi = target_scaler.minmax_range
+        proxy_window = min(PROXY_WINDOW, self.sequence_length)
+
+        def forward(trainable, non_trainable, X):
+            # MinMaxScaler.transform
+            X_scaled = (X - in_min) / in_scale
+            X_scaled = X_scaled * (in_hi - in_lo) + in_lo
+
+            y, _ = model.stateless_call(trainable, non_trainable, X_scaled, training=False)
+            y = jnp.reshape(y, (y.shape[0], -1)).astype(dtype)
+
+            # MinMaxScaler.inverse_transform on the target (ratio) scale
+            ratio = (y - t_lo) / (t_hi - t_lo)
+            ratio = ratio * t_scale + t_min
+
+            # Rolling-median proxy: mean of the last few calculated_aqi values, 1.0 if unusable.
+            # The API builds this scaler as float32, so round it the same way.
+            proxy = jnp.mean(X[:, -proxy_window:, 0], axis=1)
+            proxy = jnp.where(jnp.isnan(proxy) | (proxy <= 0), 1.0, proxy)
+            proxy = proxy.astype(jnp.float32).astype(dtype)
+            return ratio * proxy[:, None]
+
+        return forward
+
+    def _input_spec(self, batch_size: int):
+        return jax.ShapeDtypeStruct((batch_size, self.sequence_length, self.num_features), self.dtype)
+
+    def _executable(self, batch_size: int):
+        executable = self._compiled.get(batch_size)
+        if executable is None:
+            executable = self._forward.lower(self._trainable, self._non_trainable, self._input_spec(batch_size)).compile()
+            self._compiled[batch_size] = executable
+        return executable
+
+    def host_weights(self):
+        """(trainable, non_trainable) weights as numpy arrays, in the model's variable order."""
+        return [np.asarray(w) for w in self._trainable], [np.asarray(w) for w in self._non_trainable]
+
+    def use_weights(self, trainable, non_trainable):
+        """Run on the given host arrays from now on (e.g. a read-only file mapping shared by processes).
+
+        On the CPU backend jax.device_put aliases 64-byte aligned host memory instead of copying
+        it. The model's variables are pointed at the same arrays, so this process drops its
+        own copy of the weights; only call this where model.predict is no longer used. (A
+        float64 forecaster of a float32 model runs a float64 copy of it, whose weights these
+        are; the loaded model keeps its float32 ones.)
+        """
+        current = self._trainable + self._non_trainable
+        given = list(trainable) + list(non_trainable)
+        if [(w.shape, w.dtype) for w in given] != [(w.shape, w.dtype) for w in current]:
+            raise ValueError("Weights do not match the model's variables.")
+        self._trainable = [jax.device_put(w) for w in trainable]
+        self._non_trainable = [jax.device_put(w) for w in non_trainable]
+        variables = list(self._model.trainable_variables) + list(self._model.non_trainable_variables)
+        for variable, value in zip(variables, self._trainable + self._non_trainable):
+            variable.assign(value)
+
+    def warmup(self):
+        """Compile and run each executable once so no request pays first-call costs."""
+        for batch_size in self.batch_sizes:
+            X = np.zeros((batch_size, self.sequence_length, self.num_features), dtype=self.dtype)
+            jax.block_until_ready(self._executable(batch_size)(self._trainable, self._non_trainable, X))
+
+    def _bucket(self, n: int) -> int:
+        for batch_size in self.batch_sizes:
+            if batch_size >= n:
+                return batch_size
+        return self.batch_sizes[-1]
+
+    def predict_aqi(self, X_unscaled) -> np.ndarray:
+        """Predicted AQI for unscaled sequences of shape (B, seq_len, 5); returns (B, n_ahead)."""
+        X = np.asarray(X_unscaled, dtype=self.dtype)
+        largest = self.batch_sizes[-1]
+        outputs = []
+        for start in range(0, X.shape[0], largest):
+            chunk = X[start:start + largest]
+            n = chunk.shape[0]
+            batch_size = self._bucket(n)
+            if batch_size > n:
+                # Pad with copies of the last row so the compiled shape can be reused
+                chunk = np.concatenate([chunk, np.repeat(chunk[-1:], batch_size - n, axis=0)], axis=0)
+            result = self._executable(batch_size)(self._trainable, self._non_trainable, chunk)
+            outputs.append(np.asarray(result)[:n])
+        return np.concatenate(outputs, axis=0)
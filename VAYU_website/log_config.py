@@ -0,0 +1,65 @@
+# log_config.py
+# Leveled, structured logging for the API.
+#
+# Modules log through logging.getLogger("vayu.<module>") with %-style arguments, so a
+# disabled level costs one isEnabledFor() check and no string formatting. Extra context is
+# passed as keyword fields (log.info("...", extra={"station": ...})) and shows up as
+# key=value pairs, or as JSON keys with LOG_FORMAT=json.
+
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "text" (human readable) or "json" (one object per line, for log shippers)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Attach a single stderr handler to the "vayu" logger tree (idempotent)."""
+    logger = logging.getLogger("vayu")
+    logger.setLevel(level)
+    if not any(getattr(h, "_vayu", False) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler._vayu = True
+        logger.addHandler(handler)
+        # Keep uvicorn's / the root logger's configuration out of it
+        logger.propagate = False
+    for handler in logger.handlers:
+        if getattr(handler, "_vayu", False):
+            handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    return logger
@@ -0,0 +1,196 @@
+# metrics.py
+# Minimal in-process metric primitives shared by the serving components, and their
+# Prometheus text exposition (served at /metrics).
+#
+# Recording is a dict lookup plus a locked add, so instruments can sit on the hot path.
+# Components that already keep their own counters (series cache, batcher) are exported
+# through collectors that read their stats() at scrape time instead of being duplicated.
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Cumulative bucketed histogram (Prometheus-style ``le`` buckets)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets, counts):
+            running += n
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class MetricFamily:
+    """A named metric with one child per combination of label values."""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names=(), factory=Counter):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}.")
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.label_names, values))
+            if self.kind == "histogram":
+                yield labels, child.snapshot()
+            else:
+                yield labels, child.value
+
+
+class Registry:
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            if family.name in self._families:
+                raise ValueError(f"Metric {family.name} is already registered.")
+            self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help_text: str, labels=()) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "counter", labels, Counter))
+
+    def histogram(self, name: str, help_text: str, buckets, labels=()) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "histogram", labels, lambda: Histogram(buckets)))
+
+    def register_collector(self, collect):
+        """Add a callable returning ``[(name, kind, help, [(labels, value), ...]), ...]``.
+
+        For kind "histogram" each value is a Histogram.snapshot() dict.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def collect(self):
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        for family in families:
+            yield family.name, family.kind, family.help, list(family.samples())
+        for collect in collectors:
+            yield from collect()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, kind, help_text, samples in self.collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind == "histogram":
+                    lines.extend(_histogram_lines(name, labels, value))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _histogram_lines(name: str, labels: dict, snapshot: dict):
+    for bound, count in snapshot["buckets"].items():
+        yield f"{name}_bucket{_format_labels(dict(labels, le=bound))} {count}"
+    yield f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}"
+    yield f"{name}_count{_format_labels(labels)} {snapshot['count']}"
+
+
+def scaled_snapshot(snapshot: dict, factor: float) -> dict:
+    """Rescale a snapshot's bucket bounds and sum, e.g. from milliseconds to seconds."""
+    buckets = {}
+    for bound, count in snapshot["buckets"].items():
+        buckets[bound if bound == "+Inf" else repr(float(bound) * factor)] = count
+    return {"buckets": buckets, "sum": snapshot["sum"] * factor, "count": snapshot["count"]}
+
+
+REGISTRY = Registry()
+
+# Latency buckets (seconds) from sub-millisecond numpy work up to slow upstream calls
+LATENCY_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "vayu_stage_seconds", "Time spent in each stage of serving a prediction.", LATENCY_BUCKETS_S, labels=("stage",))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record the duration of the ``with`` block under vayu_stage_seconds{stage=...}."""
+    histogram = STAGE_SECONDS.labels(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def observe_stage(stage: str, started: float):
+    """Record the time since ``started`` (a time.perf_counter() value) for ``stage``."""
+    STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
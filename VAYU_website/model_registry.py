@@ -0,0 +1,358 @@
+# model_registry.py
+# Versioned model bundles that can be swapped while the server is running.
+#
+# A bundle is a directory under MODEL_REGISTRY_DIR named after its version:
+#   models/<version>/model.keras
+#                   /input_scaler_attributes.json
+#                   /target_scaler_attributes.json
+#                   /y_scaler_train.npy     (optional)
+#                   /calibration_windows.npy (optional: inputs for the reduced-precision check)
+#                   /metadata.json          (optional: architecture, trained_on, notes, "files" overrides)
+# ModelRegistry loads a bundle off the event loop, warms it up and checks its output on a
+# recent live input, then swaps it in with a single reference assignment. Each request pins
+# the bundle that was active when it started (use()), and each bundle has its own
+# micro-batcher, so in-flight requests finish on the version they started with and batches
+# never mix versions. The previous bundle is retired once its last request has finished.
+# A candidate bundle can also run in shadow: a sample of live forecasts is repeated on it
+# in the background and its latency and prediction deltas are recorded, but never served.
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from metrics import LATENCY_BUCKETS_S, REGISTRY
+from precision import compute_dtype
+
+log = logging.getLogger("vayu.models")
+
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "models")
+# Version to serve at startup; empty serves MODEL_PATH and the *_PATH scaler files as "default"
+MODEL_VERSION = os.environ.get("MODEL_VERSION", "")
+# Candidate to shadow from startup, and the share of live forecasts repeated on it
+MODEL_SHADOW_VERSION = os.environ.get("MODEL_SHADOW_VERSION", "")
+MODEL_SHADOW_SAMPLE_RATE = float(os.environ.get("MODEL_SHADOW_SAMPLE_RATE", "0.1"))
+# Shadow forecasts allowed to run at once; further samples are skipped rather than queued
+MODEL_SHADOW_MAX_INFLIGHT = int(os.environ.get("MODEL_SHADOW_MAX_INFLIGHT", "4"))
+# Longest wait for requests pinned to a replaced bundle before its batcher is stopped
+MODEL_SWAP_DRAIN_S = float(os.environ.get("MODEL_SWAP_DRAIN_S", "60"))
+
+BUNDLE_FILES = {
+    "model": "model.keras",
+    "input_scaler": "input_scaler_attributes.json",
+    "target_scaler": "target_scaler_attributes.json",
+    "y_scaler_train": "y_scaler_train.npy",
+    "calibration": "calibration_windows.npy",
+}
+# Stands in for live traffic when warming up a bundle before any request has been seen:
+# calculated_aqi, temp, pm25, pm10, co
+WARMUP_ROW = (100.0, 25.0, 40.0, 70.0, 600.0)
+DELTA_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+
+SWAPS = REGISTRY.counter("vayu_model_swaps_total", "Model bundles swapped into service.")
+SHADOW_SECONDS = REGISTRY.histogram(
+    "vayu_shadow_forecast_seconds", "Latency of shadow forecasts on the candidate model.", LATENCY_BUCKETS_S, labels=("version",))
+SHADOW_DELTA = REGISTRY.histogram(
+    "vayu_shadow_abs_delta_aqi", "Absolute difference between candidate and served AQI predictions.", DELTA_BUCKETS, labels=("version",))
+SHADOW_FORECASTS = REGISTRY.counter(
+    "vayu_shadow_forecasts_total", "Shadow forecasts by outcome (ok, error, skipped).", labels=("version", "outcome"))
+
+
+class BundleNotFound(LookupError):
+    """No bundle with that version in the registry directory."""
+
+
+class SwapInProgress(RuntimeError):
+    """Another bundle is already being loaded."""
+
+
+class BundleSource:
+    """Where a bundle's files are, plus its metadata."""
+
+    def __init__(self, version: str, model_path: str, input_scaler_path: str, target_scaler_path: str,
+                 y_scaler_train_path: str, calibration_path: str = None, metadata: dict = None):
+        self.version = version
+        self.model_path = model_path
+        self.input_scaler_path = input_scaler_path
+        self.target_scaler_path = target_scaler_path
+        self.y_scaler_train_path = y_scaler_train_path
+        self.calibration_path = calibration_path
+        self.metadata = metadata or {}
+
+    def describe(self) -> dict:
+        return {"version": self.version, "model_path": self.model_path, "metadata": self.metadata}
+
+
+def list_versions(root: str = MODEL_REGISTRY_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name, BUNDLE_FILES["model"]))
+                  or os.path.isfile(os.path.join(root, name, "metadata.json")))
+
+
+def bundle_source(version: str, root: str = MODEL_REGISTRY_DIR) -> BundleSource:
+    directory = os.path.join(root, version)
+    if os.path.basename(os.path.normpath(version)) != version or not os.path.isdir(directory):
+        raise BundleNotFound(f"No model bundle '{version}' in {root}.")
+    metadata = {}
+    metadata_path = os.path.join(directory, "metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r") as f:
+            metadata = json.load(f)
+    files = {**BUNDLE_FILES, **metadata.get("files", {})}
+    return BundleSource(version, *(os.path.join(directory, files[k]) for k in BUNDLE_FILES), metadata=metadata)
+
+
+class ModelBundle:
+    """A loaded model with its scalers, and the batcher that feeds it."""
+
+    def __init__(self, source: BundleSource, model, input_scaler, target_scaler, y_scaler_train=None,
+                 compiled_forecaster=None, load_report: dict = None, precision: str = "float64", precision_report: dict = None):
+        self.source = source
+        self.version = source.version
+        self.model = model
+        self.input_scaler = input_scaler
+        self.target_scaler = target_scaler
+        self.y_scaler_train = y_scaler_train
+        self.compiled_forecaster = compiled_forecaster
+        self.load_report = load_report or {}
+        self.precision = precision
+        self.precision_report = precision_report
+        self.dtype = compute_dtype(precision)
+        self.batcher = None  # set by the loader
+        self.loaded_at = datetime.now(timezone.utc)
+        self.in_flight = 0
+
+    @property
+    def sequence_length(self) -> int:
+        return self.model.input_shape[1]
+
+    def describe(self) -> dict:
+        return {
+            **self.source.describe(),
+            "loaded_at": self.loaded_at.isoformat(),
+            "compiled": self.compiled_forecaster is not None,
+            "precision": self.precision,
+            "precision_check": self.precision_report,
+            "input_shape": list(self.model.input_shape),
+            "in_flight": self.in_flight,
+            "load": self.load_report,
+        }
+
+
+class ModelRegistry:
+    """The active bundle, an optional shadow candidate, and background loading / swapping.
+
+    ``load_fn(source)`` loads a bundle (blocking; run in a worker thread) with its batcher.
+    ``forecast_fn(sequences, n_ahead, bundle)`` is the async forecast used by the endpoints.
+    ``on_swap`` callables get (new bundle, previous bundle) right after a swap; coroutine
+    functions among them are run as background tasks.
+    """
+
+    def __init__(self, load_fn, forecast_fn, root: str = MODEL_REGISTRY_DIR):
+        self.load_fn = load_fn
+        self.forecast_fn = forecast_fn
+        self.root = root
+        self.active = None
+        self.shadow = None
+        self.shadow_sample_rate = 0.0
+        self.on_swap = []
+        self.loading = None  # version being loaded
+        self.last_error = None
+        self.history = []
+        self._recent_input = None  # a live model input, reused for warm-ups
+        self._shadow_tasks = set()
+        self._background = set()
+        self._shadow_stats = {}  # version -> {"n": ..., "abs_delta_sum": ...}
+
+    @contextmanager
+    def use(self):
+        """Pin the active bundle for the duration of one request."""
+        bundle = self.active
+        if bundle is None:
+            raise RuntimeError("No model bundle is loaded.")
+        bundle.in_flight += 1
+        try:
+            yield bundle
+        finally:
+            bundle.in_flight -= 1
+
+    def set_initial(self, bundle: ModelBundle):
+        self.active = bundle
+        self.history.append({"version": bundle.version, "activated_at": bundle.loaded_at.isoformat()})
+
+    def source(self, version: str) -> BundleSource:
+        return bundle_source(version, self.root)
+
+    async def _load(self, source: BundleSource) -> ModelBundle:
+        if self.loading not in (None, source.version):
+            raise SwapInProgress(f"Model '{self.loading}' is already loading.")
+        self.loading = source.version
+        try:
+            started = time.perf_counter()
+            bundle = await asyncio.get_running_loop().run_in_executor(None, self.load_fn, source)
+            bundle.batcher.start()
+            try:
+                await self._warm_up(bundle)
+            except BaseException:
+                await bundle.batcher.stop()
+                raise
+            log.info("Loaded model %s in %.2fs.", bundle.version, time.perf_counter() - started)
+            self.last_error = None
+            return bundle
+        except Exception as e:
+            self.last_error = {"version": source.version, "error": f"{type(e).__name__}: {e}"}
+            raise
+        finally:
+            self.loading = None
+
+    async def _warm_up(self, bundle: ModelBundle):
+        # First calls pay for tracing / graph building; also refuse bundles with unusable output
+        if self._recent_input is not None and self._recent_input.shape[1] == bundle.sequence_length:
+            sample = self._recent_input
+        else:
+            sample = np.tile(np.asarray(WARMUP_ROW, dtype=np.float64), (1, bundle.sequence_length, 1))
+        for batch_size in sorted({1, bundle.batcher.max_batch_size}):
+            predicted = await self.forecast_fn(np.repeat(sample, batch_size, axis=0), 1, bundle)
+            if not np.all(np.isfinite(predicted)):
+                raise ValueError(f"Model {bundle.version} produced non-finite predictions during warm-up.")
+
+    async def activate(self, version: str) -> ModelBundle:
+        """Load ``version`` (or promote the shadow candidate) and swap it into service."""
+        if self.shadow is not None and self.shadow.version == version:
+            bundle, self.shadow = self.shadow, None
+            self._shadow_stats.pop(version, None)
+        else:
+            bundle = await self._load(self.source(version))
+        previous, self.active = self.active, bundle
+        SWAPS.labels().inc()
+        self.history.append({"version": bundle.version, "activated_at": datetime.now(timezone.utc).isoformat(),
+                             "replaced": previous.version if previous is not None else None})
+        log.info("Now serving model %s (was %s).", bundle.version, previous.version if previous is not None else None)
+        for hook in self.on_swap:
+            result = hook(bundle, previous)
+            if asyncio.iscoroutine(result):
+                self._spawn(result)
+        if previous is not None:
+            self._spawn(self._retire(previous))
+        return bundle
+
+    async def set_shadow(self, version: str, sample_rate: float = MODEL_SHADOW_SAMPLE_RATE) -> ModelBundle:
+        bundle = await self._load(self.source(version))
+        previous, self.shadow = self.shadow, bundle
+        self.shadow_sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if previous is not None:
+            self._shadow_stats.pop(previous.version, None)
+        self._shadow_stats[bundle.version] = {"n": 0, "abs_delta_sum": 0.0, "max_abs_delta": 0.0, "errors": 0, "skipped": 0}
+        if previous is not None:
+            self._spawn(self._retire(previous))
+        return bundle
+
+    async def clear_shadow(self):
+        previous, self.shadow = self.shadow, None
+        if previous is not None:
+            self._shadow_stats.pop(previous.version, None)
+            await self._retire(previous)
+
+    def start(self, version: str, load):
+        """Run ``load()`` (activate / set_shadow of ``version``) in the background.
+
+        Raises SwapInProgress if another load is running.
+        """
+        if self.loading is not None:
+            raise SwapInProgress(f"Model '{self.loading}' is already loading.")
+        self.loading = version
+
+        async def run():
+            try:
+                return await load()
+            finally:
+                self.loading = None
+        return self._spawn(run())
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Background model task failed: %s", task.exception())
+
+    async def _retire(self, bundle: ModelBundle):
+        # Let requests pinned to it finish, then stop its batcher so its threads and memory go
+        deadline = time.monotonic() + MODEL_SWAP_DRAIN_S
+        while bundle.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if bundle.in_flight:
+            log.warning("Stopping model %s with %d requests still in flight.", bundle.version, bundle.in_flight)
+        await bundle.batcher.stop()
+
+    def observe(self, sequences, n_ahead: int, predicted):
+        """Record a served forecast; a sample of them is repeated on the shadow candidate."""
+        self._recent_input = sequences[:1]
+        shadow = self.shadow
+        if shadow is None or random.random() >= self.shadow_sample_rate:
+            return
+        stats = self._shadow_stats[shadow.version]
+        if len(self._shadow_tasks) >= MODEL_SHADOW_MAX_INFLIGHT:
+            stats["skipped"] += 1
+            SHADOW_FORECASTS.labels(shadow.version, "skipped").inc()
+            return
+        task = asyncio.get_running_loop().create_task(self._shadow_forecast(shadow, stats, sequences, n_ahead, np.asarray(predicted)))
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    async def _shadow_forecast(self, shadow: ModelBundle, stats: dict, sequences, n_ahead: int, served):
+        # stats is the candidate's own entry, still valid if it is replaced or cleared meanwhile
+        shadow.in_flight += 1
+        started = time.perf_counter()
+        try:
+            candidate = await self.forecast_fn(sequences, n_ahead, shadow)
+        except Exception as e:
+            stats["errors"] += 1
+            SHADOW_FORECASTS.labels(shadow.version, "error").inc()
+            log.warning("Shadow forecast on model %s failed: %s", shadow.version, e)
+            return
+        finally:
+            shadow.in_flight -= 1
+        SHADOW_SECONDS.labels(shadow.version).observe(time.perf_counter() - started)
+        SHADOW_FORECASTS.labels(shadow.version, "ok").inc()
+        delta = np.abs(np.asarray(candidate) - served)
+        for value in delta.ravel():
+            SHADOW_DELTA.labels(shadow.version).observe(float(value))
+        stats["n"] += delta.size
+        stats["abs_delta_sum"] += float(delta.sum())
+        stats["max_abs_delta"] = max(stats["max_abs_delta"], float(delta.max()))
+
+    async def stop(self):
+        for task in list(self._background) + list(self._shadow_tasks):
+            task.cancel()
+        await asyncio.gather(*self._background, *self._shadow_tasks, return_exceptions=True)
+        for bundle in (self.shadow, self.active):
+            if bundle is not None and bundle.batcher is not None:
+                await bundle.batcher.stop()
+
+    def stats(self) -> dict:
+        shadow = None
+        if self.shadow is not None:
+            s = self._shadow_stats[self.shadow.version]
+            shadow = {**self.shadow.describe(), "sample_rate": self.shadow_sample_rate, "predictions_compared": s["n"],
+                      "mean_abs_delta": s["abs_delta_sum"] / s["n"] if s["n"] else None,
+                      "max_abs_delta": s["max_abs_delta"], "errors": s["errors"], "skipped": s["skipped"]}
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "shadow": shadow,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "available": list_versions(self.root),
+            "history": self.history[-20:],
+        }
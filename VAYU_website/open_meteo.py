@@ -0,0 +1,202 @@
+# open_meteo.py
+# Async Open-Meteo client shared by the prediction endpoints.
+#
+# A single pooled httpx.AsyncClient is reused across requests so that the
+# air-quality and forecast calls for a /predict request can be issued
+# concurrently without blocking the event loop or re-opening TLS connections.
+#
+# Failed requests (timeouts, connection errors, 429 and 5xx) are retried a bounded number of
+# times with jittered exponential backoff, within a per-call retry budget. Each upstream host
+# has a circuit breaker (circuit_breaker.py), so during an outage calls fail immediately
+# instead of each waiting out its timeouts.
+
+import asyncio
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import LATENCY_BUCKETS_S, REGISTRY
+
+AIR_QUALITY_URL = os.environ.get("OPEN_METEO_AIR_QUALITY_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Per-request timeouts (seconds). Open-Meteo normally answers well below a second,
+# so anything slower than this is treated as an upstream failure.
+CONNECT_TIMEOUT = float(os.environ.get("OPEN_METEO_CONNECT_TIMEOUT", "3.0"))
+READ_TIMEOUT = float(os.environ.get("OPEN_METEO_READ_TIMEOUT", "10.0"))
+MAX_CONNECTIONS = int(os.environ.get("OPEN_METEO_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPEN_METEO_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+# Retries after the first attempt. Backoff before retry n is uniform in [0, min(max, base * 2**n)].
+MAX_RETRIES = int(os.environ.get("OPEN_METEO_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY_S = float(os.environ.get("OPEN_METEO_RETRY_BASE_DELAY_S", "0.2"))
+RETRY_MAX_DELAY_S = float(os.environ.get("OPEN_METEO_RETRY_MAX_DELAY_S", "2.0"))
+# No retry is started once this many seconds have passed since the first attempt
+RETRY_BUDGET_S = float(os.environ.get("OPEN_METEO_RETRY_BUDGET_S", "5.0"))
+# Consecutive failures that open a host's breaker, and how long it then stays open
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("OPEN_METEO_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.environ.get("OPEN_METEO_BREAKER_RESET_S", "30"))
+
+_client = None
+_breakers = {}  # host -> CircuitBreaker
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "vayu_upstream_request_seconds", "Latency of individual Open-Meteo requests.", LATENCY_BUCKETS_S, labels=("endpoint",))
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "vayu_upstream_requests_total",
+    "Open-Meteo requests by outcome (ok, timeout, http_error, transport_error, invalid_payload, circuit_open).",
+    labels=("endpoint", "outcome"))
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "vayu_upstream_retries_total", "Open-Meteo requests re-issued after a failed attempt.", labels=("endpoint",))
+
+
+def air_quality_params(latitude: float, longitude: float, past_hours: int) -> dict:
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "hourly": ["pm2_5", "pm10", "carbon_monoxide"],
+        "timezone": "UTC",
+        "past_hours": past_hours
+    }
+
+
+def weather_params(latitude: float, longitude: float, past_hours: int) -> dict:
+    # Using forecast API for temperature as it has better coverage than the archive API
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "hourly": ["temperature_2m"],
+        "timezone": "UTC",
+        "past_hours": past_hours
+    }
+
+
+def request_timeout() -> httpx.Timeout:
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared pooled client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=request_timeout(),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(host, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_S)
+    return _breakers[host]
+
+
+def breaker_stats() -> dict:
+    return {host: breaker.stats() for host, breaker in _breakers.items()}
+
+
+_BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _collect_breaker_metrics():
+    stats = breaker_stats()
+    return [
+        ("vayu_upstream_circuit_state", "gauge", "Circuit breaker state per Open-Meteo host (0 closed, 1 half-open, 2 open).",
+         [({"host": host}, _BREAKER_STATE_VALUES[s["state"]]) for host, s in stats.items()]),
+        ("vayu_upstream_circuit_opens_total", "counter", "Times a host's circuit breaker opened.",
+         [({"host": host}, s["opens"]) for host, s in stats.items()]),
+    ]
+
+REGISTRY.register_collector(_collect_breaker_metrics)
+
+
+def _is_retryable(error: httpx.HTTPError) -> bool:
+    # Worth another attempt (and counted against the breaker): the upstream is slow, unreachable
+    # or overloaded. Other 4xx responses would fail the same way again.
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _backoff_s(retry: int, error: httpx.HTTPError) -> float:
+    delay = random.uniform(0.0, min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * 2 ** retry))
+    if isinstance(error, httpx.HTTPStatusError):
+        # Honour a Retry-After in seconds, up to the usual maximum delay
+        try:
+            delay = max(delay, min(float(error.response.headers.get("Retry-After", 0)), RETRY_MAX_DELAY_S))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _attempt(url: str, params: dict, endpoint: str) -> dict:
+    started = time.perf_counter()
+    outcome = "transport_error"
+    try:
+        response = await get_client().get(url, params=params, timeout=request_timeout())
+        if response.is_error:
+            outcome = "http_error"
+        response.raise_for_status()
+        outcome = "invalid_payload"
+        payload = response.json()
+        outcome = "ok"
+        return payload
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        raise
+    finally:
+        UPSTREAM_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        UPSTREAM_REQUESTS.labels(endpoint, outcome).inc()
+
+
+async def _get_json(url: str, params: dict, endpoint: str) -> dict:
+    breaker = breaker_for(url)
+    started = time.perf_counter()
+    retry = 0
+    while True:
+        if not breaker.allow():
+            UPSTREAM_REQUESTS.labels(endpoint, "circuit_open").inc()
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open; next attempt in {breaker.retry_after_s():.0f}s.")
+        try:
+            payload = await _attempt(url, params, endpoint)
+        except Exception as e:
+            if not isinstance(e, httpx.HTTPError) or not _is_retryable(e):
+                # The host answered (a client error or an unparseable body), so it is up
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = _backoff_s(retry, e)
+            if retry >= MAX_RETRIES or time.perf_counter() - started + delay > RETRY_BUDGET_S:
+                raise
+            retry += 1
+            UPSTREAM_RETRIES.labels(endpoint).inc()
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return payload
+
+
+async def fetch_hourly_payloads(latitude: float, longitude: float, past_hours: int):
+    """Fetch the air-quality and temperature payloads concurrently.
+
+    Returns a tuple ``(air_quality_data, weather_data)`` of decoded JSON bodies.
+    Raises ``httpx.HTTPError`` if either request still fails after its retries, or
+    ``CircuitOpenError`` (a subclass) if the host's breaker is open.
+    """
+    return await asyncio.gather(
+        _get_json(AIR_QUALITY_URL, air_quality_params(latitude, longitude, past_hours), "air_quality"),
+        _get_json(FORECAST_URL, weather_params(latitude, longitude, past_hours), "forecast"),
+    )
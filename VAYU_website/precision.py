@@ -0,0 +1,87 @@
+# precision.py
+# Reduced-precision inference, and the accuracy check that has to pass before it is used.
+#
+# INFERENCE_PRECISION picks the numeric format of a model bundle:
+#   float64   preprocessing and (JAX path) the forward pass, weights and layers in float64
+#   float32   preprocessing and the forward pass in float32
+# Whenever a bundle is loaded in float32, its 1-hour AQI forecasts for a stored calibration
+# set of input windows are compared with those of a float64 forward pass (the compiled JAX
+# function built in float64; model.predict can't be the reference, as Keras layers compute in
+# float32 whatever they are given). If the largest difference exceeds
+# PRECISION_MAX_AQI_ERROR, or there is no calibration set or float64 reference to check
+# against, the bundle is served in float64 instead.
+
+import logging
+import os
+
+import numpy as np
+
+log = logging.getLogger("vayu.precision")
+
+PRECISIONS = ("float64", "float32")
+INFERENCE_PRECISION = os.environ.get("INFERENCE_PRECISION", "float64").lower()
+# Largest absolute AQI difference from float64 allowed on the calibration set
+PRECISION_MAX_AQI_ERROR = float(os.environ.get("PRECISION_MAX_AQI_ERROR", "2.0"))
+# Unscaled model input windows, shape (N, sequence_length, 5); backtest.py --calibration-out writes one
+CALIBRATION_PATH = os.environ.get("INFERENCE_CALIBRATION_PATH", "calibration_windows.npy")
+# Windows taken from the calibration set for the check
+CALIBRATION_MAX_WINDOWS = int(os.environ.get("INFERENCE_CALIBRATION_MAX_WINDOWS", "512"))
+
+
+class PrecisionRejected(RuntimeError):
+    """The reduced precision's forecasts are too far from the float64 ones."""
+
+    def __init__(self, message: str, report: dict = None):
+        super().__init__(message)
+        self.report = report or {}
+
+
+def parse_precision(value: str) -> str:
+    precision = value.lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{value}'; expected one of {', '.join(PRECISIONS)}.")
+    return precision
+
+
+def compute_dtype(precision: str):
+    """numpy dtype that preprocessing (and the JAX forward pass) runs in for ``precision``."""
+    return np.float64 if precision == "float64" else np.float32
+
+
+def load_calibration(path: str, sequence_length: int, num_features: int, max_windows: int = CALIBRATION_MAX_WINDOWS) -> np.ndarray:
+    windows = np.load(path)
+    if windows.ndim != 3 or windows.shape[1:] != (sequence_length, num_features):
+        raise ValueError(f"Calibration windows in {path} have shape {windows.shape}; the model needs (N, {sequence_length}, {num_features}).")
+    windows = windows[~np.isnan(windows).any(axis=(1, 2))]
+    if windows.shape[0] == 0:
+        raise ValueError(f"No complete calibration windows in {path}.")
+    if windows.shape[0] > max_windows:
+        # Spread over the whole set rather than just its start
+        windows = windows[np.linspace(0, windows.shape[0] - 1, max_windows).astype(np.int64)]
+    return windows.astype(np.float64)
+
+
+def check_precision(precision: str, reference_fn, candidate_fn, windows: np.ndarray, max_error: float = PRECISION_MAX_AQI_ERROR) -> dict:
+    """Compare ``candidate_fn`` with ``reference_fn`` (windows -> AQI) on the calibration windows.
+
+    Returns the error report; raises PrecisionRejected (carrying it) if the largest absolute
+    AQI difference is above ``max_error``.
+    """
+    reference = np.asarray(reference_fn(windows), dtype=np.float64)
+    candidate = np.asarray(candidate_fn(windows), dtype=np.float64)
+    error = np.abs(candidate - reference)
+    report = {
+        "precision": precision,
+        "windows": int(windows.shape[0]),
+        "mean_abs_aqi_error": float(np.mean(error)),
+        "p99_abs_aqi_error": float(np.percentile(error, 99)),
+        "max_abs_aqi_error": float(np.max(error)),
+        "max_allowed": max_error,
+    }
+    if not np.all(np.isfinite(candidate)) or report["max_abs_aqi_error"] > max_error:
+        raise PrecisionRejected(
+            f"{precision} forecasts differ from float64 by up to {report['max_abs_aqi_error']:.3f} AQI "
+            f"(allowed {max_error}).", report)
+    log.info("%s accepted: max AQI error %.3f, mean %.4f over %d calibration windows.",
+             precision, report["max_abs_aqi_error"], report["mean_abs_aqi_error"], report["windows"])
+    return report
@@ -0,0 +1,131 @@
+# preprocessing.py
+# Pandas-free construction of the model input from the raw Open-Meteo hourly arrays.
+#
+# Produces exactly what app._build_processed_frame + app._select_latest_sequence produce
+# (inner merge on timestamp, resample('h').mean(), ffill().bfill(), AQI, recent-window
+# filter, dropna, tail) for the payloads Open-Meteo returns: timestamps on the hour and
+# strictly increasing. Both sources are placed on an integer epoch-hour axis, gaps are
+# filled with a vectorized forward/backward fill and the window is gathered straight into a
+# preallocated buffer. Anything else (duplicate or sub-hourly timestamps, ragged columns)
+# raises UnsupportedPayload so the caller can fall back to the pandas pipeline.
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from metrics import stage_timer
+
+FEATURE_COLUMNS = ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co']
+# Source column for every non-AQI feature, in FEATURE_COLUMNS order
+_AIR_QUALITY_COLUMNS = ('pm2_5', 'pm10', 'carbon_monoxide')
+_WEATHER_COLUMNS = ('temperature_2m',)
+
+
+class UnsupportedPayload(ValueError):
+    """The payload needs the general (pandas) pipeline."""
+
+
+class HourlyGrid:
+    """Feature rows for consecutive UTC hours starting at ``start_hour`` (hours since the epoch)."""
+
+    __slots__ = ("start_hour", "values")
+
+    def __init__(self, start_hour: int, values: np.ndarray):
+        self.start_hour = int(start_hour)
+        self.values = values  # (n_hours, len(FEATURE_COLUMNS)) float64, NaN where unknown
+
+    @property
+    def hours(self) -> np.ndarray:
+        return self.start_hour + np.arange(self.values.shape[0], dtype=np.int64)
+
+
+def _parse_hours(times) -> np.ndarray:
+    try:
+        minutes = np.asarray(times, dtype="datetime64[m]").astype(np.int64)
+    except (TypeError, ValueError) as e:
+        raise UnsupportedPayload(f"Unrecognised timestamps: {e}") from e
+    if np.any(minutes % 60):
+        raise UnsupportedPayload("Timestamps are not on the hour.")
+    hours = minutes // 60
+    if np.any(np.diff(hours) <= 0):
+        raise UnsupportedPayload("Timestamps are not strictly increasing.")
+    return hours
+
+
+def _column(hourly: dict, name: str, n: int) -> np.ndarray:
+    if name not in hourly:
+        return np.full(n, np.nan)
+    try:
+        values = np.asarray(hourly[name], dtype=np.float64)  # None -> NaN
+    except (TypeError, ValueError) as e:
+        raise UnsupportedPayload(f"Non-numeric values in '{name}': {e}") from e
+    if values.shape != (n,):
+        raise UnsupportedPayload(f"'{name}' has {values.size} values for {n} timestamps.")
+    return values
+
+
+def _fill_gaps(values: np.ndarray):
+    # In place, per column: forward fill then backward fill, like DataFrame.ffill().bfill()
+    n = values.shape[0]
+    index = np.arange(n)[:, None]
+    last_valid = np.maximum.accumulate(np.where(np.isnan(values), 0, index), axis=0)
+    values[:] = np.take_along_axis(values, last_valid, axis=0)
+    next_valid = np.minimum.accumulate(np.where(np.isnan(values), n - 1, index)[::-1], axis=0)[::-1]
+    values[:] = np.take_along_axis(values, next_valid, axis=0)
+
+
+def build_hourly_grid(air_quality_data: dict, weather_data: dict, aqi_calculator):
+    """Raw payloads -> ``(HourlyGrid, None)``, or ``(None, error message)`` like the pandas path."""
+    if 'hourly' not in air_quality_data or 'time' not in air_quality_data['hourly']:
+        return None, "Error: Invalid air quality data format from API."
+    if 'hourly' not in weather_data or 'time' not in weather_data['hourly']:
+        return None, "Error: Invalid weather data format from API."
+    air_quality, weather = air_quality_data['hourly'], weather_data['hourly']
+
+    with stage_timer("parse"):
+        aq_hours = _parse_hours(air_quality['time'])
+        weather_hours = _parse_hours(weather['time'])
+        # Same as DataFrame.empty: no timestamps, or nothing but the 'time' column
+        if aq_hours.size == 0 or weather_hours.size == 0 or len(air_quality) < 2 or len(weather) < 2:
+            return None, "Error: Insufficient data from APIs (AQ or Temp empty)."
+        aq_columns = [_column(air_quality, name, aq_hours.size) for name in _AIR_QUALITY_COLUMNS]
+        weather_columns = [_column(weather, name, weather_hours.size) for name in _WEATHER_COLUMNS]
+
+    with stage_timer("align"):
+        common, aq_rows, weather_rows = np.intersect1d(aq_hours, weather_hours, assume_unique=True, return_indices=True)
+        if common.size == 0:
+            return None, "Error: No overlapping AQ and Temperature data available for the period."
+        start_hour = common[0]
+        values = np.full((int(common[-1] - start_hour) + 1, len(FEATURE_COLUMNS)), np.nan)
+        rows = common - start_hour
+        values[rows, 1] = weather_columns[0][weather_rows]
+        for offset, column in enumerate(aq_columns):
+            values[rows, 2 + offset] = column[aq_rows]
+        _fill_gaps(values[:, 1:])
+
+    with stage_timer("aqi"):
+        values[:, 0] = aqi_calculator.overall_aqi({'pm25': values[:, 2], 'pm10': values[:, 3], 'co': values[:, 4]})
+    return HourlyGrid(start_hour, values), None
+
+
+def latest_window(grid: HourlyGrid, sequence_length: int, now_hour: int, out=None):
+    """The last ``sequence_length`` complete rows at or before ``now_hour``.
+
+    Only the last ``sequence_length + 24`` hours are considered, as in the pandas path.
+    Returns ``(array of shape (1, sequence_length, 5), timestamps)`` or ``(None, message)``.
+    ``out`` may be a preallocated (1, sequence_length, 5) buffer to write into.
+    """
+    processing_window_hours = sequence_length + 24
+    lo = max(now_hour - (processing_window_hours - 1) - grid.start_hour, 0)
+    hi = min(now_hour - grid.start_hour + 1, grid.values.shape[0])
+    block = grid.values[lo:max(hi, lo)]
+    complete = np.flatnonzero(~np.isnan(block).any(axis=1))
+    if complete.size < sequence_length:
+        return None, f"Error: Insufficient historical data in the recent window ({complete.size} points available, {sequence_length} required)."
+
+    rows = complete[complete.size - sequence_length:]
+    if out is None:
+        out = np.empty((1, sequence_length, block.shape[1]), dtype=block.dtype)
+    np.take(block, rows, axis=0, out=out[0])
+    timestamps = [datetime.fromtimestamp(int(hour) * 3600, tz=timezone.utc) for hour in grid.start_hour + lo + rows]
+    return out, timestamps
@@ -0,0 +1,77 @@
+# readiness.py
+# Startup bookkeeping behind /healthz and /readyz.
+#
+# Artifacts are loaded in the background after the server is already accepting
+# connections; this records how long each one took and whether it failed, so the
+# load balancer only routes to warm replicas and time-to-ready can be tracked.
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+log = logging.getLogger("vayu.startup")
+
+
+class StartupState:
+    def __init__(self):
+        self.phase = "starting"  # starting -> loading -> ready | failed
+        self.error = None
+        self.time_to_ready_s = None
+        self.artifacts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def begin(self):
+        with self._lock:
+            self.phase = "loading"
+
+    @contextmanager
+    def track(self, name: str, required: bool = True):
+        """Time the load of one artifact and record its outcome.
+
+        Failures of required artifacts propagate (and fail startup); failures of
+        optional ones are recorded and swallowed.
+        """
+        with self._lock:
+            self.artifacts[name] = {"status": "loading", "required": required}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.artifacts[name].update(status="failed", seconds=time.perf_counter() - start, error=str(e))
+            log.error("Error loading %s: %s", name, e, exc_info=required, extra={"artifact": name, "required": required})
+            if required:
+                raise
+        else:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.artifacts[name].update(status="loaded", seconds=seconds)
+            log.info("Loaded %s in %.2fs.", name, seconds, extra={"artifact": name, "seconds": round(seconds, 4)})
+
+    def mark_ready(self):
+        with self._lock:
+            self.phase = "ready"
+            self.time_to_ready_s = time.perf_counter() - PROCESS_START
+
+    def mark_failed(self, error):
+        with self._lock:
+            self.phase = "failed"
+            self.error = str(error)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.phase == "ready",
+                "phase": self.phase,
+                "error": self.error,
+                "uptime_s": time.perf_counter() - PROCESS_START,
+                "time_to_ready_s": self.time_to_ready_s,
+                "artifacts": {name: dict(info) for name, info in self.artifacts.items()},
+            }
@@ -0,0 +1,415 @@
+# sensor_ingest.py
+# Hourly readings pushed by IoT nodes (cpp/IoT_Node_Sketch.ino), kept as ready-made model windows.
+#
+# Each node has a fixed ring buffer of its last SENSOR_WINDOW_HOURS hourly rows in the model's
+# feature order (calculated_aqi, temp, pm25, pm10, co). AQI is computed once per reading, when
+# it is appended, with the same breakpoints as the Open-Meteo path. A forecast for a node is then
+# a copy out of its buffer plus a model call, with no upstream fetch and no regridding.
+# Hours a node missed are forward-filled, like the Open-Meteo path fills its gaps, for up to
+# SENSOR_MAX_GAP_HOURS in a row; a longer outage restarts the node's window.
+# With a time-series store, every accepted reading is also appended to it as station
+# "node_<node_id>" (observed hours only; the filled ones are derived again from them), and the
+# store is the source of truth: each buffer remembers the store revision it reflects, and a
+# node whose station was written by another process (or before a restart) is rebuilt from
+# the stored rows before it is read or appended to.
+# Reads name a node chosen by the caller (GET /sensors/{node_id}, /predict with node_id), so the
+# store is only consulted for nodes this process has taken readings from or has seen in the
+# store's station list, which is listed again at most once per SENSOR_NODE_RESCAN_S. Any other
+# id is answered as unknown without touching the disk.
+# The buffers live on the event loop, so no locking is needed; store reads and writes run in an executor.
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+import pytz
+
+from preprocessing import FEATURE_COLUMNS
+
+log = logging.getLogger("vayu.sensors")
+
+SENSOR_WINDOW_HOURS = int(os.environ.get("SENSOR_WINDOW_HOURS", "48"))
+SENSOR_MAX_GAP_HOURS = int(os.environ.get("SENSOR_MAX_GAP_HOURS", "3"))
+# A node's window is only used for forecasts while its newest reading is at most this old
+SENSOR_MAX_STALENESS_HOURS = int(os.environ.get("SENSOR_MAX_STALENESS_HOURS", "2"))
+SENSOR_MAX_NODES = int(os.environ.get("SENSOR_MAX_NODES", "10000"))
+# Least time between two listings of the store for nodes written by other processes
+SENSOR_NODE_RESCAN_S = float(os.environ.get("SENSOR_NODE_RESCAN_S", "60"))
+# Timezone of timestamps in the sketch's "dd-mm-YYYY HH:MM" format (it reports IST wall-clock time)
+SENSOR_NODE_TIMEZONE = os.environ.get("SENSOR_NODE_TIMEZONE", "Asia/Kolkata")
+NODE_TIME_FORMAT = "%d-%m-%Y %H:%M"
+
+# Readings outside these ranges are rejected as sensor faults or unit mix-ups. Units as the
+# sketch reports them and as Open-Meteo uses: degC, ug/m3 (CO included).
+VALID_RANGES = {
+    "temp": (-40.0, 85.0),
+    "pm2_5": (0.0, 1000.0),
+    "pm10": (0.0, 2000.0),
+    "co": (0.0, 100000.0),
+}
+# How far ahead of the server clock a reading may be stamped (node clock drift)
+MAX_FUTURE_HOURS = 1
+# Node ids name the node's directory in the time-series store, so they are kept to safe characters
+NODE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}")
+
+
+NODE_STATION_PREFIX = "node_"
+
+
+def node_station(node_id: str) -> str:
+    """Station name of a node in the time-series store."""
+    return f"{NODE_STATION_PREFIX}{node_id}"
+
+
+def parse_reading_hour(value: str, local_tz=None) -> int:
+    """ISO 8601 (naive means UTC) or the sketch's local format -> hours since the epoch."""
+    try:
+        t = datetime.fromisoformat(value)
+    except ValueError:
+        t = (local_tz or pytz.timezone(SENSOR_NODE_TIMEZONE)).localize(datetime.strptime(value, NODE_TIME_FORMAT))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp() // 3600)
+
+
+class NodeWindow:
+    """Ring buffer of one node's most recent hourly feature rows."""
+
+    __slots__ = ("node_id", "values", "hours", "observed", "head", "length", "newest", "latitude", "longitude", "resets",
+                 "revision")
+
+    def __init__(self, node_id: str, capacity: int):
+        self.node_id = node_id
+        self.values = np.full((capacity, len(FEATURE_COLUMNS)), np.nan)
+        self.hours = np.zeros(capacity, dtype=np.int64)
+        self.observed = np.zeros(capacity, dtype=bool)  # False for forward-filled hours
+        self.head = 0  # slot of the newest hour
+        self.length = 0  # consecutive hours held, ending at newest
+        self.newest = None
+        self.latitude = None
+        self.longitude = None
+        self.resets = 0
+        self.revision = 0  # store revision of the node's station that the buffer reflects
+
+    def append(self, hour: int, row: np.ndarray):
+        """Add the row for ``hour``; returns an error message if it can't be placed."""
+        capacity = self.values.shape[0]
+        if self.newest is not None and hour <= self.newest:
+            # Late or repeated reading: overwrite its hour, and the filled hours after it
+            age = self.newest - hour
+            if age >= self.length:
+                return "Reading is older than the node's window."
+            slot = (self.head - age) % capacity
+            self.values[slot] = row
+            self.observed[slot] = True
+            for later in range(age - 1, -1, -1):
+                s = (self.head - later) % capacity
+                if self.observed[s]:
+                    break
+                self.values[s] = row
+            return None
+
+        if self.newest is None or hour - self.newest - 1 > SENSOR_MAX_GAP_HOURS:
+            if self.newest is not None:
+                self.resets += 1
+            self.head, self.length = 0, 1
+            self.values[0], self.hours[0], self.observed[0] = row, hour, True
+            self.newest = hour
+            return None
+
+        steps = hour - self.newest
+        slots = (self.head + np.arange(1, steps + 1)) % capacity
+        self.values[slots[:-1]] = self.values[self.head]
+        self.values[slots[-1]] = row
+        self.hours[slots] = self.newest + np.arange(1, steps + 1)
+        self.observed[slots] = False
+        self.observed[slots[-1]] = True
+        self.head = int(slots[-1])
+        self.length = min(self.length + steps, capacity)
+        self.newest = hour
+        return None
+
+    def window(self, sequence_length: int, now_hour: int, out=None):
+        """``(array of shape (1, sequence_length, 5), timestamps)`` or ``(None, message)``, like latest_window."""
+        if self.length < sequence_length:
+            return None, f"Node has {self.length} of the {sequence_length} consecutive hours required."
+        if now_hour - self.newest > SENSOR_MAX_STALENESS_HOURS:
+            return None, f"Node's newest reading is {now_hour - self.newest} hours old."
+        slots = (self.head - sequence_length + 1 + np.arange(sequence_length)) % self.values.shape[0]
+        if out is None:
+            out = np.empty((1, sequence_length, self.values.shape[1]), dtype=self.values.dtype)
+        np.take(self.values, slots, axis=0, out=out[0])
+        timestamps = [datetime.fromtimestamp(int(hour) * 3600, tz=timezone.utc) for hour in self.hours[slots]]
+        return out, timestamps
+
+    def describe(self) -> dict:
+        latest = None
+        if self.newest is not None:
+            latest = dict(zip(FEATURE_COLUMNS, self.values[self.head].tolist()))
+        return {
+            "node_id": self.node_id,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "newest_hour": datetime.fromtimestamp(self.newest * 3600, tz=timezone.utc).isoformat() if self.newest is not None else None,
+            "hours_buffered": self.length,
+            "filled_hours": int(self.length - np.count_nonzero(self.observed[(self.head - np.arange(self.length)) % self.values.shape[0]])),
+            "latest": latest,
+            "resets": self.resets,
+        }
+
+
+class SensorNodes:
+    """Ring-buffer windows for all nodes, least recently updated evicted beyond ``max_nodes``.
+
+    ``store`` is an optional TimeSeriesStore that accepted readings are appended to. Nodes it
+    holds that this instance has not seen are found by listing it at most every ``rescan_interval_s``.
+    """
+
+    def __init__(self, aqi_calculator, capacity: int = SENSOR_WINDOW_HOURS, max_nodes: int = SENSOR_MAX_NODES, store=None,
+                 rescan_interval_s: float = SENSOR_NODE_RESCAN_S):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self.aqi_calculator = aqi_calculator
+        self.capacity = capacity
+        self.max_nodes = max_nodes
+        self.store = store
+        self.rescan_interval_s = rescan_interval_s
+        self._nodes = OrderedDict()  # node_id -> NodeWindow
+        self._known = set()  # ids with readings here or in the store, buffered or not
+        self._scanned_at = float("-inf")
+        self._scan = None  # the store listing in progress, if any
+        self._local_tz = pytz.timezone(SENSOR_NODE_TIMEZONE)
+        self.accepted = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.window_resets = 0
+        self.forecasts = 0
+        self.store_errors = 0
+        self.reloads = 0
+        self.rescans = 0
+
+    async def ingest(self, readings, now_hour: int):
+        """Validate and append a batch of readings (objects with the SensorReading fields).
+
+        Returns ``(accepted, rejected)``, where rejected lists ``{"index", "node_id", "error"}``.
+        Validation and AQI are computed for the whole batch at once; rows are appended in hour
+        order, and the accepted ones are written to the store before this returns.
+        """
+        n = len(readings)
+        errors = [None] * n
+        hours = np.zeros(n, dtype=np.int64)
+        for i, reading in enumerate(readings):
+            if not NODE_ID_PATTERN.fullmatch(reading.node_id):
+                errors[i] = "node_id must be 1-64 letters, digits, '.', '_' or '-', and not start with '.'."
+                continue
+            try:
+                hours[i] = parse_reading_hour(reading.timestamp, self._local_tz)
+            except (TypeError, ValueError):
+                errors[i] = f"Unrecognised timestamp '{reading.timestamp}'."
+        columns = {name: np.array([getattr(r, name) for r in readings], dtype=np.float64) for name in VALID_RANGES}
+
+        invalid = np.array([e is not None for e in errors], dtype=bool)
+        for name, (low, high) in VALID_RANGES.items():
+            values = columns[name]
+            for i in np.flatnonzero(~invalid & np.isnan(values)):
+                errors[i] = f"Missing '{name}'."
+            invalid |= np.isnan(values)
+            for i in np.flatnonzero(~invalid & ((values < low) | (values > high))):
+                errors[i] = f"'{name}' = {values[i]} is outside [{low}, {high}]."
+            invalid |= (values < low) | (values > high)
+        for i in np.flatnonzero(~invalid & (hours > now_hour + MAX_FUTURE_HOURS)):
+            errors[i] = "Timestamp is in the future."
+        invalid |= hours > now_hour + MAX_FUTURE_HOURS
+
+        valid = np.flatnonzero(~invalid)
+        node_ids = {readings[i].node_id for i in valid}
+        self._known |= node_ids
+        # Late readings are placed against everything stored for the node, not just this process's share
+        await self._refresh(node_ids)
+        rows = np.empty((valid.size, len(FEATURE_COLUMNS)))
+        rows[:, 1] = columns["temp"][valid]
+        rows[:, 2] = columns["pm2_5"][valid]
+        rows[:, 3] = columns["pm10"][valid]
+        rows[:, 4] = columns["co"][valid]
+        rows[:, 0] = self.aqi_calculator.overall_aqi({'pm25': rows[:, 2], 'pm10': rows[:, 3], 'co': rows[:, 4]})
+
+        accepted = 0
+        to_store = {}  # node_id -> ([hour, ...], [row, ...])
+        for k in np.argsort(hours[valid], kind="stable"):
+            i = int(valid[k])
+            reading = readings[i]
+            node = self._node(reading.node_id)
+            resets = node.resets
+            error = node.append(int(hours[i]), rows[k])
+            self.window_resets += node.resets - resets
+            if error is not None:
+                errors[i] = error
+                continue
+            if reading.latitude is not None and reading.longitude is not None:
+                node.latitude, node.longitude = reading.latitude, reading.longitude
+            accepted += 1
+            node_hours, node_rows = to_store.setdefault(reading.node_id, ([], []))
+            node_hours.append(int(hours[i]))
+            node_rows.append(rows[k])
+
+        rejected = [{"index": i, "node_id": readings[i].node_id, "error": e} for i, e in enumerate(errors) if e is not None]
+        self.accepted += accepted
+        self.rejected += len(rejected)
+        if rejected:
+            log.debug("Rejected %d of %d sensor readings; first: %s", len(rejected), n, rejected[0])
+        if self.store is not None and to_store:
+            revisions = await asyncio.get_running_loop().run_in_executor(None, self._store_rows, to_store)
+            for node_id, revision in revisions.items():
+                node = self._nodes.get(node_id)
+                # Each append bumps the revision by one, so anything else means another writer
+                # got in between and the buffer is rebuilt from the store on its next use
+                if node is not None and node.revision == revision - 1:
+                    node.revision = revision
+        return accepted, rejected
+
+    def _store_rows(self, to_store: dict) -> dict:
+        # Blocking; the buffers keep serving from memory if a write fails
+        revisions = {}
+        for node_id, (node_hours, node_rows) in to_store.items():
+            try:
+                revisions[node_id] = self.store.append(node_station(node_id), node_hours, node_rows)
+            except Exception as e:
+                self.store_errors += 1
+                log.warning("Could not store readings of node %s: %s", node_id, e)
+        return revisions
+
+    def _load(self, node_id: str, revision: int) -> NodeWindow:
+        # Replays the node's observed rows of the last `capacity` hours, so gaps are filled as on ingest
+        station = node_station(node_id)
+        node = NodeWindow(node_id, self.capacity)
+        node.revision = revision
+        newest = self.store.latest_hour(station)
+        if newest is None:
+            return node
+        first = newest - self.capacity + 1
+        rows = self.store.read_range(station, first, newest)
+        for offset in np.flatnonzero(~np.isnan(rows).any(axis=1)):
+            node.append(first + int(offset), rows[offset])
+        node.resets = 0
+        return node
+
+    def _load_behind(self, revisions: dict) -> dict:
+        # Blocking. revisions: node_id -> revision of its buffer (None if not buffered); returns the
+        # rebuilt buffers of the nodes whose station has moved on since
+        loaded = {}
+        for node_id, known_revision in revisions.items():
+            try:
+                # Read before the rows: a write in between only makes the next check reload again
+                revision = self.store.revision(node_station(node_id))
+                if revision is not None and revision != known_revision:
+                    loaded[node_id] = self._load(node_id, revision)
+            except Exception as e:
+                self.store_errors += 1
+                log.warning("Could not read node %s from the store: %s", node_id, e)
+        return loaded
+
+    async def _refresh(self, node_ids):
+        """Rebuild the buffers of ``node_ids`` that are missing or behind the store."""
+        if self.store is None or not node_ids:
+            return
+        before = {node_id: self._nodes.get(node_id) for node_id in node_ids}
+        revisions = {node_id: node.revision if node is not None else None for node_id, node in before.items()}
+        loaded = await asyncio.get_running_loop().run_in_executor(None, self._load_behind, revisions)
+        for node_id, fresh in loaded.items():
+            node = self._nodes.get(node_id)
+            if node is not before[node_id] or (node is not None and node.revision != revisions[node_id]):
+                # Changed on the loop while the store was read; the next use checks again
+                continue
+            if node is not None:
+                fresh.latitude, fresh.longitude = node.latitude, node.longitude
+            self.reloads += 1
+            self._install(fresh)
+
+    def _stored_node_ids(self) -> set:
+        # Blocking
+        return {station[len(NODE_STATION_PREFIX):] for station in self.store.stations()
+                if station.startswith(NODE_STATION_PREFIX)}
+
+    async def _rescan(self):
+        try:
+            stored = await asyncio.get_running_loop().run_in_executor(None, self._stored_node_ids)
+        except Exception as e:
+            self.store_errors += 1
+            log.warning("Could not list the nodes in the store: %s", e)
+        else:
+            self._known |= stored
+        finally:
+            self._scan = None
+
+    async def _is_known(self, node_id: str) -> bool:
+        if node_id in self._nodes or node_id in self._known:
+            return True
+        if self.store is None or not NODE_ID_PATTERN.fullmatch(node_id):
+            return False
+        # Unknown ids share one listing per interval, however many of them arrive
+        if self._scan is None and time.monotonic() - self._scanned_at >= self.rescan_interval_s:
+            self._scanned_at = time.monotonic()
+            self.rescans += 1
+            self._scan = asyncio.ensure_future(self._rescan())
+        if self._scan is not None:
+            await asyncio.shield(self._scan)
+        return node_id in self._known
+
+    async def _current(self, node_id: str):
+        """The node's buffer, rebuilt from the store if it is missing or behind it; None for unknown nodes."""
+        if not await self._is_known(node_id):
+            return None
+        await self._refresh([node_id])
+        return self._nodes.get(node_id)
+
+    def _node(self, node_id: str) -> NodeWindow:
+        node = self._nodes.get(node_id)
+        if node is None:
+            return self._install(NodeWindow(node_id, self.capacity))
+        self._nodes.move_to_end(node_id)
+        return node
+
+    def _install(self, node: NodeWindow) -> NodeWindow:
+        self._nodes[node.node_id] = node
+        self._nodes.move_to_end(node.node_id)
+        if len(self._nodes) > self.max_nodes:
+            self._nodes.popitem(last=False)
+            self.evictions += 1
+        return node
+
+    async def window(self, node_id: str, sequence_length: int, now_hour: int):
+        """The node's latest model window, as ``latest_window`` returns it."""
+        node = await self._current(node_id)
+        if node is None:
+            return None, f"No readings from node '{node_id}'."
+        if sequence_length > self.capacity:
+            return None, f"The model needs {sequence_length} hours but SENSOR_WINDOW_HOURS is {self.capacity}."
+        sequence, message = node.window(sequence_length, now_hour)
+        if sequence is not None:
+            self.forecasts += 1
+        return sequence, message
+
+    async def describe(self, node_id: str):
+        node = await self._current(node_id)
+        return node.describe() if node is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "nodes": len(self._nodes),
+            "known_nodes": len(self._known),
+            "max_nodes": self.max_nodes,
+            "window_hours": self.capacity,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+            "window_resets": self.window_resets,
+            "forecasts": self.forecasts,
+            "store_errors": self.store_errors,
+            "store_reloads": self.reloads,
+            "store_rescans": self.rescans,
+        }
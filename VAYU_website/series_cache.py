@@ -0,0 +1,200 @@
+# series_cache.py
+# In-process cache of processed Open-Meteo series.
+#
+# Open-Meteo only publishes new hourly values once an hour, so the merged, resampled and
+# AQI-annotated series for a grid cell can be reused by every request in the same UTC hour.
+# Entries are keyed by (grid-snapped latitude, grid-snapped longitude, past_hours, UTC hour),
+# expire on the next hour boundary and are evicted least-recently-used beyond max_entries.
+# Concurrent misses for the same key share one upstream fetch.
+#
+# Stale-while-revalidate: the last good value for a location is kept for up to
+# SERIES_CACHE_STALE_HOURS after it expires. A miss that has such a value returns it straight
+# away and refreshes the entry in a background task, so when the upstream is slow or down
+# requests keep being answered from slightly older data instead of waiting on it.
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+MAX_ENTRIES = int(os.environ.get("SERIES_CACHE_MAX_ENTRIES", "512"))
+# Open-Meteo's air-quality grid is 0.1 degrees over Europe and coarser elsewhere,
+# so coordinates closer than this resolve to the same upstream cell anyway.
+GRID_DEGREES = float(os.environ.get("SERIES_CACHE_GRID_DEGREES", "0.1"))
+# How many hours past its own an entry may still be served while it is refreshed; 0 disables
+STALE_HOURS = int(os.environ.get("SERIES_CACHE_STALE_HOURS", "3"))
+
+log = logging.getLogger("vayu.series_cache")
+
+
+class _LoadAbandoned(Exception):
+    """The caller running a shared load was cancelled; whoever waited on it should retry."""
+
+
+class HourlySeriesCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, grid_degrees: float = GRID_DEGREES, stale_hours: int = STALE_HOURS):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive.")
+        if grid_degrees <= 0:
+            raise ValueError("grid_degrees must be positive.")
+        self.max_entries = max_entries
+        self.grid_degrees = grid_degrees
+        self.stale_hours = max(stale_hours, 0)
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._last_good = OrderedDict()  # key without the hour -> (hour, value)
+        self._inflight = {}  # key -> asyncio.Future shared by coalesced callers
+        self._revalidations = set()  # background refresh tasks, referenced until done
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_served = 0
+        self.revalidation_failures = 0
+
+    def snap(self, latitude: float, longitude: float):
+        """Round a coordinate pair to the centre of its grid cell."""
+        g = self.grid_degrees
+        return round(round(latitude / g) * g, 6), round(round(longitude / g) * g, 6)
+
+    def make_key(self, latitude: float, longitude: float, past_hours: int, now: datetime = None):
+        now = now or datetime.now(timezone.utc)
+        hour = now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        lat, lon = self.snap(latitude, longitude)
+        return (lat, lon, past_hours, hour)
+
+    def _lookup(self, key, now: datetime):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if now >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, now: datetime):
+        # key[3] is the UTC hour the data belongs to; it is stale from the next hour on.
+        expires_at = key[3] + timedelta(hours=1)
+        for stale_key in [k for k, (exp, _) in self._entries.items() if now >= exp]:
+            del self._entries[stale_key]
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if self.stale_hours:
+            self._last_good[key[:3]] = (key[3], value)
+            self._last_good.move_to_end(key[:3])
+            while len(self._last_good) > self.max_entries:
+                self._last_good.popitem(last=False)
+
+    def _lookup_stale(self, key):
+        entry = self._last_good.get(key[:3])
+        if entry is None or entry[0] >= key[3]:
+            return None
+        hour, value = entry
+        if key[3] - hour > timedelta(hours=self.stale_hours):
+            del self._last_good[key[:3]]
+            return None
+        return value
+
+    def _revalidate(self, key, loader, now: datetime):
+        task = asyncio.get_running_loop().create_task(self._load(key, loader, now))
+        self._revalidations.add(task)
+        task.add_done_callback(self._revalidation_done)
+
+    def _revalidation_done(self, task):
+        self._revalidations.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None or task.result()[0] is None:
+            self.revalidation_failures += 1
+            log.debug("Background refresh of a stale series failed: %s", error if error is not None else task.result()[1])
+
+    async def get_or_load(self, key, loader, now: datetime = None, allow_stale: bool = True):
+        """Return ``(value, error)`` for ``key``, calling ``loader()`` on a miss.
+
+        ``loader`` is an async callable returning a ``(value, error)`` tuple; only
+        results with a non-None value are cached. Callers that miss while a load
+        for the same key is already running wait for that load instead of
+        starting their own, and start over if the caller running that load is cancelled.
+        With ``allow_stale``, a miss for which the same location has a
+        value from up to ``stale_hours`` earlier returns that value immediately and reloads
+        in the background.
+        """
+        now = now or datetime.now(timezone.utc)
+        value = self._lookup(key, now)
+        if value is not None:
+            self.hits += 1
+            return value, None
+
+        stale = self._lookup_stale(key) if allow_stale else None
+        pending = self._inflight.get(key)
+        if stale is not None:
+            # Answer from the previous value; refresh it unless that is already under way
+            self.stale_served += 1
+            if pending is None:
+                self._revalidate(key, loader, now)
+            return stale, None
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except _LoadAbandoned:
+                # Its caller went away (e.g. the client disconnected); start over, possibly as the loader
+                return await self.get_or_load(key, loader, now, allow_stale)
+
+        self.misses += 1
+        return await self._load(key, loader, now)
+
+    async def _load(self, key, loader, now: datetime):
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            # Only this caller was cancelled; the ones waiting on it retry rather than fail
+            future.set_exception(_LoadAbandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved; waiters (if any) still receive it
+            raise
+        else:
+            if result[0] is not None:
+                self._store(key, result[0], now)
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def stop(self):
+        """Cancel background refreshes that are still running."""
+        tasks = list(self._revalidations)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def clear(self):
+        self._entries.clear()
+        self._last_good.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced + self.stale_served
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "grid_degrees": self.grid_degrees,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "stale_served": self.stale_served,
+            "revalidation_failures": self.revalidation_failures,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
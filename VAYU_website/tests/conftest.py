@@ -0,0 +1,7 @@
+# The backend modules live flat in VAYU_website and are imported by name, as app.py does
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py opens the on-disk time-series store when imported; tests that need one open their own
+os.environ.setdefault("TIMESERIES_STORE_DIR", "")
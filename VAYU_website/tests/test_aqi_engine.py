@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aqi_engine import VectorizedAQI
+from app import aqi_breakpoints, calculate_overall_aqi, calculate_sub_aqi
+
+
+def _edge_values(breakpoints):
+    # Every segment bound, just inside and outside it, the gaps between segments, and far outside the table
+    values = [-5.0, 0.0, np.nan, 1e6]
+    for _, _, c_low, c_high in breakpoints:
+        values += [c_low, c_high, c_low - 0.05, c_high + 0.05, (c_low + c_high) / 2]
+    return np.array(values)
+
+
+@pytest.mark.parametrize("pollutant", sorted(aqi_breakpoints))
+def test_sub_aqi_matches_the_scalar_function(pollutant):
+    breakpoints = aqi_breakpoints[pollutant]
+    rng = np.random.default_rng(0)
+    upper = breakpoints[-1][3]
+    values = np.concatenate([_edge_values(breakpoints), rng.uniform(-0.1 * upper, 1.2 * upper, 2000)])
+
+    vectorized = VectorizedAQI(aqi_breakpoints).sub_aqi(pollutant, values)
+    expected = np.array([np.nan if np.isnan(v) else calculate_sub_aqi(v, breakpoints) for v in values], dtype=np.float64)
+    np.testing.assert_array_equal(vectorized, expected)
+
+
+def test_overall_aqi_matches_the_scalar_function_row_by_row():
+    rng = np.random.default_rng(1)
+    n = 3000
+    frame = pd.DataFrame({
+        "pm25": rng.uniform(-10, 350, n),
+        "pm10": rng.uniform(-10, 400, n),
+        "co": rng.uniform(-1, 20, n),
+    })
+    # Missing readings, including rows where every pollutant is missing
+    frame.loc[rng.random(n) < 0.1, "pm25"] = np.nan
+    frame.loc[rng.random(n) < 0.1, "pm10"] = np.nan
+    frame.loc[rng.random(n) < 0.1, "co"] = np.nan
+    frame.loc[:9, ["pm25", "pm10", "co"]] = np.nan
+
+    vectorized = VectorizedAQI(aqi_breakpoints).overall_aqi(frame)
+    expected = frame.apply(lambda row: calculate_overall_aqi(row, aqi_breakpoints), axis=1).to_numpy(dtype=np.float64)
+    np.testing.assert_array_equal(vectorized, expected)
+
+
+def test_api_column_names_are_accepted():
+    calculator = VectorizedAQI(aqi_breakpoints)
+    row = {"pm2_5": 75.0, "pm10": 30.0, "carbon_monoxide": 0.5}
+    columns = {name: np.array([value]) for name, value in row.items()}
+    assert calculator.overall_aqi(columns)[0] == calculate_overall_aqi(row, aqi_breakpoints)
+
+
+def test_no_pollutant_columns_gives_nan_rows():
+    result = VectorizedAQI(aqi_breakpoints).overall_aqi({"temp": np.array([20.0, 21.0])})
+    assert result.shape == (2,) and np.isnan(result).all()
+
+
+def test_unsorted_or_overlapping_breakpoints_are_rejected():
+    with pytest.raises(ValueError):
+        VectorizedAQI({"pm25": [(51, 100, 51, 100), (0, 50, 0, 50)]})
+    with pytest.raises(ValueError):
+        VectorizedAQI({"pm25": [(0, 50, 0, 60), (51, 100, 51, 100)]})
@@ -0,0 +1,123 @@
+import asyncio
+import io
+import math
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from preprocessing import HourlyGrid
+
+START_HOUR = 480000
+HOURS = 20
+SEQUENCE_LENGTH = 4
+HORIZON = 3
+MISSING_ROW = 12
+
+
+def _grid():
+    # AQI 0, 10, 20, ... so every target is known from its row; other columns are unused
+    values = np.zeros((HOURS, 5))
+    values[:, 0] = 10.0 * np.arange(HOURS)
+    return HourlyGrid(START_HOUR, values)
+
+
+def _observed():
+    observed = np.ones(HOURS, dtype=bool)
+    observed[MISSING_ROW] = False
+    return observed
+
+
+def _error(first_aqi):
+    # Windows starting on an even row are 1 too high, the others 3 too low
+    return np.where(first_aqi % 20 == 0, 1.0, -3.0)
+
+
+class StubApp:
+    """Forecasts the true AQI (the last value + 10 per hour) plus _error, and records each chunk."""
+
+    def __init__(self):
+        self.model = types.SimpleNamespace(input_shape=(None, SEQUENCE_LENGTH, 5))
+        self.inference_batcher = types.SimpleNamespace(start=lambda: None, stop=self._stop)
+        self.chunks = []
+
+    async def _stop(self):
+        pass
+
+    async def _forecast_aqi(self, sequences, n_ahead):
+        self.chunks.append(sequences.copy())
+        steps = 10.0 * np.arange(1, n_ahead + 1)
+        return sequences[:, -1, :1] + steps + _error(sequences[:, 0, 0])[:, None]
+
+
+def test_only_fully_observed_windows_are_scored():
+    starts = backtest._window_starts(_observed(), SEQUENCE_LENGTH, START_HOUR)
+    assert starts.tolist() == [0, 1, 2, 3, 4, 5, 6, 7, 8, 13, 14, 15, 16]
+    # Issue times are the hour of each window's last row
+    issued = lambda first, last, stride=1: backtest._window_starts(_observed(), SEQUENCE_LENGTH, START_HOUR,
+                                                                   START_HOUR + first, START_HOUR + last, stride).tolist()
+    assert issued(5, 16) == [2, 3, 4, 5, 6, 7, 8, 13]
+    assert issued(0, 19, stride=4) == [0, 4, 8, 16]
+
+
+def test_errors_per_horizon_against_the_actual_values():
+    starts = backtest._window_starts(_observed(), SEQUENCE_LENGTH, START_HOUR)
+    stub = StubApp()
+    predictions = io.StringIO()
+    errors = asyncio.run(backtest.score(stub, _grid(), starts, HORIZON, chunk_size=5, observed=_observed(),
+                                        predictions_file=predictions, progress=False))
+
+    # Windows are the grid rows from each start, in chunks of at most 5
+    assert [len(c) for c in stub.chunks] == [5, 5, 3]
+    np.testing.assert_array_equal(np.concatenate(stub.chunks)[:, :, 0], 10.0 * (starts[:, None] + np.arange(SEQUENCE_LENGTH)))
+
+    # The same numbers worked out row by row: targets past the end or on the missing row don't count
+    expected = []
+    for h in range(1, HORIZON + 1):
+        errs = [1.0 if s % 2 == 0 else -3.0 for s in starts if s + SEQUENCE_LENGTH - 1 + h < HOURS
+                and s + SEQUENCE_LENGTH - 1 + h != MISSING_ROW]
+        expected.append({"horizon": h, "n": len(errs), "mae": float(np.mean(np.abs(errs))),
+                         "rmse": math.sqrt(np.mean(np.square(errs)))})
+    report = errors.report()
+    assert [r["n"] for r in report] == [11, 10, 9]
+    # One hour ahead: windows 0-7 and 13-15, five of them 1 too high and six 3 too low
+    assert report[0] == pytest.approx({"horizon": 1, "n": 11, "mae": 23 / 11, "rmse": math.sqrt(59 / 11)})
+    for row, want in zip(report, expected):
+        assert row == pytest.approx(want)
+
+    frame = pd.read_csv(io.StringIO(predictions.getvalue()), parse_dates=["issued_at", "target_at"])
+    assert len(frame) == starts.size * HORIZON
+    first = frame.iloc[:HORIZON]
+    assert (first["issued_at"] == pd.Timestamp((START_HOUR + 3) * 3600, unit="s", tz="UTC")).all()
+    assert (first["target_at"] - first["issued_at"] == pd.to_timedelta([1, 2, 3], unit="h")).all()
+    np.testing.assert_array_equal(first["actual_aqi"], [40.0, 50.0, 60.0])
+    np.testing.assert_array_equal(first["predicted_aqi"], [41.0, 51.0, 61.0])
+
+
+def test_horizon_errors_with_known_values():
+    errors = backtest.HorizonErrors(2)
+    errors.add(np.array([[1.0, 5.0], [4.0, 2.0]]), np.array([[0.0, 1.0], [0.0, np.nan]]))
+    assert errors.report() == [
+        {"horizon": 1, "n": 2, "mae": 2.5, "rmse": pytest.approx(math.sqrt(8.5))},
+        {"horizon": 2, "n": 1, "mae": 4.0, "rmse": 4.0},
+    ]
+    assert backtest.HorizonErrors(1).report() == [{"horizon": 1, "n": 0, "mae": None, "rmse": None}]
+
+
+def test_history_is_averaged_per_hour_and_gaps_are_not_observed(tmp_path):
+    path = tmp_path / "history.csv"
+    times = pd.to_datetime([START_HOUR * 3600, START_HOUR * 3600 + 1800, (START_HOUR + 2) * 3600], unit="s", utc=True)
+    pd.DataFrame({"timestamp": times, "pm25": [10.0, 20.0, 30.0], "pm10": [1.0, 3.0, 5.0],
+                  "co": [100.0, 100.0, None], "temp": [20.0, 22.0, 24.0]}).to_csv(path, index=False)
+
+    hours, columns = backtest.read_hourly_history(str(path))
+    assert hours.tolist() == [START_HOUR, START_HOUR + 2]
+    assert columns["pm2_5"].tolist() == [15.0, 30.0]
+    assert columns["temperature_2m"].tolist() == [21.0, 24.0]
+    assert np.isnan(columns["carbon_monoxide"][1])
+
+    grid = HourlyGrid(START_HOUR, np.zeros((3, 5)))
+    # The hour in between was filled in, and the last one lacks CO
+    assert backtest._observed_rows(grid, hours, columns).tolist() == [True, False, False]
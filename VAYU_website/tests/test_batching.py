@@ -0,0 +1,109 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher, _padded_size
+
+
+def _rows(tag: int, n: int) -> np.ndarray:
+    # (n, 24, 5) windows whose first value identifies the caller and row
+    X = np.zeros((n, 24, 5))
+    X[:, 0, 0] = tag * 100 + np.arange(n)
+    return X
+
+
+class RecordingModel:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    def __call__(self, X):
+        self.batches.append(X.shape[0])
+        if self.error is not None:
+            raise self.error
+        return X[:, 0, :1] * 2.0
+
+
+def _run(batcher, coroutine_fn):
+    async def scenario():
+        batcher.start()
+        try:
+            return await coroutine_fn()
+        finally:
+            await batcher.stop()
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=32, window_ms=50)
+    sizes = [1, 3, 2, 1, 4]
+
+    results = _run(batcher, lambda: asyncio.gather(*[batcher.submit(_rows(tag, n)) for tag, n in enumerate(sizes)]))
+
+    for tag, (n, output) in enumerate(zip(sizes, results)):
+        np.testing.assert_array_equal(output[:, 0], (tag * 100 + np.arange(n)) * 2.0)
+    assert model.batches == [16]  # 11 rows, padded to the next power of two
+    assert batcher.stats()["batches"] == 1
+
+
+def test_requests_that_do_not_fit_go_into_the_next_batch():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=4, window_ms=50, pad_batches=False)
+
+    results = _run(batcher, lambda: asyncio.gather(*[batcher.submit(_rows(tag, 3)) for tag in range(3)]))
+
+    for tag, output in enumerate(results):
+        np.testing.assert_array_equal(output[:, 0], (tag * 100 + np.arange(3)) * 2.0)
+    assert model.batches == [3, 3, 3]
+
+
+def test_a_failed_forward_pass_fails_every_caller_in_the_batch():
+    model = RecordingModel(error=ValueError("bad batch"))
+    batcher = MicroBatcher(model, max_batch_size=8, window_ms=50)
+
+    results = _run(batcher, lambda: asyncio.gather(*[batcher.submit(_rows(tag, 2)) for tag in range(3)],
+                                                   return_exceptions=True))
+
+    assert all(isinstance(r, ValueError) and str(r) == "bad batch" for r in results)
+    assert batcher.stats()["failed_batches"] == 1
+
+
+def test_submit_requires_a_running_batcher():
+    batcher = MicroBatcher(RecordingModel())
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.submit(_rows(0, 1)))
+
+
+def test_stop_fails_requests_still_queued():
+    release = asyncio.Event()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+
+        def slow_model(X):
+            loop.call_soon_threadsafe(started.set)
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            return X[:, 0, :1]
+
+        batcher = MicroBatcher(slow_model, max_batch_size=2, window_ms=0, pad_batches=False)
+        batcher.start()
+        first = asyncio.create_task(batcher.submit(_rows(0, 2)))
+        await started.wait()
+        queued = asyncio.create_task(batcher.submit(_rows(1, 2)))
+        await asyncio.sleep(0.01)
+        stopping = asyncio.create_task(batcher.stop())
+        await asyncio.sleep(0.01)
+        release.set()
+        await stopping
+        return await asyncio.gather(first, queued, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.parametrize("n, expected", [(1, 1), (3, 4), (5, 8), (17, 32), (32, 32), (40, 40)])
+def test_padded_sizes(n, expected):
+    assert _padded_size(n, 32) == expected
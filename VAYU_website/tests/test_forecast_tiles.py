@@ -0,0 +1,138 @@
+import asyncio
+import time
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+import forecast_tiles
+from app import PredictionRequest
+from forecast_tiles import ActiveCellIndex, ForecastTiles, TileScheduler
+from series_cache import HourlySeriesCache
+
+HOUR = datetime(2024, 10, 4, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stands in for time.monotonic in forecast_tiles; advance it with ``clock.now += seconds``."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(forecast_tiles, "time", types.SimpleNamespace(monotonic=lambda: clock.now, perf_counter=time.perf_counter))
+    return clock
+
+
+def _predictions(n, tag=0.0):
+    return [{"timestamp": f"h{k}", "aqi": tag + k} for k in range(n)]
+
+
+@pytest.mark.parametrize("latitude, longitude", [
+    (28.6139, 77.2090), (28.65, 77.25), (28.64999, 77.15001), (-33.8688, 151.2093), (0.04, -0.06),
+])
+def test_cells_agree_with_the_series_cache_grid(latitude, longitude):
+    index = ActiveCellIndex(0.1)
+    assert index.centre(index.cell(latitude, longitude)) == HourlySeriesCache(grid_degrees=0.1).snap(latitude, longitude)
+
+
+def test_nearby_coordinates_share_a_cell():
+    index = ActiveCellIndex(0.1)
+    assert index.touch(28.61, 77.21) == index.touch(28.63, 77.19) == (286, 772)
+    assert len(index) == 1
+
+
+def test_cells_not_requested_recently_are_dropped(clock):
+    index = ActiveCellIndex(0.1, active_hours=1)
+    index.touch(28.6, 77.2)
+    clock.now += 1800
+    index.touch(19.1, 72.9)
+    clock.now += 1801
+    # The first cell was last requested more than an hour ago
+    assert index.cells_to_refresh() == [(191, 729)]
+    assert len(index) == 1
+    clock.now += 3600
+    assert index.cells_to_refresh() == []
+
+
+def test_least_recently_requested_cell_is_evicted_when_full(clock):
+    index = ActiveCellIndex(0.1, max_cells=2)
+    for lat in (10.0, 20.0, 30.0):
+        index.touch(lat, 0.0)
+        clock.now += 1
+    assert index.cells_to_refresh() == [(300, 0), (200, 0)]
+    # A request for a known cell refreshes it rather than evicting anything
+    index.touch(20.0, 0.0)
+    clock.now += 1
+    index.touch(40.0, 0.0)
+    assert index.cells_to_refresh() == [(400, 0), (200, 0)]
+
+
+def test_region_cells_come_first_and_count_towards_the_cap(clock):
+    index = ActiveCellIndex(0.1, max_cells=5, region=forecast_tiles.parse_region("28.7,77.1,28.5,77.2"))
+    region = [(i, j) for i in (285, 286, 287) for j in (771, 772)]
+    assert index.region_cells() == region
+    index.touch(10.0, 10.0)
+    assert index.cells_to_refresh() == region[:5]
+
+
+def test_tiles_are_served_for_their_hour_only():
+    tiles = ForecastTiles()
+    tiles.put((286, 772), HOUR, _predictions(24))
+
+    assert tiles.lookup((286, 772), 6, now=HOUR + timedelta(minutes=59)) == _predictions(6)
+    # Longer than the tile, another cell, and the next hour all fall through
+    assert tiles.lookup((286, 772), 25, now=HOUR) is None
+    assert tiles.lookup((286, 773), 1, now=HOUR) is None
+    assert tiles.lookup((286, 772), 1, now=HOUR + timedelta(hours=1)) is None
+    assert (tiles.hits, tiles.misses) == (1, 3)
+
+    tiles.prune(HOUR + timedelta(hours=1))
+    assert len(tiles) == 0
+
+
+@pytest.mark.parametrize("now, expected_s", [
+    (HOUR, 90.0),
+    (HOUR + timedelta(seconds=60), 30.0),
+    (HOUR + timedelta(seconds=90), 3600.0),
+    (HOUR + timedelta(minutes=59), 150.0),
+])
+def test_refresh_is_due_shortly_after_each_hour(now, expected_s):
+    scheduler = TileScheduler(ActiveCellIndex(0.1), ForecastTiles(), None, delay_s=90)
+    assert scheduler.seconds_until_next_refresh(now) == expected_s
+
+
+def test_refresh_computes_every_cell_in_chunks(clock):
+    index = ActiveCellIndex(0.1)
+    for lat in range(5):
+        index.touch(float(lat), 0.0)
+        clock.now += 1
+    chunks = []
+
+    async def compute(cells):
+        chunks.append(cells)
+        if len(chunks) == 2:
+            raise RuntimeError("upstream down")
+        return len(cells)
+
+    scheduler = TileScheduler(index, ForecastTiles(), compute, chunk_size=2, spread_s=0)
+    asyncio.run(scheduler.refresh())
+
+    assert chunks == [[(40, 0), (30, 0)], [(20, 0), (10, 0)], [(0, 0)]]
+    stats = scheduler.stats()
+    assert stats["failed_chunks"] == 1 and stats["refreshes"] == 1
+    assert stats["last_refresh"]["cells"] == 5 and stats["last_refresh"]["tiles_computed"] == 3
+
+
+def test_requests_use_the_tile_of_their_cell(monkeypatch, clock):
+    index, tiles = ActiveCellIndex(0.1), ForecastTiles()
+    monkeypatch.setattr(app, "active_cells", index)
+    monkeypatch.setattr(app, "forecast_tiles_cache", tiles)
+    tiles.put((286, 772), forecast_tiles.current_hour(), _predictions(24))
+
+    assert app._precomputed_predictions(PredictionRequest(latitude=28.62, longitude=77.18, n_ahead=3)) == _predictions(3)
+    clock.now += 1
+    # A cold cell is recorded as active for the next refresh and computed live meanwhile
+    assert app._precomputed_predictions(PredictionRequest(latitude=19.07, longitude=72.88)) is None
+    assert index.cells_to_refresh() == [(191, 729), (286, 772)]
+    # The caller's current readings change the model input, so they are never served a tile
+    request = PredictionRequest(latitude=28.62, longitude=77.18, pm25=40.0, pm10=80.0, co=600.0, temp=30.0)
+    assert app._precomputed_predictions(request) is None
@@ -0,0 +1,97 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from forecasting import AQI_FEATURE, recursive_forecast
+
+SEQUENCE_LENGTH = 6
+
+
+def _history(batch_size=2):
+    # AQI 10, 20, ... per location in column 0; the other features identify their column
+    history = np.zeros((batch_size, SEQUENCE_LENGTH, 5))
+    history[:, :, AQI_FEATURE] = 10.0 * (np.arange(batch_size)[:, None] + 1) + np.arange(SEQUENCE_LENGTH)
+    history[:, :, 1:] = np.arange(1, 5) * 1000.0
+    return history
+
+
+class StubModel:
+    """Predicts the window's last AQI + 1, + 2, ... for its ``steps_per_call`` hours and records each window."""
+
+    def __init__(self, steps_per_call=1):
+        self.steps_per_call = steps_per_call
+        self.windows = []
+
+    async def __call__(self, window):
+        self.windows.append(window.copy())
+        return window[:, -1, AQI_FEATURE:AQI_FEATURE + 1] + np.arange(1, self.steps_per_call + 1)
+
+
+def _forecast(model, history, n_ahead, **kwargs):
+    return asyncio.run(recursive_forecast(model, history, n_ahead, steps_per_call=model.steps_per_call, **kwargs))
+
+
+def test_predictions_are_fed_back_into_the_window():
+    model = StubModel()
+    history = _history()
+    forecast = _forecast(model, history, n_ahead=3)
+
+    last = history[:, -1, AQI_FEATURE]
+    np.testing.assert_array_equal(forecast, last[:, None] + [1, 2, 3])
+    # One batched call per hour, each window one hour later and ending at the previous prediction
+    assert [w.shape for w in model.windows] == [(2, SEQUENCE_LENGTH, 5)] * 3
+    np.testing.assert_array_equal(model.windows[0], history)
+    for t in (1, 2):
+        np.testing.assert_array_equal(model.windows[t][:, :-t], history[:, t:])
+        np.testing.assert_array_equal(model.windows[t][:, -t:, AQI_FEATURE], forecast[:, :t])
+
+
+def test_several_steps_per_call():
+    model = StubModel(steps_per_call=2)
+    forecast = _forecast(model, _history(), n_ahead=4)
+
+    last = _history()[:, -1, AQI_FEATURE]
+    np.testing.assert_array_equal(forecast, last[:, None] + [1, 2, 3, 4])
+    assert len(model.windows) == 2
+    # The second call sees both hours the first one predicted
+    np.testing.assert_array_equal(model.windows[1][:, -2:, AQI_FEATURE], forecast[:, :2])
+
+
+def test_partial_last_call_is_trimmed():
+    model = StubModel(steps_per_call=3)
+    forecast = _forecast(model, _history(), n_ahead=4)
+
+    last = _history()[:, -1, AQI_FEATURE]
+    assert forecast.shape == (2, 4)
+    np.testing.assert_array_equal(forecast, last[:, None] + [1, 2, 3, 4])
+    assert len(model.windows) == 2
+
+
+def test_other_features_are_carried_forward_without_exogenous():
+    model = StubModel()
+    _forecast(model, _history(), n_ahead=3)
+    np.testing.assert_array_equal(model.windows[-1][:, :, 1:], _history()[:, :, 1:])
+
+
+def test_exogenous_features_fill_the_future_rows():
+    model = StubModel(steps_per_call=2)
+    history = _history()
+    # Future non-AQI rows for hours 1-3, different per location and hour
+    exogenous = -(np.arange(2)[:, None, None] * 100 + np.arange(3)[None, :, None] * 10 + np.arange(1, 5))
+    forecast = _forecast(model, history, n_ahead=3, exogenous=exogenous)
+
+    assert forecast.shape == (2, 3)
+    # The second call's window ends with the first two future hours and their exogenous values
+    np.testing.assert_array_equal(model.windows[1][:, -2:, 1:], exogenous[:, :2])
+    np.testing.assert_array_equal(model.windows[1][:, :-2, 1:], history[:, 2:, 1:])
+
+
+@pytest.mark.parametrize("history, n_ahead, exogenous, message", [
+    (np.zeros((SEQUENCE_LENGTH, 5)), 1, None, "shape"),
+    (np.zeros((1, SEQUENCE_LENGTH, 5)), 0, None, "n_ahead"),
+    (np.zeros((1, SEQUENCE_LENGTH, 5)), 3, np.zeros((1, 2, 4)), "exogenous"),
+], ids=["not_batched", "no_horizon", "short_exogenous"])
+def test_invalid_arguments_are_refused(history, n_ahead, exogenous, message):
+    with pytest.raises(ValueError, match=message):
+        _forecast(StubModel(), history, n_ahead, exogenous=exogenous)
@@ -0,0 +1,151 @@
+import os
+import socket
+import threading
+import types
+
+import numpy as np
+import pytest
+
+import inference_pool
+from inference_pool import InferencePoolClient, InferencePoolError
+
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    yield left, right
+    left.close()
+    right.close()
+
+
+@pytest.mark.parametrize("array", [
+    np.arange(24, dtype=np.float64).reshape(2, 3, 4),
+    np.arange(6, dtype=np.float32).reshape(6, 1),
+    np.frombuffer(b"hello", dtype=np.uint8),
+    np.empty((0, 24, 5)),
+], ids=["f8", "f4", "u1", "empty"])
+def test_frames_round_trip(pair, array):
+    inference_pool._send(pair[0], inference_pool.OP_PREDICT, array)
+    code, received = inference_pool._recv(pair[1])
+    assert code == inference_pool.OP_PREDICT
+    assert received.dtype == array.dtype and received.shape == array.shape
+    np.testing.assert_array_equal(received, array)
+
+
+def test_frames_larger_than_the_socket_buffer(pair):
+    array = np.random.default_rng(0).random((64, 48, 5, 20))
+    sender = threading.Thread(target=inference_pool._send, args=(pair[0], inference_pool.STATUS_OK, array[:, ::2]))
+    sender.start()
+    _, received = inference_pool._recv(pair[1])
+    sender.join()
+    np.testing.assert_array_equal(received, array[:, ::2])
+
+
+def test_unsupported_dtype_and_truncated_frame_fail(pair):
+    with pytest.raises(ValueError):
+        inference_pool._send(pair[0], inference_pool.OP_PREDICT, np.zeros(1, dtype="<U10"))
+    pair[0].sendall(inference_pool._HEADER.pack(inference_pool.OP_PREDICT, 1, b"<f8") + inference_pool._DIM.pack(4) + b"\0" * 8)
+    pair[0].shutdown(socket.SHUT_WR)
+    with pytest.raises(EOFError):
+        inference_pool._recv(pair[1])
+
+
+def _fake_app(predict):
+    model = types.SimpleNamespace(input_shape=(None, 24, 5), output_shape=(None, 1))
+    registry = types.SimpleNamespace(active=types.SimpleNamespace(precision="float64"))
+    return types.SimpleNamespace(model=model, compiled_forecaster=None, model_registry=registry, _batch_predict=predict)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """A dispatcher on a real socket with ``start(predict, workers)`` serving from threads instead of forks."""
+    socket_path = str(tmp_path / "pool.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(16)
+    dispatcher = inference_pool._Dispatcher(listener)
+    stop = threading.Event()
+    threads = []
+
+    def supervise():
+        while not stop.is_set():
+            dispatcher.poll(0.05)
+
+    def start(predict, workers):
+        for _ in range(workers):
+            control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            dispatcher.add_worker(control)
+            threads.append(threading.Thread(target=inference_pool._serve, args=(worker_control, _fake_app(predict), workers),
+                                            daemon=True))
+        threads.append(threading.Thread(target=supervise, daemon=True))
+        for thread in threads:
+            thread.start()
+        return InferencePoolClient(socket_path, max_connections=workers, timeout_s=5)
+
+    yield start
+    stop.set()
+    threads[-1].join()
+    dispatcher.close()
+    for thread in threads:
+        thread.join(timeout=5)
+
+
+def test_requests_round_trip_through_a_worker(pool):
+    client = pool(lambda X: X.sum(axis=(1, 2))[:, None], workers=1)
+    info = client.wait_for_info(timeout_s=5)
+    assert info["input_shape"] == [None, 24, 5] and info["workers"] == 1 and not info["shared_weights"]
+
+    X = np.ones((3, 24, 5))
+    for _ in range(3):
+        np.testing.assert_array_equal(client.predict(X), np.full((3, 1), 120.0))
+    assert client.stats()["connections"] == 1
+    client.close()
+
+
+def test_worker_errors_come_back_as_pool_errors(pool):
+    def predict(X):
+        raise RuntimeError("bad batch")
+
+    client = pool(predict, workers=1)
+    with pytest.raises(InferencePoolError, match="RuntimeError: bad batch"):
+        client.predict(np.zeros((1, 24, 5)))
+    # The connection is still usable afterwards
+    assert client.wait_for_info(timeout_s=5)["workers"] == 1
+    client.close()
+
+
+def test_workers_serve_requests_in_parallel(pool):
+    # Both forward passes must be in progress at once for the barrier to let them through
+    barrier = threading.Barrier(2, timeout=5)
+
+    def predict(X):
+        barrier.wait()
+        return X[:, -1, :1]
+
+    client = pool(predict, workers=2)
+    first, second = InferencePoolClient(client.socket_path, timeout_s=5), InferencePoolClient(client.socket_path, timeout_s=5)
+    results = {}
+    threads = [threading.Thread(target=lambda c=c, k=k: results.__setitem__(k, c.predict(np.full((1, 24, 5), k))))
+               for k, c in ((1.0, first), (2.0, second))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {1.0: [[1.0]], 2.0: [[2.0]]}
+    first.close()
+    second.close()
+
+
+def test_weights_file_maps_read_only_and_aligned(tmp_path):
+    path = str(tmp_path / "weights")
+    trainable = [np.arange(7, dtype=np.float32), np.ones((3, 5))]
+    non_trainable = [np.array([2], dtype=np.int64), np.zeros((0, 4), dtype=np.float32)]
+    inference_pool._save_weights(path, trainable, non_trainable)
+
+    mapped_trainable, mapped_non_trainable = inference_pool._map_weights(path)
+    for expected, mapped in zip(trainable + non_trainable, mapped_trainable + mapped_non_trainable):
+        assert mapped.dtype == expected.dtype
+        np.testing.assert_array_equal(mapped, expected)
+        assert not mapped.flags.writeable
+        assert mapped.ctypes.data % inference_pool._WEIGHTS_ALIGN == 0
+    assert not os.path.exists(path + ".tmp")
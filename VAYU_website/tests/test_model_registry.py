@@ -0,0 +1,116 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app
+import model_registry
+from model_registry import ModelBundle, ModelRegistry
+
+
+class FakeModel:
+    input_shape = (None, 24, 5)
+
+
+class FakeBatcher:
+    max_batch_size = 4
+
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+
+def _load(source):
+    bundle = ModelBundle(source, FakeModel(), None, None)
+    bundle.batcher = FakeBatcher()
+    return bundle
+
+
+async def _forecast(sequences, n_ahead, bundle):
+    return np.full((sequences.shape[0], n_ahead), 100.0 if bundle.version == "v1" else 103.0)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "MODEL_SWAP_DRAIN_S", 0.0)
+    for version in ("v1", "v2", "v3"):
+        (tmp_path / version).mkdir()
+        (tmp_path / version / "metadata.json").write_text("{}")
+    return ModelRegistry(_load, _forecast, root=str(tmp_path))
+
+
+async def _observe_once(registry):
+    sequences = np.zeros((1, 24, 5))
+    registry.observe(sequences, 1, await _forecast(sequences, 1, registry.active))
+    await asyncio.gather(*registry._shadow_tasks)
+
+
+def test_shadow_forecasts_are_compared_with_the_served_ones(registry):
+    async def run():
+        await registry.activate("v1")
+        await registry.set_shadow("v2", sample_rate=1.0)
+        await _observe_once(registry)
+        return registry.stats()["shadow"]
+
+    shadow = asyncio.run(run())
+    assert shadow["version"] == "v2"
+    assert shadow["predictions_compared"] == 1
+    assert shadow["mean_abs_delta"] == 3.0
+
+
+@pytest.mark.parametrize("end_shadow", [
+    lambda registry: registry.clear_shadow(),
+    lambda registry: registry.set_shadow("v3"),
+    lambda registry: registry.activate("v2"),
+], ids=["cleared", "replaced", "promoted"])
+def test_shadow_stats_go_with_the_shadow(registry, end_shadow):
+    async def run():
+        await registry.activate("v1")
+        await registry.set_shadow("v2", sample_rate=1.0)
+        await _observe_once(registry)
+        await end_shadow(registry)
+        await asyncio.gather(*registry._background)
+        return registry
+
+    registry = asyncio.run(run())
+    assert "v2" not in registry._shadow_stats
+    assert set(registry._shadow_stats) == ({registry.shadow.version} if registry.shadow is not None else set())
+
+
+def test_shadow_forecast_in_flight_survives_clearing_the_shadow(registry):
+    async def run():
+        await registry.activate("v1")
+        await registry.set_shadow("v2", sample_rate=1.0)
+        sequences = np.zeros((1, 24, 5))
+        registry.observe(sequences, 1, np.full((1, 1), 100.0))
+        await registry.clear_shadow()
+        results = await asyncio.gather(*registry._shadow_tasks, return_exceptions=True)
+        return results
+
+    assert asyncio.run(run()) == [None]
+    assert registry._shadow_stats == {}
+
+
+@pytest.mark.parametrize("token, open_access, sent, allowed", [
+    ("", False, "", False),
+    ("", True, "", True),
+    ("secret", False, "", False),
+    ("secret", False, "wrong", False),
+    ("secret", False, "secret", True),
+    ("secret", True, "", False),
+])
+def test_model_admin_requires_a_token_unless_opened(monkeypatch, token, open_access, sent, allowed):
+    monkeypatch.setattr(app, "MODEL_ADMIN_TOKEN", token)
+    monkeypatch.setattr(app, "MODEL_ADMIN_OPEN", open_access)
+    if allowed:
+        app._check_admin(sent)
+    else:
+        with pytest.raises(HTTPException) as error:
+            app._check_admin(sent)
+        assert error.value.status_code == 403
@@ -0,0 +1,192 @@
+import asyncio
+
+import httpx
+import pytest
+
+import circuit_breaker
+import open_meteo
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+URL = "http://open-meteo.test/v1/forecast"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout_s=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    clock.now += 10
+    assert breaker.retry_after_s() == pytest.approx(20)
+
+
+def test_breaker_lets_one_probe_through_when_half_open(clock):
+    breaker = CircuitBreaker("host", failure_threshold=2, reset_timeout_s=30)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("host", failure_threshold=2, reset_timeout_s=30)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opens == 2
+    assert breaker.retry_after_s() == pytest.approx(30)
+    assert not breaker.allow()
+
+
+def test_probe_that_never_reports_back_is_replaced(clock):
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout_s=30)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_breaker_rejects_a_zero_threshold():
+    with pytest.raises(ValueError):
+        CircuitBreaker("host", failure_threshold=0)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Route open_meteo through a mock transport answering with ``upstream.responses`` in turn."""
+
+    class Upstream:
+        def __init__(self):
+            self.responses = []
+            self.calls = 0
+            self.on_call = None
+
+        def handle(self, request):
+            self.calls += 1
+            if self.on_call is not None:
+                self.on_call()
+            response = self.responses[min(self.calls, len(self.responses)) - 1]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+    upstream = Upstream()
+    monkeypatch.setattr(open_meteo, "_breakers", {})
+    monkeypatch.setattr(open_meteo, "RETRY_BASE_DELAY_S", 0.0)
+    monkeypatch.setattr(open_meteo, "RETRY_MAX_DELAY_S", 0.0)
+    monkeypatch.setattr(open_meteo, "MAX_RETRIES", 2)
+    monkeypatch.setattr(open_meteo, "BREAKER_FAILURE_THRESHOLD", 5)
+    monkeypatch.setattr(open_meteo, "get_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle)))
+    return upstream
+
+
+def _get_json():
+    return asyncio.run(open_meteo._get_json(URL, {}, "forecast"))
+
+
+def test_retries_server_errors_until_one_succeeds(upstream):
+    upstream.responses = [httpx.Response(503), httpx.Response(429), httpx.Response(200, json={"ok": True})]
+    assert _get_json() == {"ok": True}
+    assert upstream.calls == 3
+    assert open_meteo.breaker_for(URL).state == CLOSED
+
+
+def test_gives_up_after_max_retries(upstream):
+    upstream.responses = [httpx.ConnectError("refused")]
+    with pytest.raises(httpx.ConnectError):
+        _get_json()
+    assert upstream.calls == 1 + open_meteo.MAX_RETRIES
+    assert open_meteo.breaker_for(URL).consecutive_failures == 3
+
+
+@pytest.mark.parametrize("response", [httpx.Response(404), httpx.Response(200, content=b"not json")])
+def test_client_errors_and_bad_bodies_are_not_retried(upstream, response):
+    upstream.responses = [response]
+    with pytest.raises(Exception):
+        _get_json()
+    assert upstream.calls == 1
+    # The host answered, so it does not count towards opening the breaker
+    assert open_meteo.breaker_for(URL).consecutive_failures == 0
+
+
+def test_no_retry_starts_after_the_budget_is_spent(upstream, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(open_meteo.time, "perf_counter", clock)
+    monkeypatch.setattr(open_meteo, "MAX_RETRIES", 10)
+    monkeypatch.setattr(open_meteo, "RETRY_BUDGET_S", 5.0)
+
+    def slow_attempt():
+        clock.now += 3.0
+
+    upstream.on_call = slow_attempt
+    upstream.responses = [httpx.Response(503)]
+    with pytest.raises(httpx.HTTPStatusError):
+        _get_json()
+    # 3 s spent after the first attempt is within the budget, 6 s after the second is not
+    assert upstream.calls == 2
+
+
+def test_open_breaker_fails_without_calling_upstream(upstream):
+    upstream.responses = [httpx.Response(503)]
+    with pytest.raises(httpx.HTTPStatusError):
+        _get_json()
+    # The fifth consecutive failure opens the breaker in the middle of this call's retries
+    with pytest.raises(CircuitOpenError):
+        _get_json()
+    assert upstream.calls == 5
+    assert open_meteo.breaker_for(URL).state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        _get_json()
+    assert upstream.calls == 5
+
+
+def test_backoff_honours_retry_after_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(open_meteo, "RETRY_BASE_DELAY_S", 0.0)
+    monkeypatch.setattr(open_meteo, "RETRY_MAX_DELAY_S", 2.0)
+    request = httpx.Request("GET", URL)
+
+    def error(headers):
+        response = httpx.Response(429, headers=headers, request=request)
+        return httpx.HTTPStatusError("busy", request=request, response=response)
+
+    assert open_meteo._backoff_s(0, error({"Retry-After": "1.5"})) == 1.5
+    assert open_meteo._backoff_s(0, error({"Retry-After": "60"})) == 2.0
+    assert open_meteo._backoff_s(0, error({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import app
+from precision import PrecisionRejected, check_precision, load_calibration
+
+SEQUENCE_LENGTH = 24
+
+
+def _windows(n, seed=0):
+    return np.random.default_rng(seed).uniform(1.0, 300.0, (n, SEQUENCE_LENGTH, 5))
+
+
+def _last_aqi(windows):
+    return windows[:, -1, :1]
+
+
+def test_candidate_within_the_allowed_error_is_accepted():
+    windows = _windows(100)
+    offsets = np.linspace(-0.5, 0.5, 100)[:, None]
+    report = check_precision("float32", _last_aqi, lambda w: _last_aqi(w) + offsets, windows, max_error=0.5)
+    assert report["windows"] == 100
+    assert report["max_abs_aqi_error"] == pytest.approx(0.5)
+    assert report["mean_abs_aqi_error"] == pytest.approx(np.mean(np.abs(offsets)))
+    assert report["max_allowed"] == 0.5
+
+
+@pytest.mark.parametrize("candidate", [
+    lambda w: _last_aqi(w) + np.where(np.arange(len(w)) == 3, 2.5, 0.0)[:, None],
+    lambda w: np.where(np.arange(len(w)) == 3, np.nan, 0.0)[:, None] + _last_aqi(w),
+], ids=["too_far", "not_finite"])
+def test_candidate_outside_the_allowed_error_is_rejected(candidate):
+    with pytest.raises(PrecisionRejected) as error:
+        check_precision("float32", _last_aqi, candidate, _windows(10), max_error=2.0)
+    assert error.value.report["precision"] == "float32"
+    assert error.value.report["windows"] == 10
+
+
+def test_calibration_drops_incomplete_windows_and_spreads_the_sample(tmp_path):
+    windows = _windows(10).astype(np.float32)
+    windows[2, 5, 1] = np.nan
+    path = tmp_path / "calibration.npy"
+    np.save(path, windows)
+
+    loaded = load_calibration(str(path), SEQUENCE_LENGTH, 5)
+    assert loaded.dtype == np.float64
+    np.testing.assert_array_equal(loaded, np.delete(windows, 2, axis=0).astype(np.float64))
+
+    sampled = load_calibration(str(path), SEQUENCE_LENGTH, 5, max_windows=3)
+    np.testing.assert_array_equal(sampled, loaded[[0, 4, 8]])
+
+
+@pytest.mark.parametrize("windows, message", [
+    (np.zeros((4, 12, 5)), "shape"),
+    (np.full((4, SEQUENCE_LENGTH, 5), np.nan), "No complete"),
+])
+def test_unusable_calibration_sets_are_refused(tmp_path, windows, message):
+    path = tmp_path / "calibration.npy"
+    np.save(path, windows)
+    with pytest.raises(ValueError, match=message):
+        load_calibration(str(path), SEQUENCE_LENGTH, 5)
+
+
+def test_compiled_forecaster_computes_in_its_precision():
+    keras = pytest.importorskip("keras")
+    from jax_inference import CompiledForecaster
+
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([keras.Input((SEQUENCE_LENGTH, 5)), keras.layers.Flatten(), keras.layers.Dense(1)])
+    input_scaler, target_scaler = app.MinMaxScaler(), app.MinMaxScaler()
+    input_scaler.load_attributes({"min_": [0, 10, 0, 0, 0], "max_": [300, 40, 200, 300, 5],
+                                  "scale_": [300, 30, 200, 300, 5], "minmax_range": [0, 1]})
+    target_scaler.load_attributes({"min_": 0.5, "max_": 1.5, "scale_": 1.0, "minmax_range": [0, 1]})
+    windows = _windows(3)
+
+    # The same computation in numpy float64
+    kernel, bias = (np.asarray(v.value, dtype=np.float64) for v in model.trainable_variables)
+    scaled = (windows - input_scaler.min_) / input_scaler.scale_
+    ratio = (scaled.reshape(3, -1) @ kernel + bias) * target_scaler.scale_ + target_scaler.min_
+    proxy = np.mean(windows[:, -5:, 0], axis=1).astype(np.float32).astype(np.float64)
+    expected = ratio * proxy[:, None]
+
+    float64 = CompiledForecaster(model, input_scaler, target_scaler, batch_sizes=(4,), precision="float64").predict_aqi(windows)
+    float32 = CompiledForecaster(model, input_scaler, target_scaler, batch_sizes=(4,), precision="float32").predict_aqi(windows)
+    assert float64.dtype == np.float64 and float32.dtype == np.float32
+    np.testing.assert_allclose(float64, expected, rtol=1e-12)
+    np.testing.assert_allclose(float32, expected, rtol=1e-4)
+    assert np.abs(float32 - expected).max() > 1e-9
+    # float64 runs on a float64 copy of the model; the model itself is left as it was
+    assert all(v.dtype == "float32" for v in model.weights)
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+from preprocessing import UnsupportedPayload, build_hourly_grid, latest_window
+from timeseries_store import epoch_hour
+
+SEQUENCE_LENGTH = 24
+NOW = datetime(2024, 6, 1, 10, 25, tzinfo=timezone.utc)
+
+
+def _payloads(rng, gap_fraction=0.0, past_hours=SEQUENCE_LENGTH + 24, future_hours=48):
+    # Hourly Open-Meteo style payloads around NOW, with a fraction of the readings blanked out
+    first = NOW.replace(minute=0) - timedelta(hours=past_hours)
+    times = [(first + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(past_hours + future_hours)]
+
+    def series(low, high):
+        return [None if rng.random() < gap_fraction else round(float(v), 2) for v in rng.uniform(low, high, len(times))]
+
+    air_quality = {"hourly": {"time": times, "pm2_5": series(5, 300), "pm10": series(10, 450), "carbon_monoxide": series(0.1, 20)}}
+    weather = {"hourly": {"time": list(times), "temperature_2m": series(-5, 45)}}
+    return air_quality, weather
+
+
+def _pandas(air_quality, weather, now=NOW):
+    df_processed, error = app._build_processed_frame(air_quality, weather)
+    if df_processed is None:
+        return None, error
+    return app._select_latest_sequence(df_processed, SEQUENCE_LENGTH, now)
+
+
+def _numpy(air_quality, weather, now=NOW, out=None):
+    grid, error = build_hourly_grid(air_quality, weather, app.aqi_calculator)
+    if grid is None:
+        return None, error
+    return latest_window(grid, SEQUENCE_LENGTH, epoch_hour(now), out=out)
+
+
+def _assert_same(air_quality, weather, now=NOW):
+    expected, expected_ts = _pandas(air_quality, weather, now)
+    actual, actual_ts = _numpy(air_quality, weather, now)
+    if expected is None:
+        assert actual is None
+    else:
+        np.testing.assert_array_equal(actual, expected)
+    assert actual_ts == expected_ts
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("gap_fraction", [0.0, 0.05, 0.3])
+def test_matches_the_pandas_pipeline(seed, gap_fraction):
+    air_quality, weather = _payloads(np.random.default_rng(seed), gap_fraction)
+    _assert_same(air_quality, weather)
+
+
+def test_leading_and_trailing_gaps_are_filled_like_ffill_bfill():
+    air_quality, weather = _payloads(np.random.default_rng(0))
+    for name in ("pm2_5", "pm10"):
+        air_quality["hourly"][name][:6] = [None] * 6
+    weather["hourly"]["temperature_2m"][-60:] = [None] * 60
+    _assert_same(air_quality, weather)
+
+
+def test_partially_overlapping_sources_are_inner_joined():
+    air_quality, weather = _payloads(np.random.default_rng(0))
+    for key in weather["hourly"]:
+        weather["hourly"][key] = weather["hourly"][key][5:]
+    for key in air_quality["hourly"]:
+        air_quality["hourly"][key] = air_quality["hourly"][key][:-3]
+    _assert_same(air_quality, weather)
+
+
+def test_missing_column_gives_the_same_answer():
+    air_quality, weather = _payloads(np.random.default_rng(0))
+    del air_quality["hourly"]["carbon_monoxide"]
+    _assert_same(air_quality, weather)
+
+
+@pytest.mark.parametrize("now_offset_hours", [0, -20, -200])
+def test_earlier_request_times_give_the_same_answer(now_offset_hours):
+    air_quality, weather = _payloads(np.random.default_rng(0))
+    _assert_same(air_quality, weather, NOW + timedelta(hours=now_offset_hours))
+
+
+@pytest.mark.parametrize("air_quality, weather", [
+    ({}, {"hourly": {"time": []}}),
+    ({"hourly": {"time": ["2024-06-01T00:00"], "pm2_5": [1.0]}}, {"hourly": {}}),
+    ({"hourly": {"time": []}}, {"hourly": {"time": []}}),
+    ({"hourly": {"time": ["2024-06-01T00:00"], "pm2_5": [1.0]}}, {"hourly": {"time": ["2024-06-02T00:00"], "temperature_2m": [1.0]}}),
+])
+def test_invalid_payloads_give_the_same_error(air_quality, weather):
+    assert _numpy(air_quality, weather) == _pandas(air_quality, weather)
+
+
+def test_window_is_written_into_the_given_buffer():
+    air_quality, weather = _payloads(np.random.default_rng(0), 0.1)
+    buffer = np.empty((1, SEQUENCE_LENGTH, 5))
+    window, timestamps = _numpy(air_quality, weather, out=buffer)
+    assert window is buffer
+    assert len(timestamps) == SEQUENCE_LENGTH
+    assert timestamps[-1] == pd.Timestamp(NOW.replace(minute=0))
+
+
+@pytest.mark.parametrize("times", [
+    ["2024-06-01T00:00", "2024-06-01T00:30"],
+    ["2024-06-01T01:00", "2024-06-01T00:00"],
+    ["2024-06-01T00:00", "2024-06-01T00:00"],
+    ["not a time", "2024-06-01T00:00"],
+])
+def test_irregular_timestamps_need_the_pandas_pipeline(times):
+    air_quality = {"hourly": {"time": times, "pm2_5": [1.0, 2.0]}}
+    weather = {"hourly": {"time": ["2024-06-01T00:00"], "temperature_2m": [20.0]}}
+    with pytest.raises(UnsupportedPayload):
+        build_hourly_grid(air_quality, weather, app.aqi_calculator)
+
+
+def test_ragged_columns_need_the_pandas_pipeline():
+    air_quality = {"hourly": {"time": ["2024-06-01T00:00", "2024-06-01T01:00"], "pm2_5": [1.0]}}
+    weather = {"hourly": {"time": ["2024-06-01T00:00"], "temperature_2m": [20.0]}}
+    with pytest.raises(UnsupportedPayload):
+        build_hourly_grid(air_quality, weather, app.aqi_calculator)
@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import app
+import sensor_ingest
+from app import IngestRequest, SensorReading
+from sensor_ingest import SensorNodes
+from timeseries_store import TimeSeriesStore
+
+NOW_HOUR = 480000  # 2024-10-04T00:00Z
+CAPACITY = 8
+SEQUENCE_LENGTH = 4
+
+
+def _iso(hour: int) -> str:
+    return datetime.fromtimestamp(hour * 3600, tz=timezone.utc).isoformat()
+
+
+def _reading(hour: int, node_id="lab-1", temp=25.0, **values):
+    fields = {"temp": temp, "pm2_5": 40.0, "pm10": 80.0, "co": 600.0, **values}
+    return SensorReading(node_id=node_id, timestamp=_iso(hour), **fields)
+
+
+def _ingest(nodes, readings, now_hour=NOW_HOUR):
+    return asyncio.run(nodes.ingest(readings, now_hour))
+
+
+def _window(nodes, node_id="lab-1", now_hour=NOW_HOUR):
+    return asyncio.run(nodes.window(node_id, SEQUENCE_LENGTH, now_hour))
+
+
+def _describe(nodes, node_id="lab-1"):
+    return asyncio.run(nodes.describe(node_id))
+
+
+def _temps(nodes, node_id="lab-1", now_hour=NOW_HOUR):
+    window, timestamps = _window(nodes, node_id, now_hour)
+    assert window is not None, timestamps
+    return window[0, :, 1].tolist()
+
+
+@pytest.fixture
+def nodes():
+    return SensorNodes(app.aqi_calculator, capacity=CAPACITY)
+
+
+def test_window_is_the_latest_hours_in_model_order(nodes):
+    _ingest(nodes, [_reading(NOW_HOUR - k, temp=20.0 + k, pm2_5=10.0 * (k + 1)) for k in range(6)])
+    window, timestamps = _window(nodes)
+    assert window.shape == (1, SEQUENCE_LENGTH, 5)
+    assert window[0, :, 1].tolist() == [23.0, 22.0, 21.0, 20.0]
+    assert window[0, -1, 2] == 10.0
+    assert window[0, -1, 0] == app.calculate_overall_aqi({"pm25": 10.0, "pm10": 80.0, "co": 600.0}, app.aqi_breakpoints)
+    assert [int(t.timestamp() // 3600) for t in timestamps] == list(range(NOW_HOUR - 3, NOW_HOUR + 1))
+
+
+def test_missed_hours_are_forward_filled(nodes):
+    _ingest(nodes, [_reading(NOW_HOUR - 3, temp=10.0), _reading(NOW_HOUR, temp=13.0)])
+    assert _temps(nodes) == [10.0, 10.0, 10.0, 13.0]
+    assert _describe(nodes)["filled_hours"] == 2
+
+
+def test_long_gap_restarts_the_window(nodes):
+    _ingest(nodes, [_reading(NOW_HOUR - 10 + k) for k in range(4)] + [_reading(NOW_HOUR)])
+    window, message = _window(nodes)
+    assert window is None
+    assert "1 of the 4" in message
+    assert nodes.stats()["window_resets"] == 1
+
+
+def test_late_reading_replaces_its_hour_and_the_filled_ones_after_it(nodes):
+    _ingest(nodes, [_reading(NOW_HOUR - 3, temp=10.0), _reading(NOW_HOUR, temp=13.0)])
+    _ingest(nodes, [_reading(NOW_HOUR - 2, temp=11.0)])
+    assert _temps(nodes) == [10.0, 11.0, 11.0, 13.0]
+    accepted, rejected = _ingest(nodes, [_reading(NOW_HOUR - 20)])
+    assert accepted == 0 and "older than" in rejected[0]["error"]
+
+
+def test_stale_node_is_not_used(nodes):
+    _ingest(nodes, [_reading(NOW_HOUR - k) for k in range(4)])
+    window, message = _window(nodes, now_hour=NOW_HOUR + sensor_ingest.SENSOR_MAX_STALENESS_HOURS + 1)
+    assert window is None and "old" in message
+
+
+def test_invalid_readings_are_rejected_one_by_one(nodes):
+    readings = [
+        _reading(NOW_HOUR),
+        _reading(NOW_HOUR, node_id="../etc"),
+        _reading(NOW_HOUR, pm10=None),
+        _reading(NOW_HOUR, temp=200.0),
+        _reading(NOW_HOUR + 5),
+        SensorReading(node_id="lab-1", timestamp="yesterday", temp=1.0, pm2_5=1.0, pm10=1.0, co=1.0),
+    ]
+    accepted, rejected = _ingest(nodes, readings)
+    assert accepted == 1
+    assert [r["index"] for r in rejected] == [1, 2, 3, 4, 5]
+    assert "node_id" in rejected[0]["error"]
+    assert rejected[1]["error"] == "Missing 'pm10'."
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path))
+
+
+def test_windows_survive_a_restart(store):
+    _ingest(SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=store),
+            [_reading(NOW_HOUR - 3, temp=10.0), _reading(NOW_HOUR - 1, temp=12.0), _reading(NOW_HOUR, temp=13.0)])
+    restarted = SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=store)
+    assert _temps(restarted) == [10.0, 10.0, 12.0, 13.0]
+    assert _describe(restarted)["filled_hours"] == 1
+
+
+def test_processes_sharing_a_store_see_each_others_readings(store, tmp_path):
+    first = SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=store)
+    second = SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=TimeSeriesStore(str(tmp_path)))
+    _ingest(first, [_reading(NOW_HOUR - 3 + k, temp=10.0 + k) for k in range(3)])
+    _ingest(second, [_reading(NOW_HOUR, temp=20.0)])
+    assert _temps(first) == [10.0, 11.0, 12.0, 20.0]
+    # A late reading sent to the other process lands in the window both see
+    _ingest(first, [_reading(NOW_HOUR - 2, temp=15.0)])
+    assert _temps(second) == [10.0, 15.0, 12.0, 20.0]
+    assert first.stats()["store_reloads"] == 1
+
+    # Up-to-date buffers are not rebuilt
+    _temps(first)
+    _ingest(first, [_reading(NOW_HOUR + 1)])
+    _temps(first, now_hour=NOW_HOUR + 1)
+    assert first.stats()["store_reloads"] == 1
+
+
+def test_evicted_node_is_reloaded_from_the_store(store):
+    nodes = SensorNodes(app.aqi_calculator, capacity=CAPACITY, max_nodes=1, store=store)
+    _ingest(nodes, [_reading(NOW_HOUR - k) for k in range(4)])
+    _ingest(nodes, [_reading(NOW_HOUR, node_id="lab-2")])
+    assert nodes.stats()["evictions"] == 1
+    assert len(_temps(nodes)) == SEQUENCE_LENGTH
+
+
+def test_unknown_nodes_are_answered_without_reading_the_store(store, monkeypatch):
+    nodes = SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=store, rescan_interval_s=3600)
+    _ingest(nodes, [_reading(NOW_HOUR)])
+    reads = []
+    monkeypatch.setattr(store, "revision", lambda station: reads.append(station))
+
+    assert _describe(nodes, "nobody") is None
+    assert _window(nodes, "nobody-else")[0] is None
+    assert _describe(nodes, "../etc") is None
+    # One listing for all of them, and no per-node reads or open series
+    assert nodes.stats()["store_rescans"] == 1
+    assert reads == []
+    assert store._series.keys() == {"node_lab-1"}
+
+
+def test_nodes_written_elsewhere_are_found_by_a_rescan(store, tmp_path):
+    nodes = SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=store, rescan_interval_s=3600)
+    assert _describe(nodes) is None
+    _ingest(SensorNodes(app.aqi_calculator, capacity=CAPACITY, store=TimeSeriesStore(str(tmp_path))),
+            [_reading(NOW_HOUR - k) for k in range(4)])
+    # Not listed again until the interval has passed
+    assert _describe(nodes) is None
+    nodes.rescan_interval_s = 0
+    assert _describe(nodes)["hours_buffered"] == 4
+    assert nodes.stats()["store_rescans"] == 2 and nodes.stats()["known_nodes"] == 1
+
+
+def test_unknown_node_is_a_404(monkeypatch):
+    monkeypatch.setattr(app, "sensor_nodes", SensorNodes(app.aqi_calculator, capacity=CAPACITY))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(app.sensor_node("nobody"))
+    assert error.value.status_code == 404
+
+
+def test_ingest_is_refused_without_a_configured_token(monkeypatch):
+    batch = IngestRequest(readings=[_reading(NOW_HOUR)])
+    monkeypatch.setattr(app, "SENSOR_INGEST_TOKEN", "")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(app.ingest_readings(batch, x_ingest_token=""))
+    assert error.value.status_code == 403
+
+    monkeypatch.setattr(app, "SENSOR_INGEST_TOKEN", "secret")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(app.ingest_readings(batch, x_ingest_token="wrong"))
+    assert error.value.status_code == 403
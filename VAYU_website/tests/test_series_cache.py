@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from series_cache import HourlySeriesCache
+
+HOUR = datetime(2024, 6, 1, 10, tzinfo=timezone.utc)
+
+
+class Loader:
+    """Async loader that counts calls and can be held open until released."""
+
+    def __init__(self, value="series", error=None, exception=None):
+        self.value = value
+        self.error = error
+        self.exception = exception
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.exception is not None:
+            raise self.exception
+        return (f"{self.value}-{self.calls}" if self.value is not None else None), self.error
+
+
+def test_hit_within_the_hour_and_expiry_on_the_next():
+    async def scenario():
+        cache = HourlySeriesCache(stale_hours=0)
+        loader = Loader()
+        key = cache.make_key(28.61, 77.21, 48, HOUR + timedelta(minutes=5))
+        assert await cache.get_or_load(key, loader, now=HOUR + timedelta(minutes=5)) == ("series-1", None)
+        assert await cache.get_or_load(key, loader, now=HOUR + timedelta(minutes=59)) == ("series-1", None)
+        # Same key looked up after the hour boundary has expired
+        assert await cache.get_or_load(key, loader, now=HOUR + timedelta(hours=1)) == ("series-2", None)
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_keys_snap_to_the_grid_and_the_hour():
+    cache = HourlySeriesCache(grid_degrees=0.1)
+    assert cache.make_key(28.612, 77.208, 48, HOUR + timedelta(minutes=30)) == \
+        cache.make_key(28.598, 77.196, 48, HOUR + timedelta(minutes=1))
+    assert cache.make_key(28.61, 77.21, 48, HOUR) != cache.make_key(28.71, 77.21, 48, HOUR)
+    assert cache.make_key(28.61, 77.21, 48, HOUR) != cache.make_key(28.61, 77.21, 48, HOUR + timedelta(hours=1))
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = HourlySeriesCache()
+        loader = Loader()
+        loader.release.clear()
+        key = cache.make_key(28.61, 77.21, 48, HOUR)
+        callers = [asyncio.create_task(cache.get_or_load(key, loader, now=HOUR)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        return await asyncio.gather(*callers), loader.calls, cache.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == [("series-1", None)] * 5
+    assert calls == 1
+    assert (stats["misses"], stats["coalesced"]) == (1, 4)
+
+
+def test_loader_exception_reaches_every_coalesced_caller():
+    async def scenario():
+        cache = HourlySeriesCache()
+        loader = Loader(exception=RuntimeError("upstream exploded"))
+        loader.release.clear()
+        key = cache.make_key(28.61, 77.21, 48, HOUR)
+        callers = [asyncio.create_task(cache.get_or_load(key, loader, now=HOUR)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True), cache
+
+    results, cache = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream exploded" for r in results)
+    assert cache._inflight == {}
+
+
+def test_failed_results_are_returned_but_not_cached():
+    async def scenario():
+        cache = HourlySeriesCache()
+        loader = Loader(value=None, error="API Request Error")
+        key = cache.make_key(28.61, 77.21, 48, HOUR)
+        first = await cache.get_or_load(key, loader, now=HOUR)
+        second = await cache.get_or_load(key, loader, now=HOUR)
+        return first, second, loader.calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert first == second == (None, "API Request Error")
+    assert calls == 2
+
+
+def test_cancelled_loader_does_not_fail_the_callers_waiting_on_it():
+    async def scenario():
+        cache = HourlySeriesCache()
+        loader = Loader()
+        loader.release.clear()
+        key = cache.make_key(28.61, 77.21, 48, HOUR)
+        leader = asyncio.create_task(cache.get_or_load(key, loader, now=HOUR))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_load(key, loader, now=HOUR)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters), loader.calls
+
+    results, calls = asyncio.run(scenario())
+    # One of the waiters took over the load; the others shared it
+    assert results == [("series-2", None)] * 3
+    assert calls == 2
+
+
+def test_stale_value_is_served_while_the_new_hour_loads_in_the_background():
+    async def scenario():
+        cache = HourlySeriesCache(stale_hours=3)
+        loader = Loader()
+        now = HOUR + timedelta(minutes=10)
+        await cache.get_or_load(cache.make_key(28.61, 77.21, 48, now), loader, now=now)
+
+        later = HOUR + timedelta(hours=1, minutes=2)
+        loader.release.clear()
+        stale = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, later), loader, now=later)
+        await asyncio.sleep(0)
+        # Answered while the refresh is still running
+        assert loader.calls == 2 and len(cache._revalidations) == 1
+        loader.release.set()
+        await asyncio.gather(*cache._revalidations)
+        fresh = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, later), loader, now=later)
+        return stale, fresh, loader.calls, cache.stats()
+
+    stale, fresh, calls, stats = asyncio.run(scenario())
+    assert stale == ("series-1", None)
+    assert fresh == ("series-2", None)
+    assert calls == 2
+    assert stats["stale_served"] == 1
+
+
+def test_stale_values_are_not_served_when_too_old_or_not_allowed():
+    async def scenario():
+        cache = HourlySeriesCache(stale_hours=2)
+        loader = Loader()
+        await cache.get_or_load(cache.make_key(28.61, 77.21, 48, HOUR), loader, now=HOUR)
+        an_hour_later = HOUR + timedelta(hours=1)
+        strict = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, an_hour_later), loader,
+                                         now=an_hour_later, allow_stale=False)
+        much_later = HOUR + timedelta(hours=4)
+        expired = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, much_later), loader, now=much_later)
+        return strict, expired
+
+    strict, expired = asyncio.run(scenario())
+    assert strict == ("series-2", None)
+    assert expired == ("series-3", None)
+
+
+def test_failed_background_refresh_keeps_serving_the_stale_value():
+    async def scenario():
+        cache = HourlySeriesCache(stale_hours=3)
+        await cache.get_or_load(cache.make_key(28.61, 77.21, 48, HOUR), Loader(), now=HOUR)
+        later = HOUR + timedelta(hours=1)
+        failing = Loader(value=None, error="API Request Error")
+        first = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, later), failing, now=later)
+        await asyncio.gather(*cache._revalidations)
+        second = await cache.get_or_load(cache.make_key(28.61, 77.21, 48, later), failing, now=later)
+        return first, second, cache.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert first == second == ("series-1", None)
+    assert stats["revalidation_failures"] >= 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def scenario():
+        cache = HourlySeriesCache(max_entries=2, stale_hours=0)
+        keys = [cache.make_key(lat, 77.2, 48, HOUR) for lat in (10.0, 20.0, 30.0)]
+        for key in keys[:2]:
+            await cache.get_or_load(key, Loader(), now=HOUR)
+        await cache.get_or_load(keys[0], Loader(), now=HOUR)  # keys[1] is now the oldest
+        await cache.get_or_load(keys[2], Loader(), now=HOUR)
+        loader = Loader(value="reloaded")
+        await cache.get_or_load(keys[0], loader, now=HOUR)
+        await cache.get_or_load(keys[1], loader, now=HOUR)
+        return loader.calls, cache.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert stats["evictions"] == 2
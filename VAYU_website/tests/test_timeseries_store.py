@@ -0,0 +1,168 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import pytest
+
+import app
+import timeseries_store
+from series_cache import HourlySeriesCache
+from timeseries_store import TimeSeriesStore
+
+START = 475_000  # an epoch hour in 2024
+
+
+def _rows(hours, offset=0.0):
+    hours = np.asarray(hours, dtype=np.float64)
+    return np.stack([hours + offset + column for column in range(5)], axis=1)
+
+
+def test_rows_written_by_one_instance_are_read_by_another(tmp_path):
+    writer = TimeSeriesStore(str(tmp_path))
+    hours = np.arange(START, START + 48)
+    writer.append("grid_28.6_77.2", hours, _rows(hours))
+
+    reader = TimeSeriesStore(str(tmp_path))
+    window = reader.read_window("grid_28.6_77.2", START + 47, 24)
+    np.testing.assert_array_equal(window, _rows(hours[-24:]))
+    assert not window.flags.writeable
+    assert reader.latest_hour("grid_28.6_77.2") == START + 47
+
+
+def test_an_open_reader_sees_later_appends_and_rebuilt_files(tmp_path):
+    writer = TimeSeriesStore(str(tmp_path), retention_hours=0)
+    reader = TimeSeriesStore(str(tmp_path), retention_hours=0)
+    writer.append("s", [START], _rows([START]))
+    assert reader.latest_hour("s") == START
+
+    # Past the preallocated capacity, and before row 0: both rebuild the file
+    later = np.arange(START + 1, START + timeseries_store.GROWTH_ROWS + 10)
+    writer.append("s", later, _rows(later))
+    earlier = np.arange(START - 5, START)
+    writer.append("s", earlier, _rows(earlier))
+
+    assert reader.latest_hour("s") == later[-1]
+    np.testing.assert_array_equal(reader.read_window("s", later[-1], 30), _rows(later[-30:]))
+    np.testing.assert_array_equal(reader.read_range("s", START - 5, START + 1), _rows(np.arange(START - 5, START + 2)))
+
+
+def test_appends_from_another_process_are_visible(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("s", [START], _rows([START]))
+    assert store.revision("s") == 1
+    script = (
+        "import numpy as np; from timeseries_store import TimeSeriesStore; "
+        f"TimeSeriesStore({str(tmp_path)!r}).append('s', [{START + 1}], np.full((1, 5), 7.0))"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(timeseries_store.__file__))
+
+    assert store.revision("s") == 2
+    np.testing.assert_array_equal(store.read_range("s", START + 1, START + 1), np.full((1, 5), 7.0))
+
+
+def test_later_writes_replace_earlier_ones_and_gaps_are_reported(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    hours = np.array([START, START + 1, START + 3])
+    store.append("s", hours, _rows(hours))
+    store.append("s", [START + 1], _rows([START + 1], offset=100.0))
+
+    np.testing.assert_array_equal(store.read_range("s", START + 1, START + 1), _rows([START + 1], offset=100.0))
+    assert store.read_window("s", START + 3, 4) is None
+    np.testing.assert_array_equal(store.missing_hours("s", START - 1, START + 4), [START - 1, START + 2, START + 4])
+    assert np.isnan(store.read_range("s", START + 2, START + 2)).all()
+
+
+def test_unknown_stations_read_as_empty(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    assert store.read_window("nowhere", START, 24) is None
+    assert store.latest_hour("nowhere") is None
+    assert store.revision("nowhere") is None
+    assert len(store.missing_hours("nowhere", START, START + 23)) == 24
+
+
+def test_rows_older_than_the_retention_window_are_dropped(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), retention_hours=48)
+    hours = np.arange(START, START + 24)
+    store.append("s", hours, _rows(hours))
+    # Far enough ahead that the file is rebuilt without the old rows
+    later = np.arange(START + 2000, START + 2024)
+    store.append("s", later, _rows(later))
+    meta = store._get("s").mapped[0]
+
+    assert meta["start_hour"] > START + 24
+    assert meta["capacity"] <= 48 + timeseries_store.GROWTH_ROWS
+    assert np.isnan(store.read_range("s", START, START + 23)).all()
+    # Writes for hours already outside the window are ignored
+    store.append("s", [START + 10], _rows([START + 10]))
+    assert store._get("s").mapped[0]["start_hour"] == meta["start_hour"]
+
+
+def test_prune_removes_idle_stations_only(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), retention_hours=48)
+    store.append("idle", [START], _rows([START]))
+    store.append("busy", [START + 100], _rows([START + 100]))
+
+    assert store.prune(START + 100) == 1
+    assert store.latest_hour("idle") is None
+    assert store.latest_hour("busy") == START + 100
+    # A pruned station starts over on its next append
+    store.append("idle", [START + 101], _rows([START + 101]))
+    assert store.latest_hour("idle") == START + 101
+
+
+@pytest.mark.parametrize("name, expected", [("grid_28.6_77.2", "grid_28.6_77.2"), ("node_a/b c", "node_a_b_c")])
+def test_station_ids_are_safe_directory_names(name, expected):
+    assert TimeSeriesStore.station_id(name) == expected
+
+
+def test_unknown_stations_are_not_cached(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.read_window("nowhere", START, 24)
+    store.missing_hours("nowhere", START, START + 23)
+    assert store._series == {}
+    assert os.listdir(tmp_path) == []
+
+
+def test_least_recently_used_stations_are_unmapped(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), max_open_series=2)
+    for station in ("a", "b"):
+        store.append(station, [START], _rows([START]))
+    first = store._get("a")
+    store.append("c", [START], _rows([START]))
+
+    assert list(store._series) == ["a", "c"]
+    # An evicted station is mapped again on its next read
+    assert store.latest_hour("b") == START
+    assert list(store._series) == ["c", "b"]
+    assert first.mapped is None
+
+
+@pytest.fixture
+def upstream_down(tmp_path, monkeypatch):
+    """app with a fresh store and series cache, and an upstream that always fails; returns the store."""
+    async def fail(latitude, longitude, past_hours):
+        raise httpx.ConnectError("upstream down")
+
+    store = TimeSeriesStore(str(tmp_path))
+    monkeypatch.setattr(app, "timeseries_store", store)
+    monkeypatch.setattr(app, "series_cache", HourlySeriesCache())
+    monkeypatch.setattr(app.open_meteo, "fetch_hourly_payloads", fail)
+    return store
+
+
+def test_stored_window_is_only_a_fallback_when_stale_data_is_allowed(upstream_down):
+    # Complete up to two hours ago, so the store can't answer for this hour
+    end_hour = timeseries_store.epoch_hour(datetime.now(timezone.utc)) - 2
+    hours = np.arange(end_hour - 30, end_hour + 1)
+    upstream_down.append(app._grid_station(28.6, 77.2), hours, _rows(hours))
+
+    sequence, timestamps = asyncio.run(app.get_latest_data_sequence_async(24, 28.6, 77.2))
+    np.testing.assert_array_equal(sequence[0], _rows(hours[-24:]))
+    assert timeseries_store.epoch_hour(timestamps[-1]) == end_hour
+
+    sequence, error = asyncio.run(app.get_latest_data_sequence_async(24, 28.6, 77.2, allow_stale=False))
+    assert sequence is None and "upstream down" in error
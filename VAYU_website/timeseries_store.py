@@ -0,0 +1,306 @@
+# timeseries_store.py
+# Embedded on-disk store of hourly model-feature series, one per station.
+#
+# Each station is a directory holding a fixed-width float64 matrix (one row per UTC hour,
+# one column per model feature, NaN for hours never written) that is memory-mapped for
+# reads and writes, plus a small meta.json with the hour of row 0. Rows are addressed by
+# "epoch hour" (hours since 1970-01-01 UTC), so appending is an index computation and
+# reading the last N hours is a slice of the memmap, without copying or parsing anything.
+#
+# Only the last retention_hours hours of a station are kept: older rows are dropped when
+# its file is next rebuilt, and prune() deletes stations that have had no data for that
+# long. Appends take a file lock and may rewrite the file, and reads check meta.json for a
+# newer version first, so callers on an event loop run both in an executor.
+# At most max_open_series stations are kept mapped (least recently used first out); the
+# others are mapped again on their next access.
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+FEATURE_COLUMNS = ['calculated_aqi', 'temp', 'pm25', 'pm10', 'co']
+# Rows are preallocated in chunks so appends rarely have to grow the file
+GROWTH_ROWS = 24 * 30
+# Hours of history kept per station; 0 keeps everything
+RETENTION_HOURS = int(os.environ.get("TIMESERIES_STORE_RETENTION_HOURS", str(24 * 30)))
+# Stations kept mapped at once; each mapping holds a file descriptor
+MAX_OPEN_SERIES = int(os.environ.get("TIMESERIES_STORE_MAX_OPEN_SERIES", "256"))
+
+
+def epoch_hour(timestamp) -> int:
+    """Hours since the Unix epoch for a tz-aware datetime / pandas Timestamp."""
+    return int(timestamp.timestamp() // 3600)
+
+
+class _Series:
+    def __init__(self, path: str, num_columns: int):
+        self.path = path
+        self.num_columns = num_columns
+        self.meta_path = os.path.join(path, "meta.json")
+        self.values_path = os.path.join(path, "values.f8")
+        self.lock_path = os.path.join(path, ".lock")
+        # (meta, values memmap), always replaced together so a reader never pairs the
+        # metadata of one version of the file with the rows of another
+        self.mapped = None
+        self._meta_key = None
+
+    def remap(self):
+        # Caller holds the file lock (shared or exclusive)
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            self.mapped, self._meta_key = None, None
+            return None
+        # meta.json is always replaced atomically, so a new inode means new metadata
+        meta_key = (stat.st_ino, stat.st_mtime_ns)
+        if meta_key != self._meta_key:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            values = np.memmap(self.values_path, dtype=np.float64, mode="r+", shape=(meta["capacity"], self.num_columns))
+            self.mapped, self._meta_key = (meta, values), meta_key
+        return self.mapped
+
+    def refresh(self):
+        """Current ``(meta, values)``, remapped if another process changed the files; None if there is no data."""
+        if not os.path.exists(self.meta_path):
+            self.mapped, self._meta_key = None, None
+            return None
+        if fcntl is None:
+            return self.remap()
+        try:
+            handle = open(self.lock_path, "a")
+        except FileNotFoundError:
+            return None
+        try:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # A writer is busy: keep reading the mapping we have, which is still consistent
+                return self.mapped
+            return self.remap()
+        finally:
+            handle.close()
+
+    def close(self):
+        # Drops this object's mapping; the file (and its descriptor) is unmapped once no
+        # read-only window handed out by read_window still refers to it
+        self.mapped, self._meta_key = None, None
+
+    def write_meta(self, meta):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+
+class TimeSeriesStore:
+    def __init__(self, root: str, columns=FEATURE_COLUMNS, retention_hours: int = RETENTION_HOURS,
+                 max_open_series: int = MAX_OPEN_SERIES):
+        self.root = root
+        self.columns = list(columns)
+        self.retention_hours = max(retention_hours, 0)
+        self.max_open_series = max(max_open_series, 1)
+        self._series = OrderedDict()
+        # Guards _series only; _lock serializes writers and may be held across a file rebuild
+        self._series_lock = threading.Lock()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def station_id(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+    def _get(self, station: str, create: bool = False):
+        """The station's series, or None if it has no data on disk and ``create`` is False."""
+        with self._series_lock:
+            series = self._series.get(station)
+            if series is not None:
+                self._series.move_to_end(station)
+                return series
+        series = _Series(os.path.join(self.root, self.station_id(station)), len(self.columns))
+        if not create and not os.path.exists(series.meta_path):
+            return None
+        with self._series_lock:
+            series = self._series.setdefault(station, series)
+            self._series.move_to_end(station)
+            while len(self._series) > self.max_open_series:
+                _, evicted = self._series.popitem(last=False)
+                evicted.close()
+        return series
+
+    def stations(self):
+        """Names of the stations with data on disk, as ``station_id`` spells them."""
+        return [name for name in os.listdir(self.root) if os.path.exists(os.path.join(self.root, name, "meta.json"))]
+
+    def _refresh(self, station: str):
+        series = self._get(station)
+        return series.refresh() if series is not None else None
+
+    def _file_lock(self, series: _Series):
+        os.makedirs(series.path, exist_ok=True)
+        handle = open(series.lock_path, "w")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _allocate(self, series: _Series, start_hour: int, capacity: int, old=None):
+        # (Re)create the values file with row 0 at start_hour, copying over the existing rows that still fit
+        tmp_path = series.values_path + ".tmp"
+        values = np.memmap(tmp_path, dtype=np.float64, mode="w+", shape=(capacity, len(self.columns)))
+        values[:] = np.nan
+        if old is not None:
+            old_meta, old_values = old
+            lo = max(start_hour, old_meta["start_hour"])
+            hi = min(start_hour + capacity, old_meta["start_hour"] + old_meta["length"])
+            if hi > lo:
+                values[lo - start_hour:hi - start_hour] = old_values[lo - old_meta["start_hour"]:hi - old_meta["start_hour"]]
+        values.flush()
+        del values
+        os.replace(tmp_path, series.values_path)
+
+    def append(self, station: str, hours, values) -> int:
+        """Upsert rows for the given epoch hours; later writes for an hour replace earlier ones.
+
+        Rows older than the retention window are dropped. Returns the station's new revision.
+        """
+        hours = np.asarray(hours, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(hours), len(self.columns))
+        series = self._get(station, create=True)
+        with self._lock:
+            handle = self._file_lock(series)
+            try:
+                mapped = series.remap()
+                meta = mapped[0] if mapped is not None else None
+                revision = meta.get("revision", 0) if meta is not None else 0
+                if len(hours) == 0:
+                    return revision
+                newest = int(hours.max())
+                if meta is not None and meta["length"]:
+                    newest = max(newest, meta["start_hour"] + meta["length"] - 1)
+                if self.retention_hours:
+                    keep = hours > newest - self.retention_hours
+                    hours, values = hours[keep], values[keep]
+                    if len(hours) == 0:
+                        return revision
+                    cutoff = newest - self.retention_hours + 1
+                else:
+                    cutoff = None
+                first, last = int(hours.min()), int(hours.max())
+
+                reallocated = True
+                if meta is None:
+                    capacity = (last - first + 1) + GROWTH_ROWS
+                    self._allocate(series, first, capacity)
+                    meta = {"columns": self.columns, "start_hour": first, "length": 0, "capacity": capacity, "revision": 0}
+                elif first < meta["start_hour"] or last - meta["start_hour"] >= meta["capacity"] or \
+                        (cutoff is not None and cutoff - meta["start_hour"] > GROWTH_ROWS):
+                    # Backfill before row 0, append past the end, or more than GROWTH_ROWS hours past
+                    # retention: rebuild from the oldest hour worth keeping, with room to spare
+                    start = min(first, meta["start_hour"])
+                    if cutoff is not None:
+                        start = max(start, cutoff)
+                    capacity = (newest - start + 1) + GROWTH_ROWS
+                    self._allocate(series, start, capacity, mapped)
+                    old_end = meta["start_hour"] + meta["length"]
+                    meta = dict(meta, start_hour=start, capacity=capacity, length=max(old_end - start, 0))
+                else:
+                    reallocated = False
+                if reallocated:
+                    series.write_meta(meta)
+                    mapped = series.remap()
+                # Through the local reference: another thread may evict (close) the series meanwhile
+                meta, mapped_values = mapped
+
+                rows = hours - meta["start_hour"]
+                mapped_values[rows] = values
+                mapped_values.flush()
+                # Bumped on every append, so other processes can tell their copy of a station is out of date
+                meta = dict(meta, length=max(meta["length"], int(rows.max()) + 1), revision=revision + 1)
+                series.write_meta(meta)
+                series.remap()
+                return meta["revision"]
+            finally:
+                handle.close()
+
+    def latest_hour(self, station: str):
+        mapped = self._refresh(station)
+        if mapped is None or mapped[0]["length"] == 0:
+            return None
+        meta = mapped[0]
+        return meta["start_hour"] + meta["length"] - 1
+
+    def revision(self, station: str):
+        """Counter bumped by every append to the station (in any process); None if it has no data."""
+        mapped = self._refresh(station)
+        return mapped[0].get("revision", 0) if mapped is not None else None
+
+    def read_window(self, station: str, end_hour: int, n: int):
+        """Read-only view of the ``n`` rows ending at ``end_hour``, or None if any hour is missing."""
+        mapped = self._refresh(station)
+        if mapped is None:
+            return None
+        meta, values = mapped
+        end_row = end_hour - meta["start_hour"]
+        start_row = end_row - n + 1
+        if start_row < 0 or end_row >= meta["length"]:
+            return None
+        window = values[start_row:end_row + 1].view(np.ndarray)
+        if np.isnan(window).any():
+            return None
+        window.flags.writeable = False
+        return window
+
+    def read_range(self, station: str, start_hour: int, end_hour: int) -> np.ndarray:
+        """Copy of the rows for epoch hours [start_hour, end_hour], NaN where the store has none."""
+        out = np.full((max(end_hour - start_hour + 1, 0), len(self.columns)), np.nan)
+        mapped = self._refresh(station)
+        if mapped is None or out.shape[0] == 0:
+            return out
+        meta, values = mapped
+        lo = max(start_hour, meta["start_hour"])
+        hi = min(end_hour + 1, meta["start_hour"] + meta["length"])
+        if hi > lo:
+            out[lo - start_hour:hi - start_hour] = values[lo - meta["start_hour"]:hi - meta["start_hour"]]
+        return out
+
+    def missing_hours(self, station: str, start_hour: int, end_hour: int):
+        """Epoch hours in [start_hour, end_hour] with no complete row in the store."""
+        wanted = np.arange(start_hour, end_hour + 1, dtype=np.int64)
+        present = ~np.isnan(self.read_range(station, start_hour, end_hour)).any(axis=1)
+        return wanted[~present]
+
+    def prune(self, now_hour: int) -> int:
+        """Delete the data of stations with nothing newer than the retention window; returns how many."""
+        if not self.retention_hours:
+            return 0
+        removed = 0
+        for name in os.listdir(self.root):
+            series = _Series(os.path.join(self.root, name), len(self.columns))
+            if not os.path.exists(series.meta_path):
+                continue
+            with self._lock:
+                handle = self._file_lock(series)
+                try:
+                    mapped = series.remap()
+                    if mapped is None:
+                        continue
+                    meta = mapped[0]
+                    if meta["start_hour"] + meta["length"] - 1 > now_hour - self.retention_hours:
+                        continue
+                    # meta.json first: without it the station reads as empty. The directory and its
+                    # lock file stay, so a writer waiting on the lock still starts a fresh file.
+                    os.remove(series.meta_path)
+                    os.remove(series.values_path)
+                    removed += 1
+                finally:
+                    handle.close()
+        return removed